@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+from typing import Any
+
 from aiogram.fsm.context import FSMContext
 from aiogram_extensions.paginator.callbacks import Page
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardMarkup, InlineKeyboardButton
 
 
+# Кнопка в сохраняемом описании клавиатуры: [текст, callback_data] или словарь полей для кнопок других видов
+ButtonDescriptor = list[str] | dict[str, Any]
+
+
 class PaginatedKeyboard:
+    max_keyboards: int = 5
+    """Количество клавиатур, хранимых в состоянии пользователя. При превышении удаляется давно не открывавшаяся"""
+
     @classmethod
     async def create(cls, keyboard: InlineKeyboardBuilder, unique_name: str, state: FSMContext, page_size: int = 5,
                      pre: InlineKeyboardBuilder | None = None, post: InlineKeyboardBuilder | None = None,
@@ -18,14 +27,15 @@ class PaginatedKeyboard:
         :param post: статический блок кнопок, который будет добавлен после навигационной строки на каждой странице.
         :param text: текст, который отправлялся вместе с клавиатурой в обработчике, где клавиатура была инициализирована.
         """
-        self = cls(keyboard=keyboard, name=unique_name, state=state, page_size=page_size, pre=pre, post=post, text=text)
-        await self._write_keyboard_to_state()
-        await state.update_data(last_paginated_keyboard=self)
+        self = cls(items=_dump_rows(keyboard.export()), name=unique_name, state=state, page_size=page_size,
+                   pre=_dump_builder(pre), post=_dump_builder(post), text=text)
+        await self.save()
         return self
 
-    def __init__(self, keyboard: InlineKeyboardBuilder, name: str, state: FSMContext, page_size: int = 5,
-                 pre: InlineKeyboardBuilder | None = None, post: InlineKeyboardBuilder | None = None, text: str | None = None):
-        self.keyboard = keyboard
+    def __init__(self, items: list[list[ButtonDescriptor]], name: str, state: FSMContext, page_size: int = 5,
+                 pre: list[list[ButtonDescriptor]] | None = None, post: list[list[ButtonDescriptor]] | None = None,
+                 text: str | None = None):
+        self.items = items
         self.pre = pre
         self.post = post
         self.state = state
@@ -33,23 +43,53 @@ class PaginatedKeyboard:
         self.last_viewed_page = 1
         self.text = text
         self.keyboard_id = name
-        self.items = self.keyboard.export()
+
+    def to_state(self) -> dict[str, Any]:
+        """Описание клавиатуры, сохраняемое в состоянии. Кнопки хранятся в виде описаний и превращаются в объекты
+        только при отрисовке страницы"""
+        descriptor = {'name': self.keyboard_id, 'items': self.items, 'size': self.page_size,
+                      'page': self.last_viewed_page}
+        if self.pre:
+            descriptor['pre'] = self.pre
+        if self.post:
+            descriptor['post'] = self.post
+        if self.text:
+            descriptor['text'] = self.text
+        return descriptor
+
+    @classmethod
+    def from_state(cls, descriptor: dict[str, Any], state: FSMContext) -> PaginatedKeyboard:
+        """Восстановить клавиатуру из описания, сохраненного методом ``to_state``"""
+        self = cls(items=descriptor['items'], name=descriptor['name'], state=state, page_size=descriptor['size'],
+                   pre=descriptor.get('pre'), post=descriptor.get('post'), text=descriptor.get('text'))
+        self.last_viewed_page = descriptor['page']
+        return self
+
+    async def save(self):
+        """Записать клавиатуру в состояние как последнюю открытую"""
+        keyboards = [keyboard for keyboard in _paginated_keyboards(await self.state.get_data())
+                     if keyboard['name'] != self.keyboard_id]
+        keyboards.append(self.to_state())
+        await self.state.update_data(paginated_keyboards=keyboards[-self.max_keyboards:])
+
+    @classmethod
+    async def get(cls, state: FSMContext, keyboard_id: str) -> PaginatedKeyboard | None:
+        """Вернуть объект PaginatedKeyboard клавиатуры с идентификатором ``keyboard_id``"""
+        data = await state.get_data()
+        for descriptor in _paginated_keyboards(data):
+            if descriptor['name'] == keyboard_id:
+                return cls.from_state(descriptor, state)
 
     def first_page(self) -> InlineKeyboardMarkup:
         """Вернуть Markup для первой страницы. При вызове этого метода объект записывается в состояние как последняя
          открытая клавиатура"""
-        rows = self.items[:self.page_size]
-        if len(self.items) > self.page_size:
-            nav_buttons = self._get_navigation_buttons(page=1)
-            rows.append(nav_buttons)
-        self._add_static_buttons(rows)
         self.last_viewed_page = 1
-        return InlineKeyboardMarkup(inline_keyboard=rows)
+        return self.page(1)
 
     def page(self, page: int) -> InlineKeyboardMarkup:
         """Вернуть Markup для страницы с номером ``page``"""
         i = (page-1) * self.page_size
-        rows = self.items[i:i+self.page_size]
+        rows = _load_rows(self.items[i:i+self.page_size])
         if len(self.items) > self.page_size:
             nav_buttons = self._get_navigation_buttons(page=page)
             rows.append(nav_buttons)
@@ -64,21 +104,8 @@ class PaginatedKeyboard:
     async def last_opened(cls, state: FSMContext) -> PaginatedKeyboard | None:
         """Вернуть объект PaginatedKeyboard последней открытой клавиатуры"""
         data = await state.get_data()
-        paginated_keyboard = data.get('last_paginated_keyboard')
-        if isinstance(paginated_keyboard, PaginatedKeyboard):
-            return paginated_keyboard
-
-    async def _write_keyboard_to_state(self):
-        paginated_keyboards = await self._get_paginated_keyboards()
-        paginated_keyboards[self.keyboard_id] = self
-        await self.state.update_data(paginated_keyboards=paginated_keyboards)
-
-    async def _get_paginated_keyboards(self) -> dict[str, PaginatedKeyboard]:
-        data = await self.state.get_data()
-        paginated_keyboards = data.get('paginated_keyboards')
-        if not paginated_keyboards:
-            paginated_keyboards = {}
-        return paginated_keyboards
+        if keyboards := _paginated_keyboards(data):
+            return cls.from_state(keyboards[-1], state)
 
     def _get_navigation_buttons(self, page: int) -> list[InlineKeyboardButton]:
         previous_button = InlineKeyboardButton(text="⬅️", callback_data=Page(keyboard_id=self.keyboard_id, page=page-1).pack())
@@ -96,10 +123,39 @@ class PaginatedKeyboard:
 
     def _add_static_buttons(self, rows: list[list[InlineKeyboardButton]]):
         if self.pre:
-            if buttons := self.pre.export():
-                for row in reversed(buttons):
-                    rows.insert(0, row)
+            rows[:0] = _load_rows(self.pre)
         if self.post:
-            if buttons := self.post.export():
-                for row in buttons:
-                    rows.append(row)
+            rows.extend(_load_rows(self.post))
+
+
+def _paginated_keyboards(data: dict[str, Any]) -> list[dict[str, Any]]:
+    """Описания сохраненных клавиатур в порядке их открытия: последняя открытая клавиатура - в конце списка. Состояние
+    в прежнем формате (словарь клавиатур) не учитывается"""
+    keyboards = data.get('paginated_keyboards')
+    return keyboards if isinstance(keyboards, list) else []
+
+
+def _dump_button(button: InlineKeyboardButton) -> ButtonDescriptor:
+    fields = button.model_dump(exclude_none=True)
+    if fields.keys() == {'text', 'callback_data'}:
+        return [button.text, button.callback_data]
+    return fields
+
+
+def _load_button(descriptor: ButtonDescriptor) -> InlineKeyboardButton:
+    if isinstance(descriptor, list):
+        text, callback_data = descriptor
+        return InlineKeyboardButton(text=text, callback_data=callback_data)
+    return InlineKeyboardButton(**descriptor)
+
+
+def _dump_rows(rows: list[list[InlineKeyboardButton]]) -> list[list[ButtonDescriptor]]:
+    return [[_dump_button(button) for button in row] for row in rows]
+
+
+def _load_rows(rows: list[list[ButtonDescriptor]]) -> list[list[InlineKeyboardButton]]:
+    return [[_load_button(button) for button in row] for row in rows]
+
+
+def _dump_builder(builder: InlineKeyboardBuilder | None) -> list[list[ButtonDescriptor]] | None:
+    return _dump_rows(builder.export()) if builder else None
@@ -0,0 +1,81 @@
+"""
+Бенчмарки цикла опроса логов и отправки уведомлений.
+
+    python -m benchmarks micro
+    python -m benchmarks cycle --stub-url http://localhost:8888 --devices 1000 10000 100000 --users 100 10000
+    python -m benchmarks replay traffic.jsonl.gz --users 100 10000 --speed 0
+    python -m benchmarks compare benchmarks/results/cycle-old.json benchmarks/results/cycle-new.json
+
+Замер ``cycle`` требует запущенного эмулятора (``python -m stub_server --no-reload``) и доступной базы данных
+PostgreSQL: таблицы создаются и удаляются в базе ``--database`` (по умолчанию ``settings.test_database``).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from benchmarks.results import save_results, compare_results
+from energoatlas.settings import settings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    micro = subparsers.add_parser('micro', help='микробенчмарки горячих функций без внешних зависимостей')
+    micro.add_argument('--devices', type=int, default=10_000)
+    micro.add_argument('--logs-per-device', type=int, default=5)
+    micro.add_argument('--subscribers', type=int, default=500)
+    micro.add_argument('--repeat', type=int, default=5)
+    micro.add_argument('--output', type=Path)
+
+    cycle = subparsers.add_parser('cycle', help='полный цикл LogManager.request_logs_and_notify')
+    cycle.add_argument('--stub-url', default=settings.base_url)
+    cycle.add_argument('--database', default=settings.test_database)
+    cycle.add_argument('--devices', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    cycle.add_argument('--users', type=int, nargs='+', default=[100, 10_000])
+    cycle.add_argument('--devices-per-user', type=int, default=20)
+    cycle.add_argument('--event-rate', type=float, default=0.001)
+    cycle.add_argument('--iterations', type=int, default=3)
+    cycle.add_argument('--seed', type=int, default=0)
+    cycle.add_argument('--output', type=Path)
+
+    replay = subparsers.add_parser('replay', help='полный цикл на записанном трафике (settings.http_record_path)')
+    replay.add_argument('recording')
+    replay.add_argument('--speed', type=float, default=0, help='ускорение воспроизведения, 0 - без задержек')
+    replay.add_argument('--database', default=settings.test_database)
+    replay.add_argument('--users', type=int, nargs='+', default=[100])
+    replay.add_argument('--devices-per-user', type=int, default=20)
+    replay.add_argument('--iterations', type=int, default=3)
+    replay.add_argument('--seed', type=int, default=0)
+    replay.add_argument('--output', type=Path)
+
+    compare = subparsers.add_parser('compare', help='сравнить два прогона')
+    compare.add_argument('baseline', type=Path)
+    compare.add_argument('current', type=Path)
+    compare.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение метрики (доля)')
+
+    args = parser.parse_args()
+
+    if args.command == 'micro':
+        from benchmarks.micro import run_micro
+        results = run_micro(args.devices, args.logs_per_device, args.subscribers, args.repeat)
+        print(f'Результаты сохранены в {save_results("micro", results, args.output)}')
+    elif args.command == 'cycle':
+        from benchmarks.cycle import run_cycles
+        results = run_cycles(args.devices, args.users, stub_url=args.stub_url, database=args.database,
+                             devices_per_user=args.devices_per_user, event_rate=args.event_rate,
+                             iterations=args.iterations, seed=args.seed)
+        print(f'Результаты сохранены в {save_results("cycle", results, args.output)}')
+    elif args.command == 'replay':
+        from benchmarks.cycle import run_replay
+        results = run_replay(settings.base_url, args.users, database=args.database, replay=args.recording,
+                             replay_speed=args.speed, devices_per_user=args.devices_per_user,
+                             iterations=args.iterations, seed=args.seed)
+        print(f'Результаты сохранены в {save_results("replay", results, args.output)}')
+    else:
+        return 0 if compare_results(args.baseline, args.current, args.threshold) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
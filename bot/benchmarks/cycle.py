@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import httpx
+from sqlalchemy import NullPool, event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from benchmarks.results import peak_rss_mb
+from energoatlas.database import database_url
+from energoatlas.managers import ApiManager, LogManager
+from energoatlas.metrics import observe_response
+from energoatlas.recording import ReplayTransport
+from energoatlas.settings import settings
+from energoatlas.telegram import rate_limiter
+from energoatlas.tables import Base, UserTable, UserDeviceTable
+
+
+DEVICES_PER_OBJECT = 10
+COMPANIES = 10
+
+
+def fleet_config(devices: int, users: int, event_rate: float, seed: int) -> dict:
+    """Параметры синтетического парка эмулятора с ``devices`` устройствами"""
+    return {
+        'seed': seed,
+        'companies': COMPANIES,
+        'objects_per_company': max(1, devices // (COMPANIES * DEVICES_PER_OBJECT)),
+        'devices_per_object': DEVICES_PER_OBJECT,
+        'users': users,
+        'event_rate': event_rate,
+    }
+
+
+def create_engine(database: str) -> AsyncEngine:
+    return create_async_engine(database_url(database=database), poolclass=NullPool)
+
+
+async def seed_subscriptions(engine: AsyncEngine, client: httpx.AsyncClient, users: int, devices_per_user: int,
+                             seed: int) -> int:
+    """Заполнить таблицы пользователей и их устройств: пользователи распределяются по компаниям, и каждый подписан
+    на ``devices_per_user`` случайных устройств своей компании"""
+    rng = random.Random(seed)
+    token = (await client.post(f'{settings.base_url}/api2/auth/open', json={
+        'login': settings.admin_login, 'password': settings.admin_password})).json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    companies = (await client.get(f'{settings.base_url}/api2/company', headers=headers)).json()
+    company_devices = {}
+    for company in companies:
+        objects = (await client.get(f'{settings.base_url}/api2/company/objects', params={'id': company['id']},
+                                    headers=headers)).json()
+        company_devices[company['id']] = [device['id'] for obj in objects for device in obj['devices']]
+
+    subscriptions = 0
+    async with engine.begin() as conn:
+        await conn.execute(insert(UserTable), [
+            {'telegram_user_id': i, 'login': f'user{i}@example.com', 'password': 'password'} for i in range(1, users + 1)
+        ])
+        batch = []
+        for i in range(1, users + 1):
+            devices = company_devices[companies[(i - 1) % len(companies)]['id']] if companies else []
+            for device_id in rng.sample(devices, min(devices_per_user, len(devices))):
+                batch.append({'telegram_user_id': i, 'device_id': device_id})
+            if len(batch) >= 10_000 or i == users:
+                subscriptions += len(batch)
+                await conn.execute(insert(UserDeviceTable), batch)
+                batch = []
+    return subscriptions
+
+
+async def run_cycle(devices: int, users: int, devices_per_user: int, event_rate: float, iterations: int,
+                    database: str, seed: int, replay: str | None = None, replay_speed: float = 0) -> dict:
+    """Выполнить ``iterations`` полных циклов ``LogManager.request_logs_and_notify`` против эмулятора (или записанного
+    трафика ``replay``) и пустой базы данных и вернуть усредненные показатели"""
+    requests = Counter()
+
+    async def count_request(request: httpx.Request) -> None:
+        requests['telegram' if request.url.path.endswith('/sendMessage') else 'energoatlas'] += 1
+
+    engine = create_engine(database)
+    round_trips = Counter()
+    event.listen(engine.sync_engine, 'before_cursor_execute',
+                 lambda *_: round_trips.update(('db',)))
+
+    limits = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+    transport = ReplayTransport(replay, speed=replay_speed) if replay else httpx.AsyncHTTPTransport(limits=limits)
+    async with httpx.AsyncClient(timeout=30, transport=transport,
+                                 event_hooks={'request': [count_request], 'response': [observe_response]}) as client:
+        if not replay:
+            # Ограничения частоты отправки эмулятора Telegram сняты: замеряется пропускная способность самого бота
+            devices = (await client.post(f'{settings.base_url}/stub/fleet', json={
+                'fleet_config': fleet_config(devices, users, event_rate, seed),
+                'telegram_config': {'per_chat_rate': 1_000_000, 'global_rate': 1_000_000}})).json()['devices']
+            await client.post(f'{settings.base_url}/stub/reset')
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            subscriptions = await seed_subscriptions(engine, client, users, devices_per_user, seed)
+            round_trips.clear()
+
+            # Ограничение частоты отправки бота также снимается
+            rate_limiter.rate, rate_limiter.chat_interval = 0, 0
+            log_manager = LogManager(ApiManager(client), engine=engine)
+            timings = []
+            for _ in range(iterations):
+                started_at = time.perf_counter()
+                await log_manager.request_logs_and_notify()
+                timings.append(time.perf_counter() - started_at)
+            await log_manager.session.close()
+        finally:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await engine.dispose()
+
+    wall_time = sum(timings)
+    name = f'replay[users={users}]' if replay else f'cycle[devices={devices},users={users}]'
+    return {
+        'name': name,
+        'params': {'devices': devices, 'users': users, 'replay': replay, 'subscriptions': subscriptions,
+                   'event_rate': event_rate, 'iterations': iterations, 'seed': seed},
+        'metrics': {
+            'wall_time_s': wall_time / iterations,
+            'first_cycle_s': timings[0],
+            'peak_rss_mb': peak_rss_mb(),
+            'energoatlas_requests': requests['energoatlas'] / iterations,
+            'telegram_requests': requests['telegram'] / iterations,
+            'db_round_trips': round_trips['db'] / iterations,
+            'notifications_per_s': requests['telegram'] / wall_time if wall_time else 0,
+        },
+        'directions': {'wall_time_s': 1, 'first_cycle_s': 1, 'peak_rss_mb': 1, 'energoatlas_requests': 1,
+                       'db_round_trips': 1, 'notifications_per_s': -1},
+    }
+
+
+def run_case(stub_url: str, **kwargs) -> dict:
+    """Выполнить один замер в отдельном процессе, чтобы пиковый объем памяти относился только к нему"""
+    settings.base_url = stub_url
+    settings.telegram_api_base = f'{stub_url}/bot'
+    settings.bot_token = '1:BENCHMARK'
+    return asyncio.run(run_cycle(**kwargs))
+
+
+def run_cycles(devices_sizes: list[int], users_sizes: list[int], stub_url: str, **kwargs) -> list[dict]:
+    results = []
+    for devices in devices_sizes:
+        for users in users_sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(run_case, stub_url, devices=devices, users=users, **kwargs).result()
+            metrics = result['metrics']
+            print(f'{result["name"]:<40} {metrics["wall_time_s"]:8.2f} s  {metrics["peak_rss_mb"]:8.1f} MB  '
+                  f'{metrics["energoatlas_requests"]:8.0f} req  {metrics["db_round_trips"]:6.0f} db  '
+                  f'{metrics["notifications_per_s"]:8.1f} msg/s')
+            results.append(result)
+    return results
+
+
+def run_replay(stub_url: str, users_sizes: list[int], **kwargs) -> list[dict]:
+    """Замеры цикла на записанном трафике: устройства и их количество определяются записью"""
+    results = []
+    for users in users_sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(run_case, stub_url, devices=0, users=users, event_rate=0, **kwargs).result()
+        metrics = result['metrics']
+        print(f'{result["name"]:<40} {metrics["wall_time_s"]:8.2f} s  {metrics["peak_rss_mb"]:8.1f} MB  '
+              f'{metrics["db_round_trips"]:6.0f} db  {metrics["notifications_per_s"]:8.1f} msg/s')
+        results.append(result)
+    return results
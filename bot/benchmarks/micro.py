@@ -0,0 +1,64 @@
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from energoatlas.managers import LogManager, MessageFormatter
+from energoatlas.models.background import Device, DeviceDict, DeviceWithLogs, Log, NotifiedLogIndex
+from energoatlas.settings import settings
+from energoatlas.tables import LogTable
+
+
+def make_devices(count: int) -> list[Device]:
+    return [Device(id=i, name=f'ДЗ {i}/1', object_name=f'Архивохранилище №{i // 10}',
+                   object_address=f'Свердловский проспект, {i % 200}') for i in range(count)]
+
+
+def make_devices_logs(devices: list[Device], logs_per_device: int, rng: random.Random) -> list[DeviceWithLogs]:
+    now = datetime.now().replace(microsecond=0)
+    return [
+        DeviceWithLogs(device=device, logs=[
+            Log(limit_id=device.id * 100 + n, latch_dt=now - timedelta(minutes=rng.randint(0, 2880)),
+                latch_message=f'{rng.choice(settings.targeted_logs)} (Хранилище {n})')
+            for n in range(logs_per_device)
+        ])
+        for device in devices
+    ]
+
+
+def measure(func, repeat: int, number: int) -> dict:
+    """Лучшее и медианное время одного вызова ``func`` в секундах"""
+    timings = sorted(t / number for t in timeit.repeat(func, repeat=repeat, number=number))
+    return {'best_s': timings[0], 'median_s': timings[len(timings) // 2]}
+
+
+def run_micro(devices_count: int, logs_per_device: int, subscribers: int, repeat: int) -> list[dict]:
+    rng = random.Random(0)
+    devices = make_devices(devices_count)
+    devices_logs = make_devices_logs(devices, logs_per_device, rng)
+    notified_logs = {LogTable(limit_id=log.limit_id, latch_dt=log.latch_dt)
+                     for device in devices_logs for log in device.logs if rng.random() < 0.9}
+    notified_index = NotifiedLogIndex(notified_logs)
+    chat_payload = devices_logs[:5]
+
+    cases = {
+        f'determine_new_logs[{devices_count}x{logs_per_device}]':
+            (lambda: LogManager._determine_new_logs(notified_logs, devices_logs), 1),
+        f'determine_new_logs_index[{devices_count}x{logs_per_device}]':
+            (lambda: LogManager._determine_new_logs(notified_index, devices_logs), 1),
+        f'build_devices_logs[{devices_count}x{logs_per_device}]':
+            (lambda: make_devices_logs(devices, logs_per_device, random.Random(0)), 1),
+        f'notification_message[x{subscribers}]':
+            (lambda: [MessageFormatter.notification_message(chat_payload) for _ in range(subscribers)], 1),
+        f'device_dict_build[{devices_count}]':
+            (lambda: DeviceDict(devices), 10),
+        f'device_dict_lookup[{devices_count}]':
+            (lambda: [lookup.get_device(device.id) for device in devices], 10),
+    }
+    lookup = DeviceDict(devices)
+
+    results = []
+    for name, (func, number) in cases.items():
+        metrics = measure(func, repeat=repeat, number=number)
+        results.append({'name': name, 'metrics': metrics, 'directions': {'best_s': 1, 'median_s': 1}})
+        print(f'{name:<40} best {metrics["best_s"] * 1000:10.3f} ms   median {metrics["median_s"] * 1000:10.3f} ms')
+    return results
@@ -0,0 +1,66 @@
+import json
+import platform
+import resource
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def peak_rss_mb() -> float:
+    """Пиковый объем резидентной памяти процесса в МБ"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(kind: str, results: list[dict], output: Path | None = None) -> Path:
+    """Сохранить результаты прогона в JSON-файл вместе с описанием окружения"""
+    now = datetime.now()
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f'{kind}-{now:%Y%m%d-%H%M%S}.json'
+    document = {
+        'kind': kind,
+        'created_at': now.isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    output.write_text(json.dumps(document, ensure_ascii=False, indent=2))
+    return output
+
+
+def compare_results(baseline_path: Path, current_path: Path, threshold: float) -> bool:
+    """Сравнить два прогона одного вида и вывести изменения метрик. Возвращает False, если хотя бы одна метрика,
+    для которой меньшее значение лучше, ухудшилась больше чем на ``threshold``"""
+    baseline = json.loads(baseline_path.read_text())
+    current = json.loads(current_path.read_text())
+    baseline_results = {item['name']: item for item in baseline['results']}
+    ok = True
+    for item in current['results']:
+        base = baseline_results.get(item['name'])
+        if base is None:
+            print(f'{item["name"]}: нет в базовом прогоне')
+            continue
+        for metric, direction in item.get('directions', {}).items():
+            old, new = base['metrics'].get(metric), item['metrics'].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change * direction > threshold
+            ok = ok and not regressed
+            mark = 'РЕГРЕССИЯ' if regressed else ''
+            print(f'{item["name"]:<40} {metric:<28} {old:>14.4f} -> {new:>14.4f} ({change:+.1%}) {mark}')
+    return ok
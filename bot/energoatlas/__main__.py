@@ -1,17 +1,32 @@
+import argparse
 import asyncio
 import sys
 
 from loguru import logger
 
-from energoatlas.app import main, handle_task_exception, custom_excepthook, send_log_to_elastic
+from energoatlas.app import main, handle_task_exception, custom_excepthook
+from energoatlas.elastic import create_log_shipper
 from energoatlas.settings import settings
 
 
-loop = asyncio.get_event_loop()
-sys.excepthook = custom_excepthook
-loop.set_exception_handler(handle_task_exception)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m energoatlas', description='Telegram бот «Энергоатлас»')
+    parser.add_argument('role', nargs='?', default=settings.role, choices=['all', 'bot', 'poller', 'notifier'],
+                        help='роль процесса (по умолчанию - из настроек)')
+    args = parser.parse_args()
 
-if settings.elasticsearch_enable:
-    logger.add(send_log_to_elastic, serialize=True, level="SUCCESS")
+    loop = asyncio.get_event_loop()
+    sys.excepthook = custom_excepthook
+    loop.set_exception_handler(handle_task_exception)
 
-loop.run_until_complete(main())
+    log_shipper = None
+    if settings.elasticsearch_enable:
+        log_shipper = create_log_shipper()
+        logger.add(log_shipper.sink, serialize=True, level="SUCCESS", filter=log_shipper.filter)
+        log_shipper.start(loop)
+
+    try:
+        loop.run_until_complete(main(args.role))
+    finally:
+        if log_shipper:
+            loop.run_until_complete(log_shipper.close())
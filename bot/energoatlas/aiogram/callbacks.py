@@ -22,3 +22,14 @@ class DeviceView(CallbackData, prefix='device_view'):
     company_id: int
     object_id: int
     device_id: int
+
+
+class NotificationSettings(CallbackData, prefix='notification_settings'):
+    toggle: str = ''
+    event_type: str = ''
+
+
+class DeviceMute(CallbackData, prefix='device_mute'):
+    company_id: int
+    object_id: int
+    device_id: int
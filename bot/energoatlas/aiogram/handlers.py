@@ -1,3 +1,5 @@
+import asyncio
+
 from aiogram import Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
@@ -7,12 +9,30 @@ from httpx import HTTPError
 
 from aiogram_extensions.paginator import PaginatedKeyboard
 
-from energoatlas.aiogram.callbacks import MainMenu, CompaniesForm, ObjectsForm, DevicesForm, DeviceView
+from energoatlas.aiogram.callbacks import (MainMenu, CompaniesForm, ObjectsForm, DevicesForm, DeviceView,
+                                          NotificationSettings, DeviceMute)
 from energoatlas.aiogram.states import Auth
 from energoatlas.aiogram.middlewares import MessageEraserMiddleware
-from energoatlas.managers import ApiManager, MessageFormatter
+from energoatlas.managers import ApiManager, MessageFormatter, UserManager
 from energoatlas.models.aiogram import Device
 from energoatlas.settings import settings
+from energoatlas.tables import NotificationFilterTable
+
+
+def device_label(device: Device) -> str:
+    return f'{device.name} ({device.type})'
+
+
+def pressed_button_text(query: CallbackQuery, callback_data: DeviceView) -> str | None:
+    """Текст кнопки с данными ``callback_data`` в клавиатуре сообщения, из которого пришел запрос"""
+    if query.message is None or not getattr(query.message, 'reply_markup', None):
+        return None
+    packed = callback_data.pack()
+    for row in query.message.reply_markup.inline_keyboard:
+        for button in row:
+            if button.callback_data == packed:
+                return button.text
+    return None
 
 
 main_menu = InlineKeyboardBuilder()
@@ -33,6 +53,8 @@ async def render_main_menu(event: Message | CallbackQuery):
     keyboard = InlineKeyboardBuilder()
     btn_text = 'Состояние параметров устройств'
     keyboard.button(text=btn_text, callback_data=CompaniesForm())
+    keyboard.button(text='Настройки уведомлений', callback_data=NotificationSettings())
+    keyboard.adjust(1, 1)
 
     if isinstance(event, CallbackQuery):
         await event.message.edit_text(
@@ -131,7 +153,7 @@ async def render_devices_list(
     object_id = callback_data.object_id
 
     try:
-        devices = await api_manager.get_object_devices(object_id, auth_token)
+        devices = await api_manager.get_cached_object_devices(object_id, auth_token)
     except HTTPError:
         await query.answer(text=settings.api_error_message)
         return await render_objects_list(query=query, state=state, auth_token=auth_token, api_manager=api_manager,
@@ -141,8 +163,7 @@ async def render_devices_list(
 
     keyboard = InlineKeyboardBuilder()
     for device in devices:
-        btn_text = f'{device.name} ({device.type})'
-        keyboard.button(text=btn_text, callback_data=DeviceView(device_id=device.id, object_id=object_id,
+        keyboard.button(text=device_label(device), callback_data=DeviceView(device_id=device.id, object_id=object_id,
                                                                 company_id=callback_data.company_id))
     keyboard.adjust(1, 1)
 
@@ -160,24 +181,49 @@ async def render_device_view(
     state: FSMContext,
     callback_data: DeviceView,
     auth_token: str,
-    api_manager: ApiManager
+    api_manager: ApiManager,
+    user_manager: UserManager
 ):
-    """Отобразить параметры выбранного устройства"""
+    """Отобразить параметры выбранного устройства. Название устройства берется из нажатой кнопки списка устройств или
+    из недавно загруженного списка. Если название известно, доступ к устройству подтвержден, и текущие значения
+    параметров берутся из общего для пользователей кеша. Иначе значения и список устройств объекта запрашиваются
+    одновременно"""
+    device_id = callback_data.device_id
+    device_name = pressed_button_text(query, callback_data)
+    if device_name is None and (device := api_manager.find_cached_device(callback_data.object_id, device_id,
+                                                                          auth_token)):
+        device_name = device_label(device)
     try:
-        device_params = await api_manager.get_device_status(callback_data.device_id, auth_token)
-        devices = await api_manager.get_object_devices(callback_data.object_id, auth_token)
+        if device_name is not None:
+            device_params = await api_manager.get_cached_device_status(device_id, auth_token)
+        else:
+            device_params, devices = await asyncio.gather(
+                api_manager.get_device_status(device_id, auth_token),
+                api_manager.get_cached_object_devices(callback_data.object_id, auth_token)
+            )
+            device = next((device for device in devices if device.id == device_id), None)
+            device_name = device_label(device) if device else None
     except HTTPError:
         await query.answer(text=settings.api_error_message)
         return await render_objects_list(query=query, state=state, auth_token=auth_token, api_manager=api_manager,
                                          callback_data=ObjectsForm(company_id=callback_data.company_id))
 
-    device: Device = next(filter(lambda d: d.id == callback_data.device_id, devices))
-    device_name = f'{device.name} ({device.type})'
+    if device_name is None:
+        await query.answer(text='Устройство недоступно')
+        return await render_devices_list(query=query, state=state, auth_token=auth_token, api_manager=api_manager,
+                                         callback_data=DevicesForm(object_id=callback_data.object_id,
+                                                                   company_id=callback_data.company_id))
     device_params = [param for param in device_params if param.descr in settings.device_params_descr]
 
     message_params = MessageFormatter.device_params_message(device_name, device_params)
 
+    notification_filter = await user_manager.get_notification_filter(query.from_user.id)
+    muted = callback_data.device_id in notification_filter.muted_device_ids
+
     keyboard = InlineKeyboardBuilder()
+    keyboard.button(text='Уведомлять об устройстве' if muted else 'Не уведомлять об устройстве',
+                    callback_data=DeviceMute(device_id=callback_data.device_id, object_id=callback_data.object_id,
+                                             company_id=callback_data.company_id))
     if paginated_keyboard := await PaginatedKeyboard.last_opened(state):
         keyboard.button(text='К списку устройств', callback_data=paginated_keyboard.last_opened_page_cb())
     else:
@@ -189,3 +235,80 @@ async def render_device_view(
         text=message_params.text,
         parse_mode=message_params.parse_mode,
         reply_markup=keyboard.attach(main_menu).as_markup())
+
+
+@router.callback_query(Auth.authorized, DeviceMute.filter())
+async def toggle_device_mute(
+    query: CallbackQuery,
+    state: FSMContext,
+    callback_data: DeviceMute,
+    auth_token: str,
+    api_manager: ApiManager,
+    user_manager: UserManager
+):
+    """Включить или отключить уведомления о срабатываниях на устройстве"""
+    notification_filter = await user_manager.get_notification_filter(query.from_user.id)
+    muted_device_ids = set(notification_filter.muted_device_ids)
+    muted_device_ids ^= {callback_data.device_id}
+    notification_filter.muted_device_ids = sorted(muted_device_ids)
+    await user_manager.save_notification_filter(notification_filter)
+
+    callback_data = DeviceView(device_id=callback_data.device_id, object_id=callback_data.object_id,
+                               company_id=callback_data.company_id)
+    await render_device_view(query=query, state=state, callback_data=callback_data, auth_token=auth_token,
+                             api_manager=api_manager, user_manager=user_manager)
+
+
+@router.callback_query(Auth.authorized, NotificationSettings.filter())
+async def render_notification_settings(
+    query: CallbackQuery,
+    callback_data: NotificationSettings,
+    user_manager: UserManager
+):
+    """Отобразить настройки уведомлений. Нажатие на кнопку настройки переключает ее"""
+    notification_filter = await user_manager.get_notification_filter(query.from_user.id)
+    if callback_data.toggle:
+        _toggle_notification_filter(notification_filter, callback_data)
+        await user_manager.save_notification_filter(notification_filter)
+
+    await query.message.edit_text(
+        text='Выберите, о каких событиях присылать уведомления',
+        reply_markup=notification_settings_keyboard(notification_filter).attach(main_menu).as_markup())
+
+
+def notification_settings_keyboard(notification_filter: NotificationFilterTable) -> InlineKeyboardBuilder:
+    """Клавиатура настроек уведомлений: кнопка каждой настройки показывает ее состояние"""
+    event_types = notification_filter.event_types
+    keyboard = InlineKeyboardBuilder()
+    for event_type, name in settings.event_type_names.items():
+        enabled = event_types is None or event_type in event_types
+        keyboard.button(text=f'{"✅" if enabled else "❌"} {name}',
+                        callback_data=NotificationSettings(toggle='type', event_type=event_type))
+    keyboard.button(text=f'{"❌" if notification_filter.mute_recoveries else "✅"} Устранение аварий',
+                    callback_data=NotificationSettings(toggle='recoveries'))
+    quiet_hours = f'{settings.quiet_hours_from:%H:%M}-{settings.quiet_hours_to:%H:%M}'
+    if notification_filter.quiet_from and notification_filter.quiet_to:
+        quiet_hours = f'{notification_filter.quiet_from:%H:%M}-{notification_filter.quiet_to:%H:%M}'
+    keyboard.button(text=f'{"✅" if notification_filter.quiet_from else "❌"} Без звука {quiet_hours}',
+                    callback_data=NotificationSettings(toggle='quiet'))
+    keyboard.adjust(1, 1)
+    return keyboard
+
+
+def _toggle_notification_filter(notification_filter: NotificationFilterTable,
+                                callback_data: NotificationSettings) -> None:
+    """Переключить настройку фильтра уведомлений. Списки заменяются целиком, чтобы изменение было сохранено"""
+    toggle = callback_data.toggle
+    if toggle == 'recoveries':
+        notification_filter.mute_recoveries = not notification_filter.mute_recoveries
+    elif toggle == 'quiet':
+        if notification_filter.quiet_from:
+            notification_filter.quiet_from = notification_filter.quiet_to = None
+        else:
+            notification_filter.quiet_from = settings.quiet_hours_from
+            notification_filter.quiet_to = settings.quiet_hours_to
+    elif toggle == 'type' and callback_data.event_type in settings.event_type_names:
+        all_types = set(settings.event_type_names)
+        event_types = set(all_types if notification_filter.event_types is None else notification_filter.event_types)
+        event_types ^= {callback_data.event_type}
+        notification_filter.event_types = None if event_types >= all_types else sorted(event_types)
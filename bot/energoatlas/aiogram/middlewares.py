@@ -9,7 +9,6 @@ from loguru import logger
 from httpx import HTTPError
 
 from energoatlas.aiogram.states import Auth
-from energoatlas.database import AsyncSessionMaker
 from energoatlas.settings import settings
 from energoatlas.managers import ApiManager, UserManager
 from energoatlas.models.background import TelegramMessageParams
@@ -27,20 +26,19 @@ class DependencyInjectionMiddleware(BaseMiddleware):
             data: dict[str, Any]
     ) -> Any:
         api_manager: ApiManager = data['api_manager']
-        async with AsyncSessionMaker() as session:
-            user_manager = UserManager(api_manager, session=session)
-            data['user_manager'] = user_manager
-            await handler(event, data)
-
-
-async def get_auth_token(state: FSMContext, api_manager: ApiManager) -> str | None:
-    state_data = await state.get_data()
-    login, password = state_data.get('login'), state_data.get('password')
-    token = await api_manager.get_auth_token(login, password)
-    return token
+        # Сессия создается и получает соединение из пула только при первом обращении обработчика к базе данных
+        user_manager = UserManager(api_manager)
+        data['user_manager'] = user_manager
+        try:
+            return await handler(event, data)
+        finally:
+            await user_manager.release()
 
 
 class AuthValidationMiddleware(BaseMiddleware):
+    """Получает токен API Энергоатлас по учетным данным пользователя из базы данных. В состоянии FSM хранится только
+    признак авторизации: учетные данные в хранилище FSM не записываются. Токен авторизованного пользователя
+    переиспользуется в течение ``auth_token_cache_ttl``, поэтому большинство обновлений не обращается к базе данных"""
     async def __call__(
         self,
         handler: Callable[[Message | CallbackQuery, dict[str, Any]], Awaitable[Any]],
@@ -50,35 +48,45 @@ class AuthValidationMiddleware(BaseMiddleware):
         state: FSMContext = data['state']
         api_manager: ApiManager = data['api_manager']
         user_manager: UserManager = data['user_manager']
+        user_id = event.from_user.id
 
-        if await state.get_state() == Auth.authorized:
-            try:
-                token = await get_auth_token(state, api_manager)
-            except HTTPError:
-                return await event.answer(text=settings.api_error_message)
-
-            if token:
-                data['auth_token'] = token
+        authorized = await state.get_state() == Auth.authorized
+        try:
+            if authorized:
+                token = await api_manager.auth_token_cache.get(
+                    user_id, lambda: self.get_auth_token(user_id, api_manager, user_manager)
+                )
             else:
-                await state.clear()
-                await user_manager.remove_user(event.from_user.id)
-                params = TelegramMessageParams(text=settings.need_authorize_message)
-                await api_manager.send_telegram_message(chat_id=event.from_user.id, message_params=params)
-        else:
-            if credentials := await user_manager.get_user_credentials(event.from_user.id):
-                login, password = credentials
-                try:
-                    token = await api_manager.get_auth_token(login, password)
-                except HTTPError:
-                    return await event.answer(text=settings.api_error_message)
-
-                if token:
-                    data['auth_token'] = token
-                    await state.set_state(Auth.authorized)
-                    await state.update_data(login=login, password=password)
+                token = await self.get_auth_token(user_id, api_manager, user_manager)
+        except HTTPError:
+            return await event.answer(text=settings.api_error_message)
+
+        if token:
+            data['auth_token'] = token
+            if not authorized:
+                await state.set_state(Auth.authorized)
+        elif authorized:
+            await state.clear()
+            await user_manager.remove_user(user_id)
+            params = TelegramMessageParams(text=settings.need_authorize_message)
+            try:
+                await api_manager.send_telegram_message(chat_id=user_id, message_params=params)
+            except TelegramAPIError as exc:
+                logger.warning(f'[Telegram API] {exc.message}')
 
         await handler(event, data)
 
+    @staticmethod
+    async def get_auth_token(user_id: int, api_manager: ApiManager, user_manager: UserManager) -> str | None:
+        """Получить токен по учетным данным пользователя из базы данных"""
+        credentials = await user_manager.get_user_credentials(user_id)
+        # Соединение не удерживается на время запроса к API
+        await user_manager.release()
+        if not credentials:
+            return None
+        login, password = credentials
+        return await api_manager.get_auth_token(login, password)
+
 
 class TelegramApiErrorHandlerMiddleware(BaseMiddleware):
     async def __call__(
@@ -105,11 +113,11 @@ class MessageEraserMiddleware(BaseMiddleware):
     ) -> Any:
         state: FSMContext = data['state']
         state_data = await state.get_data()
-        if last_message := state_data.get('last_message'):
+        if last_message_id := state_data.get('last_message_id'):
             try:
-                await last_message.delete()
+                await event.bot.delete_message(chat_id=event.chat.id, message_id=last_message_id)
             except TelegramAPIError:
                 pass
         message = await handler(event, data)
-        await state.update_data(last_message=message)
+        await state.update_data(last_message_id=message.message_id if isinstance(message, Message) else None)
 
@@ -0,0 +1,98 @@
+import json
+from datetime import datetime, timedelta
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DEFAULT_DESTINY
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from loguru import logger
+from sqlalchemy import select, delete, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from energoatlas.database import get_async_engine
+from energoatlas.settings import settings
+from energoatlas.tables import FsmStateTable
+
+
+def compact_dumps(data: Any) -> str:
+    """Сериализация данных состояния без лишних пробелов и экранирования кириллицы"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def storage_key(key: StorageKey) -> str:
+    parts = [key.bot_id, key.chat_id, key.user_id]
+    if key.thread_id:
+        parts.append(key.thread_id)
+    if key.destiny != DEFAULT_DESTINY:
+        parts.append(key.destiny)
+    return ':'.join(map(str, parts))
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище состояний FSM в таблице базы данных. Состояние и данные чата, не изменявшиеся дольше ``ttl``,
+    считаются отсутствующими и удаляются методом ``purge_expired``"""
+    def __init__(self, engine: AsyncEngine, ttl: timedelta | None = None):
+        self.engine = engine
+        self.ttl = ttl
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        row = await self._get(key)
+        return row.state if row else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self._upsert(key, data=data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        row = await self._get(key)
+        return dict(row.data) if row else {}
+
+    async def close(self) -> None:
+        pass
+
+    async def purge_expired(self) -> None:
+        """Удалить состояния чатов, не изменявшиеся дольше ``ttl``"""
+        if not self.ttl:
+            return
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                delete(FsmStateTable).where(FsmStateTable.updated_at <= datetime.now() - self.ttl)
+            )
+        logger.info(f'[FSM] Удалено устаревших состояний: {result.rowcount}')
+
+    async def _get(self, key: StorageKey):
+        query = select(FsmStateTable.state, FsmStateTable.data).where(FsmStateTable.key == storage_key(key))
+        if self.ttl:
+            query = query.where(FsmStateTable.updated_at > datetime.now() - self.ttl)
+        async with self.engine.connect() as conn:
+            return (await conn.execute(query)).first()
+
+    async def _upsert(self, key: StorageKey, **values) -> None:
+        now = datetime.now()
+        statement = insert(FsmStateTable).values(key=storage_key(key), state=None, data={}, updated_at=now)
+        statement = statement.values(**values)
+        changes = dict(values, updated_at=now)
+        if self.ttl:
+            # Не изменяемая часть устаревшей записи сбрасывается, а не оживает вместе с изменяемой
+            fresh = FsmStateTable.updated_at > now - self.ttl
+            for column in ('state', 'data'):
+                if column not in values:
+                    changes[column] = case((fresh, FsmStateTable.__table__.c[column]),
+                                           else_=statement.excluded[column])
+        statement = statement.on_conflict_do_update(index_elements=[FsmStateTable.key], set_=changes)
+        async with self.engine.begin() as conn:
+            await conn.execute(statement)
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Создать хранилище состояний FSM, выбранное в настройках"""
+    ttl = timedelta(seconds=settings.fsm_ttl) if settings.fsm_ttl else None
+    if settings.fsm_storage == 'postgres':
+        return PostgresStorage(get_async_engine(), ttl=ttl)
+    if settings.fsm_storage == 'redis':
+        return RedisStorage.from_url(settings.fsm_redis_url, state_ttl=ttl, data_ttl=ttl, json_dumps=compact_dumps)
+    return MemoryStorage()
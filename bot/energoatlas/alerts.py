@@ -0,0 +1,83 @@
+"""
+Уведомления об авариях, дополняемые событиями об их устранении.
+
+Для каждой аварии (чат, устройство, тип события) запоминается отправленное о ней сообщение. Событие об устранении
+аварии того же типа на том же устройстве дописывается в это сообщение (``editMessageText``), а не отправляется
+отдельным сообщением. Если сообщение устарело, слишком длинное или не может быть изменено, отправляется новое.
+"""
+from typing import Iterable
+
+from energoatlas.models.background import DeviceWithLogs
+from energoatlas.tables import AlertMessageTable
+from energoatlas.utils import local_now
+
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+ThreadKey = tuple[int, int, str]
+
+
+class AlertThreads:
+    def __init__(self, rows: Iterable[AlertMessageTable] = ()):
+        """
+        Активные уведомления об авариях в рамках одной рассылки и изменения, которые нужно сохранить после нее.
+        :param rows: сохраненные уведомления об авариях, которые могут быть дополнены
+        """
+        self.active: dict[ThreadKey, AlertMessageTable] = {
+            (row.chat_id, row.device_id, row.event_type): row for row in rows
+        }
+        self.sent: list[AlertMessageTable] = []
+        """Новые уведомления об авариях"""
+        self.edited: list[tuple[AlertMessageTable, str]] = []
+        """Дополненные уведомления и их новый текст"""
+        self.resolved: list[ThreadKey] = []
+        """Аварии, об устранении которых дописано в уведомление"""
+
+    def split(self, chat_id: int, device_logs: list[DeviceWithLogs]) \
+            -> tuple[dict[int, tuple[AlertMessageTable, list[DeviceWithLogs]]], list[DeviceWithLogs]]:
+        """Разделить срабатывания для чата на события об устранении аварий, о которых в чат уже отправлено
+        уведомление (по идентификатору этого сообщения), и остальные срабатывания"""
+        if not self.active:
+            return {}, device_logs
+        edits: dict[int, tuple[AlertMessageTable, list[DeviceWithLogs]]] = {}
+        rest = []
+        for unit in device_logs:
+            new_logs = []
+            for log in unit.logs:
+                thread = None
+                if log.category is not None and log.category.severity == 'recovery':
+                    thread = self.active.get((chat_id, unit.device.id, log.category.event_type))
+                if thread is None:
+                    new_logs.append(log)
+                    continue
+                _, units = edits.setdefault(thread.message_id, (thread, []))
+                if units and units[-1].device is unit.device:
+                    units[-1].logs.append(log)
+                else:
+                    units.append(DeviceWithLogs(unit.device, [log]))
+            if len(new_logs) == len(unit.logs):
+                rest.append(unit)
+            elif new_logs:
+                rest.append(DeviceWithLogs(unit.device, new_logs))
+        return edits, rest
+
+    def record_sent(self, chat_id: int, message_id: int, text: str, device_logs: list[DeviceWithLogs]) -> None:
+        """Запомнить отправленное уведомление как уведомление о содержащихся в нем авариях"""
+        now = local_now()
+        keys = set()
+        recovered = set()
+        for unit in device_logs:
+            for log in unit.logs:
+                if log.category is not None:
+                    key = (unit.device.id, log.category.event_type)
+                    (recovered if log.category.severity == 'recovery' else keys).add(key)
+        keys -= recovered
+        self.sent += [AlertMessageTable(chat_id=chat_id, device_id=device_id, event_type=event_type,
+                                        message_id=message_id, text=text, sent_at=now)
+                      for device_id, event_type in keys]
+
+    def record_edit(self, thread: AlertMessageTable, text: str, device_logs: list[DeviceWithLogs]) -> None:
+        """Запомнить дополненное событиями об устранении уведомление"""
+        self.edited.append((thread, text))
+        self.resolved += [(thread.chat_id, unit.device.id, log.category.event_type)
+                          for unit in device_logs for log in unit.logs]
@@ -1,7 +1,7 @@
 import asyncio
+from multiprocessing import get_context
 
-from aiogram import Dispatcher, Bot, Router
-from elasticsearch import AsyncElasticsearch
+from aiogram import Dispatcher, Router
 from loguru import logger
 
 from aiogram_extensions.paginator import router as paginator_router
@@ -9,11 +9,13 @@ from aioshedule import Scheduler
 
 from energoatlas.aiogram import router as app_router
 from energoatlas.aiogram.middlewares import *
-from energoatlas.dependencies import http_client
-from energoatlas.database import main_thread_async_engine
-from energoatlas.tables import Base
+from energoatlas.aiogram.storage import PostgresStorage, create_fsm_storage
+from energoatlas.dependencies import http_clients
+from energoatlas.database import check_schema_version
+from energoatlas.metrics import start_metrics_server, observe_fsm_storage
+from energoatlas.webhook import serve_webhook, set_webhook
 from energoatlas.settings import settings
-from energoatlas.managers import UserManager, LogManager, ApiManager
+from energoatlas.managers import UserManager, LogManager, ApiManager, LogPartitionManager
 
 
 router = Router(name=__name__)
@@ -27,30 +29,77 @@ router.message.outer_middleware(AuthValidationMiddleware())
 router.callback_query.outer_middleware(AuthValidationMiddleware())
 router.callback_query.middleware(TelegramApiErrorHandlerMiddleware())
 
-bot = Bot(token=settings.bot_token)
 
-es = AsyncElasticsearch(hosts=[settings.elasticsearch_url], basic_auth=(settings.elasticsearch_username, settings.elasticsearch_password))
+async def on_startup(dispatcher: Dispatcher, role: str = 'all'):
+    await check_schema_version()
+    if settings.metrics_enable:
+        await start_metrics_server(settings.metrics_host, settings.metrics_port)
+    http_clients_dependency = http_clients()
+    clients = await anext(http_clients_dependency)
+    # Обработчики бота и рассылка уведомлений обращаются к Telegram через один бот поверх общего HTTP-клиента
+    api_manager = ApiManager(clients['default'], clients=clients)
+    logger.info(f'Started with role {role}...')
+    if role == 'bot':
+        await run_bot(api_manager, dispatcher)
+    elif role == 'all':
+        _ = asyncio.create_task(run_scheduled_tasks(api_manager, dispatcher, role))
+        await run_bot(api_manager, dispatcher)
+    else:
+        await run_scheduled_tasks(api_manager, dispatcher, role)
 
 
-async def on_startup(dispatcher: Dispatcher):
-    await create_tables()
-    http_client_dependency = http_client()
-    client = await anext(http_client_dependency)
-    api_manager = ApiManager(client)
-    _ = asyncio.create_task(run_scheduled_tasks(api_manager, dispatcher))
-    logger.info('Started polling...')
+async def run_bot(api_manager: ApiManager, dispatcher: Dispatcher):
+    bot = api_manager.bot
     await bot.set_my_commands(settings.bot_commands)
-    await dispatcher.start_polling(bot, api_manager=api_manager)
+    if settings.bot_mode == 'webhook':
+        await set_webhook(dispatcher, bot)
+        start_webhook_workers(settings.webhook_workers - 1)
+        await serve_webhook(dispatcher, bot, api_manager=api_manager)
+    else:
+        logger.info('Started polling...')
+        await dispatcher.start_polling(bot, api_manager=api_manager)
+
+
+def start_webhook_workers(count: int):
+    """Запустить дополнительные процессы, принимающие обновления вебхука на том же порту. Фоновые задачи выполняются
+    только в основном процессе"""
+    if count > 0 and settings.fsm_storage == 'memory':
+        logger.warning('Webhook workers do not share FSM state stored in memory, use fsm_storage=postgres or redis')
+    context = get_context('spawn')
+    for i in range(count):
+        context.Process(target=run_webhook_worker, name=f'webhook-worker-{i + 1}', daemon=True).start()
+
+
+def run_webhook_worker():
+    asyncio.run(webhook_worker())
 
 
-async def run_scheduled_tasks(api_manager: ApiManager, dispatcher: Dispatcher):
+async def webhook_worker():
+    dispatcher = create_dispatcher()
+    http_clients_dependency = http_clients()
+    clients = await anext(http_clients_dependency)
+    api_manager = ApiManager(clients['default'], clients=clients)
+    await serve_webhook(dispatcher, api_manager.bot, api_manager=api_manager)
+
+
+async def run_scheduled_tasks(api_manager: ApiManager, dispatcher: Dispatcher, role: str = 'all'):
+    """Выполнять фоновые задачи роли ``role``: обновление устройств пользователей (poller) и опрос логов с рассылкой
+    уведомлений (notifier)"""
     schedule = Scheduler()
+    bot = api_manager.bot
 
-    user_manager = UserManager(api_manager, bot=bot, dispatcher=dispatcher)
-    log_manager = LogManager(api_manager)
+    if role in ('poller', 'all'):
+        if role == 'poller' and settings.fsm_storage == 'memory':
+            logger.warning('Poller cannot reset FSM state of the bot stored in memory, use fsm_storage=postgres or redis')
+        user_manager = UserManager(api_manager, bot=bot, dispatcher=dispatcher)
+        schedule.every().day.do(user_manager.update_all_users)
+        schedule.every().day.do(LogPartitionManager().maintain_partitions)
+        if isinstance(dispatcher.storage, PostgresStorage):
+            schedule.every().hour.do(dispatcher.storage.purge_expired)
 
-    schedule.every().day.do(user_manager.update_all_users)
-    schedule.every().minute.do(log_manager.request_logs_and_notify)
+    if role in ('notifier', 'all'):
+        log_manager = LogManager(api_manager, bot=bot, dispatcher=dispatcher)
+        schedule.every().minute.do(log_manager.request_logs_and_notify)
 
     logger.info('Started background tasks...')
 
@@ -61,15 +110,15 @@ async def run_scheduled_tasks(api_manager: ApiManager, dispatcher: Dispatcher):
         await asyncio.sleep(1)
 
 
-async def create_tables():
-    async with main_thread_async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+def create_dispatcher() -> Dispatcher:
+    dispatcher = Dispatcher(storage=create_fsm_storage())
+    dispatcher.include_router(router)
+    observe_fsm_storage(dispatcher.storage)
+    return dispatcher
 
 
-async def main():
-    dispatcher = Dispatcher()
-    dispatcher.include_router(router)
-    await on_startup(dispatcher)
+async def main(role: str = 'all'):
+    await on_startup(create_dispatcher(), role)
 
 
 def handle_task_exception(_, context):
@@ -82,7 +131,3 @@ def handle_task_exception(_, context):
 
 def custom_excepthook(exc_type, exc_value, exc_traceback):
     logger.opt(exception=(exc_type, exc_value, exc_traceback)).error("Uncaught Exception")
-
-
-async def send_log_to_elastic(message):
-    await es.index(index=f'{settings.elasticsearch_template}-{settings.elasticsearch_status}', body=message)
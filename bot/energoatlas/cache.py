@@ -0,0 +1,66 @@
+"""
+Кеш результатов запросов к API с ограниченным временем жизни.
+
+Одновременные запросы одного ключа объединяются: загрузка выполняется один раз, и ее результат получают все
+ожидающие. Ошибки и пустые результаты не кешируются.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from energoatlas.metrics import API_CACHE_REQUESTS
+
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TtlCache(Generic[K, V]):
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        """
+        :param name: название кеша в метриках
+        :param ttl: время жизни (в секундах) загруженного значения
+        :param maxsize: наибольшее количество значений. При переполнении вытесняются самые старые
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: dict[K, tuple[float, V]] = {}
+        self._loading: dict[K, asyncio.Task] = {}
+        self._hits = API_CACHE_REQUESTS.labels(name, 'hit')
+        self._shared = API_CACHE_REQUESTS.labels(name, 'shared')
+        self._misses = API_CACHE_REQUESTS.labels(name, 'miss')
+
+    def peek(self, key: K) -> V | None:
+        """Значение из кеша без загрузки или None, если значение отсутствует или устарело"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def get(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        """Значение из кеша. Отсутствующее значение загружается ``load`` (одна загрузка на все ожидающие запросы)"""
+        if (value := self.peek(key)) is not None:
+            self._hits.inc()
+            return value
+        task = self._loading.get(key)
+        if task is None:
+            self._misses.inc()
+            task = self._loading[key] = asyncio.ensure_future(load())
+            task.add_done_callback(lambda done: self._store(key, done))
+        else:
+            self._shared.inc()
+        # Отмена одного из ожидающих не прерывает загрузку для остальных
+        return await asyncio.shield(task)
+
+    def discard(self, key: K) -> None:
+        """Удалить значение из кеша"""
+        self._entries.pop(key, None)
+
+    def _store(self, key: K, task: asyncio.Task) -> None:
+        self._loading.pop(key, None)
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+        if len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
@@ -0,0 +1,60 @@
+"""
+Классификация сообщений о срабатываниях аварийных критериев.
+
+Правила из ``settings.log_rules`` компилируются один раз: точные совпадения - в словарь, правила по префиксу - в
+префиксное дерево, в котором выбирается самый длинный подходящий префикс. Уточнение в скобках
+("Протечка (Хранилище 2)") при сопоставлении отбрасывается. Результаты классификации кэшируются по тексту
+сообщения, поэтому время классификации не зависит от количества правил.
+"""
+from functools import lru_cache
+from typing import Iterable
+
+from energoatlas.models.background import LogCategory
+from energoatlas.settings import settings, LogRule
+
+
+_MATCH = ''  # Ключ категории в узле префиксного дерева (пустая строка не совпадает ни с одним символом)
+
+
+class LogClassifier:
+    def __init__(self, rules: Iterable[LogRule], cache_size: int = 4096):
+        """
+        Классификатор сообщений о срабатываниях.
+        :param rules: правила классификации. При совпадении нескольких правил по префиксу выбирается самое длинное
+        :param cache_size: количество различных сообщений, результаты классификации которых кэшируются
+        """
+        self._exact: dict[str, LogCategory] = {}
+        self._prefixes: dict = {}
+        self.categories: set[LogCategory] = set()
+        for rule in rules:
+            category = LogCategory(rule.event_type, rule.severity)
+            self.categories.add(category)
+            if rule.match == 'exact':
+                self._exact[rule.pattern] = category
+            else:
+                node = self._prefixes
+                for char in rule.pattern:
+                    node = node.setdefault(char, {})
+                node[_MATCH] = category
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, message: str) -> LogCategory | None:
+        """Категория сообщения или None, если сообщение не отслеживается"""
+        text = message.partition('(')[0].strip()
+        category = self._exact.get(text)
+        if category is None and self._prefixes:
+            category = self._match_prefix(text)
+        return category
+
+    def _match_prefix(self, text: str) -> LogCategory | None:
+        node = self._prefixes
+        category = node.get(_MATCH)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            category = node.get(_MATCH, category)
+        return category
+
+
+classifier = LogClassifier(settings.log_rules)
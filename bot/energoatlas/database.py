@@ -1,32 +1,107 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine
+import time
+from functools import cache
+from pathlib import Path
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, Pool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
 from energoatlas.settings import settings
+from energoatlas.metrics import (DB_POOL_CHECKOUT, DB_POOL_CHECKOUTS, DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW,
+                                 DB_POOL_INVALIDATIONS)
+
+
+MIGRATIONS_CONFIG = Path(__file__).resolve().parent.parent / 'alembic.ini'
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Пул соединений, учитывающий в метриках время получения соединения"""
+    def connect(self) -> PoolProxiedConnection:
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - started_at)
+
+
+def observe_pool(pool: Pool) -> None:
+    """Учитывать в метриках события пула соединений: выдачу, переполнение и инвалидацию соединений"""
+    event.listen(pool, 'checkout', lambda *_: DB_POOL_CHECKOUTS.inc())
+    event.listen(pool, 'invalidate', lambda *_: DB_POOL_INVALIDATIONS.labels('invalidate').inc())
+    event.listen(pool, 'soft_invalidate', lambda *_: DB_POOL_INVALIDATIONS.labels('soft_invalidate').inc())
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+
+
+def database_url(driver: str = 'asyncpg', database: str | None = None) -> URL:
+    return URL.create(
+        f'postgresql+{driver}',
+        username=settings.db_username,
+        password=settings.db_password,
+        host=settings.db_host,
+        port=settings.db_port,
+        database=database or settings.db_database
+    )
+
+
+def server_settings() -> dict[str, str]:
+    """Параметры сеанса PostgreSQL, ограничивающие длительность запросов и простаивающих транзакций (мс)"""
+    timeouts = {
+        'statement_timeout': settings.db_statement_timeout,
+        'idle_in_transaction_session_timeout': settings.db_idle_in_transaction_timeout,
+    }
+    return {name: str(value) for name, value in timeouts.items() if value}
+
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    """Асинхронный движок основной базы данных. Создается при первом обращении"""
+    engine = create_async_engine(
+        database_url(),
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            'statement_cache_size': settings.db_statement_cache_size,
+            'command_timeout': settings.db_command_timeout or None,
+            'server_settings': server_settings(),
+        },
+    )
+    observe_pool(engine.sync_engine.pool)
+    return engine
+
+
+@cache
+def get_engine() -> Engine:
+    """Синхронный движок основной базы данных. Создается при первом обращении"""
+    return create_engine(database_url('psycopg2'), pool_pre_ping=settings.db_pool_pre_ping)
 
 
-url_params = {
-    'username': settings.db_username,
-    'password': settings.db_password,
-    'host': settings.db_host,
-    'port': settings.db_port,
-    'database': settings.db_database
-}
+@cache
+def get_async_session_maker() -> async_sessionmaker:
+    return async_sessionmaker(get_async_engine(), expire_on_commit=False)
 
-url_object = URL.create(
-    'postgresql+psycopg2',
-    **url_params
-)
 
-async_url_object = URL.create(
-    'postgresql+asyncpg',
-    **url_params
-)
+@cache
+def get_session_maker() -> sessionmaker:
+    return sessionmaker(get_engine())
 
-engine = create_engine(url_object)
-main_thread_async_engine = create_async_engine(async_url_object, pool_size=5, max_overflow=0, pool_timeout=3600)
 
-SessionMaker = sessionmaker(engine)
-AsyncSessionMaker = async_sessionmaker(main_thread_async_engine, expire_on_commit=False)
+async def check_schema_version() -> None:
+    """Проверить, что к базе данных применены все миграции. Схема при запуске не изменяется: миграции применяются
+    командой ``alembic upgrade head``"""
+    expected = set(ScriptDirectory.from_config(Config(MIGRATIONS_CONFIG)).get_heads())
+    async with get_async_engine().connect() as conn:
+        current = await conn.run_sync(lambda sync_conn: set(MigrationContext.configure(sync_conn).get_current_heads()))
+    if current != expected:
+        raise RuntimeError(f'Database schema version {sorted(current) or "<none>"} does not match the expected '
+                           f'{sorted(expected)}, apply migrations with "alembic upgrade head"')
@@ -0,0 +1,61 @@
+"""
+Разбор ответов API Энергоатлас.
+
+Тело ответа валидируется целиком одним вызовом заранее построенного ``TypeAdapter`` (разбор JSON и валидация
+выполняются в pydantic-core без промежуточных словарей). В доверенном режиме (``api_trusted_payloads``) ответы
+массовых методов опроса разбираются orjson, а объекты создаются без валидации каждого элемента.
+Срабатывания и устройства - легкие классы со ``__slots__`` (``energoatlas.models.background``), pydantic
+используется только на границе с API.
+"""
+from datetime import datetime
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+
+from energoatlas.models.aiogram import Company, Object, Device, Parameter
+from energoatlas.models.background import Device as DeviceObject
+from energoatlas.models.background import Log
+from energoatlas.settings import settings
+
+
+class ObjectDevice(BaseModel):
+    """Устройство в составе объекта компании"""
+    id: int
+    name: str
+
+
+class ObjectWithDevices(BaseModel):
+    """Объект компании со списком устройств"""
+    name: str
+    address: str
+    devices: list[ObjectDevice]
+
+
+class ObjectDevices(BaseModel):
+    """Объект со списком устройств с их типами"""
+    devices: list[Device]
+
+
+companies = TypeAdapter(list[Company])
+objects = TypeAdapter(list[Object])
+object_devices = TypeAdapter(ObjectDevices)
+parameters = TypeAdapter(list[Parameter])
+logs = TypeAdapter(list[Log])
+objects_with_devices = TypeAdapter(list[ObjectWithDevices])
+
+
+def decode_logs(content: bytes) -> list[Log]:
+    """Срабатывания аварийных критериев из ответа ``/api2/device/limit-log``"""
+    if settings.api_trusted_payloads:
+        return [Log(item['limit_id'], datetime.fromisoformat(item['latch_dt']), item['latch_message'])
+                for item in orjson.loads(content)]
+    return logs.validate_json(content)
+
+
+def decode_user_devices(content: bytes) -> set[DeviceObject]:
+    """Устройства всех объектов компании из ответа ``/api2/company/objects``"""
+    if settings.api_trusted_payloads:
+        return {DeviceObject(obj['name'], obj['address'], device['id'], device['name'])
+                for obj in orjson.loads(content) for device in obj['devices']}
+    return {DeviceObject(obj.name, obj.address, device.id, device.name)
+            for obj in objects_with_devices.validate_json(content) for device in obj.devices}
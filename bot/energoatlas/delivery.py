@@ -0,0 +1,117 @@
+"""
+Учет доставки уведомлений в чаты Telegram.
+
+Постоянные ошибки (бот заблокирован, чат не найден, аккаунт удален) означают, что чат больше не может получать
+сообщения: такие чаты отписываются от уведомлений. После временных ошибок отправка в чат приостанавливается на время,
+удваивающееся с каждой следующей ошибкой подряд, чтобы не расходовать лимиты Telegram на недоступные чаты, а
+недоставленные срабатывания откладываются до следующей попытки (не более ``max_deferred_logs`` на чат). Остальные
+ошибки (например, ошибки разметки сообщения) повторяются при каждой попытке, поэтому такие уведомления не откладываются.
+"""
+import time
+
+from loguru import logger
+from aiogram.exceptions import (TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+                                TelegramRetryAfter, TelegramServerError)
+
+from energoatlas.models.background import DeviceWithLogs
+from energoatlas.metrics import DELIVERY_FAILURES, DELIVERY_SUPPRESSED
+
+
+PERMANENT_ERROR_MARKERS = (
+    'chat not found',
+    'user is deactivated',
+    'bot was blocked by the user',
+    'bot was kicked',
+    'peer_id_invalid',
+)
+
+
+def is_permanent_error(exc: TelegramAPIError) -> bool:
+    """Означает ли ошибка Telegram API, что чат больше не может получать сообщения бота"""
+    if isinstance(exc, TelegramForbiddenError):
+        return True
+    if isinstance(exc, TelegramBadRequest):
+        description = exc.message.lower()
+        return any(marker in description for marker in PERMANENT_ERROR_MARKERS)
+    return False
+
+
+def is_transient_error(exc: TelegramAPIError) -> bool:
+    """Означает ли ошибка Telegram API временную недоступность: сетевая ошибка, ошибка сервера или превышение лимита"""
+    return isinstance(exc, (TelegramNetworkError, TelegramServerError, TelegramRetryAfter))
+
+
+class DeliveryTracker:
+    def __init__(self, backoff_base: float, backoff_max: float, max_deferred_logs: int = 200):
+        """
+        Учет ошибок доставки уведомлений по чатам.
+        :param backoff_base: время (в секундах) приостановки отправки в чат после первой временной ошибки
+        :param backoff_max: наибольшее время приостановки отправки
+        :param max_deferred_logs: наибольшее количество отложенных срабатываний чата, более старые отбрасываются
+        """
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_deferred_logs = max_deferred_logs
+        self.unreachable: set[int] = set()
+        """Чаты с постоянными ошибками доставки, которые нужно отписать от уведомлений"""
+        self._failures: dict[int, int] = {}
+        self._suppressed_until: dict[int, float] = {}
+        self._deferred: dict[int, list[DeviceWithLogs]] = {}
+
+    def should_send(self, chat_id: int) -> bool:
+        """Можно ли отправить уведомление в чат. Уведомления в недоступные чаты учитываются в метриках"""
+        suppressed_until = self._suppressed_until.get(chat_id)
+        if chat_id in self.unreachable or (suppressed_until is not None and time.monotonic() < suppressed_until):
+            DELIVERY_SUPPRESSED.inc()
+            return False
+        return True
+
+    def record_success(self, chat_id: int) -> None:
+        self._failures.pop(chat_id, None)
+        self._suppressed_until.pop(chat_id, None)
+
+    def record_failure(self, chat_id: int, exc: TelegramAPIError) -> None:
+        """Учесть ошибку доставки. Отправка приостанавливается только после временных ошибок (``is_transient_error``)"""
+        if is_permanent_error(exc):
+            DELIVERY_FAILURES.labels('permanent').inc()
+            self.unreachable.add(chat_id)
+            return
+        if not is_transient_error(exc):
+            DELIVERY_FAILURES.labels('rejected').inc()
+            logger.error(f'[Telegram API] Уведомление в чат {chat_id} отклонено: {exc.message}')
+            return
+        DELIVERY_FAILURES.labels('transient').inc()
+        failures = self._failures[chat_id] = self._failures.get(chat_id, 0) + 1
+        delay = min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+        self._suppressed_until[chat_id] = time.monotonic() + delay
+
+    def defer(self, chat_id: int, device_logs: list[DeviceWithLogs]) -> None:
+        """Отложить недоставленные срабатывания до следующей попытки отправки в чат. Сверх ``max_deferred_logs``
+        отбрасываются самые старые отложенные срабатывания"""
+        if chat_id in self.unreachable:
+            return
+        deferred = self._deferred.setdefault(chat_id, [])
+        deferred.extend(device_logs)
+        excess = sum(len(unit.logs) for unit in deferred) - self.max_deferred_logs
+        if excess <= 0:
+            return
+        logger.warning(f'Отброшено отложенных срабатываний чата {chat_id}: {excess}')
+        while excess > 0:
+            if len(deferred[0].logs) <= excess:
+                excess -= len(deferred.pop(0).logs)
+            else:
+                deferred[0] = DeviceWithLogs(deferred[0].device, deferred[0].logs[excess:])
+                excess = 0
+
+    def pop_deferred(self) -> dict[int, list[DeviceWithLogs]]:
+        """Забрать отложенные срабатывания по чатам"""
+        deferred, self._deferred = self._deferred, {}
+        return deferred
+
+    def pop_unreachable(self) -> set[int]:
+        """Забрать чаты, которые нужно отписать от уведомлений, и забыть их ошибки и отложенные срабатывания"""
+        unreachable, self.unreachable = self.unreachable, set()
+        for chat_id in unreachable:
+            self.record_success(chat_id)
+            self._deferred.pop(chat_id, None)
+        return unreachable
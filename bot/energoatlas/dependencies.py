@@ -1,13 +1,17 @@
 from collections.abc import AsyncGenerator
+from contextlib import AsyncExitStack
 
-from httpx import AsyncClient
+from httpx import AsyncClient, AsyncBaseTransport, AsyncHTTPTransport
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from energoatlas.database import AsyncSessionMaker
+from energoatlas.database import get_async_session_maker
+from energoatlas.recording import RecordingTransport, ReplayTransport
+from energoatlas.settings import HttpClientProfile, settings
+from energoatlas.transport import SharedTransport, create_client
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    session = AsyncSessionMaker()
+    session = get_async_session_maker()()
     await session.begin()
     try:
         yield session
@@ -15,6 +19,24 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
-async def http_client() -> AsyncGenerator[AsyncClient, None]:
-    async with AsyncClient(timeout=30) as client:
-        yield client
+def http_transport() -> AsyncBaseTransport | None:
+    """Транспорт HTTP-клиентов в режиме записи или воспроизведения трафика, общий для всех профилей. В обычном режиме
+    (None) у каждого профиля собственный транспорт"""
+    if settings.http_replay_path:
+        return ReplayTransport(settings.http_replay_path, speed=settings.http_replay_speed)
+    if settings.http_record_path:
+        return RecordingTransport(AsyncHTTPTransport(), settings.http_record_path)
+    return None
+
+
+async def http_clients() -> AsyncGenerator[dict[str, AsyncClient], None]:
+    """HTTP-клиенты по профилям настроек ``http_profiles``"""
+    transport = http_transport()
+    async with AsyncExitStack() as stack:
+        if transport is not None:
+            stack.push_async_callback(transport.aclose)
+            transport = SharedTransport(transport)
+        clients = {}
+        for name, profile in {'default': HttpClientProfile(), **settings.http_profiles}.items():
+            clients[name] = await stack.enter_async_context(create_client(profile, transport))
+        yield clients
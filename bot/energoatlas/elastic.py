@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import deque
+
+from elasticsearch import AsyncElasticsearch
+from loguru import logger
+
+from energoatlas.metrics import ELASTIC_SHIPPED, ELASTIC_DROPPED, ELASTIC_FLUSH_DURATION, ELASTIC_QUEUE_SIZE
+from energoatlas.settings import settings
+
+
+INDEX_ACTION = '{"index":{}}'
+
+
+class ElasticLogShipper:
+    """Буферизованная отправка логов в Elasticsearch пачками через _bulk API. Синхронный sink loguru только кладет
+    сообщение в ограниченный буфер, поэтому логирование не добавляет задержек вызывающему коду. Сообщения, не
+    поместившиеся в буфер, отбрасываются с учетом в метриках"""
+    def __init__(self, es: AsyncElasticsearch, index: str, batch_size: int = 500, flush_interval: float = 5.0,
+                 queue_size: int = 10_000):
+        self.es = es
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._buffer: deque[str] = deque()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._flush_requested: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        ELASTIC_QUEUE_SIZE.set_function(lambda: len(self._buffer))
+
+    def sink(self, message: str) -> None:
+        """Sink loguru (ожидает сообщения, сериализованные с ``serialize=True``)"""
+        if len(self._buffer) >= self.queue_size:
+            ELASTIC_DROPPED.labels('queue_full').inc()
+            return
+        self._buffer.append(str(message))
+        if len(self._buffer) >= self.batch_size and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._flush_requested.set)
+
+    @staticmethod
+    def filter(record) -> bool:
+        """Фильтр для sink, исключающий собственные сообщения об ошибках отправки"""
+        return 'elastic_shipper' not in record['extra']
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Запустить фоновую отправку накопленных сообщений в цикле событий ``loop``"""
+        self._loop = loop
+        self._flush_requested = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def close(self) -> None:
+        """Остановить фоновую отправку, отправив оставшиеся в буфере сообщения"""
+        self._closed = True
+        if self._task:
+            self._flush_requested.set()
+            await self._task
+        await self.flush()
+        await self.es.close()
+
+    async def flush(self) -> None:
+        """Отправить все накопленные сообщения"""
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            operations = []
+            for document in batch:
+                operations += (INDEX_ACTION, document)
+            started_at = time.perf_counter()
+            try:
+                response = await self.es.bulk(operations=operations, index=self.index)
+            except Exception as exc:
+                ELASTIC_DROPPED.labels('error').inc(len(batch))
+                logger.bind(elastic_shipper=True).warning(f'[Elasticsearch] Не удалось отправить {len(batch)} '
+                                                          f'сообщений: {exc}')
+                continue
+            finally:
+                ELASTIC_FLUSH_DURATION.observe(time.perf_counter() - started_at)
+
+            failed = sum(1 for item in response['items'] if item['index'].get('error')) if response['errors'] else 0
+            ELASTIC_SHIPPED.inc(len(batch) - failed)
+            if failed:
+                ELASTIC_DROPPED.labels('rejected').inc(failed)
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+
+def create_log_shipper() -> ElasticLogShipper:
+    es = AsyncElasticsearch(hosts=[settings.elasticsearch_url],
+                            basic_auth=(settings.elasticsearch_username, settings.elasticsearch_password))
+    return ElasticLogShipper(
+        es,
+        index=f'{settings.elasticsearch_template}-{settings.elasticsearch_status}',
+        batch_size=settings.elasticsearch_batch_size,
+        flush_interval=settings.elasticsearch_flush_interval,
+        queue_size=settings.elasticsearch_queue_size,
+    )
@@ -0,0 +1,141 @@
+"""
+Дублирование (hedging) идемпотентных запросов к API.
+
+Если ответ на запрос не получен за время, которое укладывается заданная доля недавних запросов того же метода
+(например, 95%), отправляется копия запроса, и используется первый из полученных ответов. Доля дублирующих запросов
+ограничена бюджетом, чтобы при общей деградации API дублирование не увеличивало нагрузку на него сверх бюджета.
+Дублируется только HTTP-запрос метода (``hedge_request``), обработка ответа выполняется один раз.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
+
+from energoatlas.metrics import API_HEDGED_REQUESTS
+
+
+T = TypeVar('T')
+
+
+class LatencyTracker:
+    def __init__(self, quantile: float, window: int = 1000, min_samples: int = 50, min_delay: float = 0.05,
+                 refresh: int = 20):
+        """
+        Скользящая оценка квантиля длительности запросов одного метода API.
+        :param quantile: квантиль длительности (от 0 до 1), по истечении которого отправляется копия запроса
+        :param window: количество последних запросов, по которым оценивается квантиль
+        :param min_samples: количество запросов, до накопления которого запросы не дублируются
+        :param min_delay: наименьшая задержка (в секундах) перед отправкой копии
+        :param refresh: квантиль пересчитывается каждые ``refresh`` запросов
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.refresh = refresh
+        self._samples: deque[float] = deque(maxlen=window)
+        self._pending = 0
+        self._delay: float | None = None
+
+    def observe(self, duration: float) -> None:
+        self._samples.append(duration)
+        self._pending += 1
+        if self._pending >= self.refresh:
+            self._delay = None
+
+    @property
+    def delay(self) -> float | None:
+        """Задержка перед отправкой копии запроса или None, пока запросов недостаточно для оценки"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._delay is None:
+            samples = sorted(self._samples)
+            index = min(math.ceil(self.quantile * len(samples)) - 1, len(samples) - 1)
+            self._delay = max(samples[max(index, 0)], self.min_delay)
+            self._pending = 0
+        return self._delay
+
+
+class HedgeBudget:
+    def __init__(self, ratio: float, burst: float = 10):
+        """
+        Бюджет дублирующих запросов: каждый запрос пополняет бюджет на ``ratio``, каждая копия расходует единицу.
+        :param ratio: допустимая доля дублирующих запросов
+        :param burst: наибольший запас бюджета
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def deposit(self) -> None:
+        self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+async def hedged(call: Callable[[], Awaitable[T]], tracker: LatencyTracker, budget: HedgeBudget,
+                 labels: tuple[str, str]) -> T:
+    """
+    Выполнить запрос ``call``, отправив его копию, если ответ не получен за ``tracker.delay``. Возвращается первый
+    успешный ответ, оставшийся запрос отменяется. Если оба запроса завершились ошибкой, выбрасывается ошибка первого.
+    :param labels: метки метрик (api, endpoint)
+    """
+    async def attempt() -> T:
+        started_at = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Длительность неудачных запросов тоже учитывается: иначе при ошибках API оценка квантиля занижается
+            tracker.observe(time.perf_counter() - started_at)
+            raise
+        tracker.observe(time.perf_counter() - started_at)
+        return result
+
+    budget.deposit()
+    delay = tracker.delay
+    primary = asyncio.ensure_future(attempt())
+    if delay is None:
+        return await primary
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+        if not budget.withdraw():
+            API_HEDGED_REQUESTS.labels(*labels, 'skipped').inc()
+            return await primary
+
+        tasks.append(asyncio.ensure_future(attempt()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    API_HEDGED_REQUESTS.labels(*labels, 'lost' if task is primary else 'won').inc()
+                    return task.result()
+        API_HEDGED_REQUESTS.labels(*labels, 'failed').inc()
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+current_hedge: ContextVar[tuple[LatencyTracker, HedgeBudget, tuple[str, str]] | None] = ContextVar('current_hedge',
+                                                                                                   default=None)
+"""Параметры дублирования запросов вызываемого метода API (см. ``energoatlas.utils.api_call``)"""
+
+
+async def hedge_request(call: Callable[[], Awaitable[T]]) -> T:
+    """Выполнить HTTP-запрос ``call`` метода API, дублируя его, если для метода включено дублирование запросов"""
+    hedge = current_hedge.get()
+    if hedge is None:
+        return await call()
+    return await hedged(call, *hedge)
+
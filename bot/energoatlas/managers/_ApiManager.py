@@ -1,6 +1,14 @@
+import logging
+from typing import Mapping
+
 import httpx
+from aiogram import Bot
 
+from energoatlas import decoding
+from energoatlas.cache import TtlCache
 from energoatlas.settings import settings
+from energoatlas.telegram import create_bot
+from energoatlas.hedging import hedge_request
 from energoatlas.utils import yesterday, api_call
 from energoatlas.models.background import Device as DeviceObject
 from energoatlas.models.background import Log, TelegramMessageParams
@@ -8,8 +16,34 @@ from energoatlas.models.aiogram import Company, Object, Parameter, Device
 
 
 class ApiManager:
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(self, client: httpx.AsyncClient, bot: Bot | None = None,
+                 clients: Mapping[str, httpx.AsyncClient] | None = None):
+        """
+        :param client: HTTP-клиент запросов, для профиля которых не передан отдельный клиент
+        :param bot: бот, через которого отправляются сообщения в Telegram. Если не передан, при первом обращении к
+            ``bot`` создается бот поверх клиента профиля telegram
+        :param clients: HTTP-клиенты по профилям настроек ``http_profiles`` (auth, catalog, poll, telegram)
+        """
         self.client = client
+        self.clients = clients or {}
+        self._bot = bot
+        self.device_status_cache: TtlCache[int, list[Parameter]] = TtlCache('device_status',
+                                                                             settings.device_status_cache_ttl)
+        """Текущие значения параметров устройств, общие для всех пользователей"""
+        self.object_devices_cache: TtlCache[tuple[int, str], list[Device]] = TtlCache('object_devices',
+                                                                                      settings.object_devices_cache_ttl)
+        """Списки устройств объектов в разрезе токенов пользователей"""
+        self.auth_token_cache: TtlCache[int, str] = TtlCache('auth_token', settings.auth_token_cache_ttl)
+        """Токены API Энергоатлас авторизованных пользователей бота по идентификаторам в Telegram"""
+
+    @property
+    def bot(self) -> Bot:
+        if self._bot is None:
+            self._bot = create_bot(self._client('telegram'))
+        return self._bot
+
+    def _client(self, profile: str) -> httpx.AsyncClient:
+        return self.clients.get(profile, self.client)
 
     @api_call(handle_errors=True)
     async def get_user_devices(self, token: str, company_id: int) -> set[DeviceObject]:
@@ -18,21 +52,10 @@ class ApiManager:
         :param token: Личный токен авторизации пользователя, имеющего право на доступ к компании
         :return: Идентификаторы устройств или объект None при неуспешной авторизации (с выводом в лог)
         """
-        devices = set()
-        response = await self.client.get(f'{settings.base_url}/api2/company/objects?id={company_id}',
-                                         headers={'Authorization': f'Bearer {token}'})
+        response = await self._client('catalog').get(f'{settings.base_url}/api2/company/objects?id={company_id}',
+                                                     headers={'Authorization': f'Bearer {token}'})
         response.raise_for_status()
-        objects = response.json()
-        for obj in objects:
-            for device in obj['devices']:
-                instance = DeviceObject.model_construct()
-                instance.object_name = obj['name']
-                instance.object_address = obj['address']
-                instance.name = device['name']
-                instance.id = device['id']
-                DeviceObject.model_validate(instance)
-                devices.add(instance)
-        return devices
+        return decoding.decode_user_devices(response.content)
 
     @api_call(handle_errors=True)
     async def get_auth_token(self, login: str, password: str) -> str | None:
@@ -41,7 +64,7 @@ class ApiManager:
         :param password: пароль пользователя
         :return: личный токен авторизации пользователя при успешной авторизации или пустая строка при неверных данных
         """
-        response = await self.client.post(f'{settings.base_url}/api2/auth/open', json={
+        response = await self._client('auth').post(f'{settings.base_url}/api2/auth/open', json={
             'login': login,
             'password': password
         })
@@ -53,48 +76,60 @@ class ApiManager:
 
         return response.json().get('token')
 
-    @api_call(handle_errors=True)
+    @api_call(handle_errors=True, hedge=True)
     async def get_limit_logs(self, device_id: int, token: str) -> tuple[int, list[Log]]:
         """Получить историю срабатывания аварийных критериев на устройстве за последние два дня
         :param device_id: идентификатор устройства
         :param token: валидный токен авторизации пользователя
         :return: идентификатор устройства, список с историей срабатывания авар. критериев
         """
-        response = await self.client.get(f'{settings.base_url}/api2/device/limit-log', params={
+        params = {
             'id': device_id,
             'start_dt': yesterday().isoformat(),
             "end_dt": yesterday().replace(year=2199).isoformat()
-        }, headers={'Authorization': f'Bearer {token}'})
+        }
+        response = await hedge_request(lambda: self._client('poll').get(
+            f'{settings.base_url}/api2/device/limit-log', params=params, headers={'Authorization': f'Bearer {token}'}
+        ))
 
         response.raise_for_status()
 
-        logs = response.json()
-        return device_id, [Log(**d) for d in logs]
+        return device_id, decoding.decode_logs(response.content)
 
     @api_call(handle_errors=True, telegram_call=True)
-    async def send_telegram_message(self, chat_id: int | str, message_params: TelegramMessageParams) -> None:
+    async def send_telegram_message(self, chat_id: int | str, message_params: TelegramMessageParams) -> int:
         """Отправить сообщение в чат Telegram
         :param chat_id: идентификатор чата
         :param message_params:
+        :return: идентификатор отправленного сообщения
         """
-        response = await self.client.post(
-            url=f'{settings.telegram_api_url}/sendMessage', data={
-                'chat_id': chat_id,
-                **(message_params.model_dump(exclude_none=True))
-            })
-        response.raise_for_status()
+        message = await self.bot.send_message(chat_id, **message_params.model_dump(exclude_none=True))
+        return message.message_id
+
+    @api_call(handle_errors=True, log_level=logging.WARNING, telegram_call=True)
+    async def edit_telegram_message(self, chat_id: int | str, message_id: int,
+                                    message_params: TelegramMessageParams) -> None:
+        """Изменить текст ранее отправленного сообщения в чате Telegram
+        :param chat_id: идентификатор чата
+        :param message_id: идентификатор сообщения
+        :param message_params:
+        """
+        await self.bot.edit_message_text(
+            chat_id=chat_id, message_id=message_id,
+            **message_params.model_dump(exclude_none=True, exclude={'disable_notification'})
+        )
 
     @api_call(handle_errors=True)
     async def get_user_companies(self, token: str) -> list[Company]:
         """Получить список компаний, к которым отнесен пользователь
         :param token: Личный токен авторизации пользователя
         """
-        response = await self.client.get(f'{settings.base_url}/api2/company',
-                                         headers={'Authorization': f'Bearer {token}'})
+        response = await self._client('catalog').get(f'{settings.base_url}/api2/company',
+                                                     headers={'Authorization': f'Bearer {token}'})
 
         response.raise_for_status()
 
-        return [Company(**data) for data in response.json()]
+        return decoding.companies.validate_json(response.content)
 
     @api_call(handle_errors=True)
     async def get_company_objects(self, company_id: int, token: str) -> list[Object]:
@@ -102,15 +137,15 @@ class ApiManager:
         :param company_id: идентификатор компании
         :param token: Личный токен авторизации пользователя
         """
-        response = await self.client.get(f'{settings.base_url}/api2/company/objects?id={company_id}',
-                                         headers={'Authorization': f'Bearer {token}'})
+        response = await self._client('catalog').get(f'{settings.base_url}/api2/company/objects?id={company_id}',
+                                                     headers={'Authorization': f'Bearer {token}'})
 
         if response.status_code == 403:
             return []
 
         response.raise_for_status()
 
-        return [Object(**data) for data in response.json()]
+        return decoding.objects.validate_json(response.content)
 
     @api_call(handle_errors=True)
     async def get_object_devices(self, object_id: int, token: str) -> list[Device]:
@@ -118,28 +153,50 @@ class ApiManager:
         :param object_id: идентификатор объекта
         :param token: Личный токен авторизации пользователя
         """
-        response = await self.client.get(f'{settings.base_url}/api2/object?id={object_id}',
-                                         headers={'Authorization': f'Bearer {token}'})
+        response = await self._client('catalog').get(f'{settings.base_url}/api2/object?id={object_id}',
+                                                     headers={'Authorization': f'Bearer {token}'})
 
         if response.status_code == 403:
             return []
 
         response.raise_for_status()
 
-        return [Device(**data) for data in response.json()['devices']]
+        return decoding.object_devices.validate_json(response.content).devices
 
-    @api_call(handle_errors=True)
+    @api_call(handle_errors=True, hedge=True)
     async def get_device_status(self, device_id: int, token: str) -> list[Parameter]:
         """Получить текущую информацию о параметрах устройства.
         :param device_id: Идентификатор устройства
         :param token: Личный токен авторизации пользователя
         """
-        response = await self.client.get(f'{settings.base_url}/api2/device/values?id={device_id}',
-                                         headers={'Authorization': f'Bearer {token}'})
+        response = await hedge_request(lambda: self._client('catalog').get(
+            f'{settings.base_url}/api2/device/values?id={device_id}', headers={'Authorization': f'Bearer {token}'}
+        ))
 
         if response.status_code == 403:
             return []
 
         response.raise_for_status()
 
-        return [Parameter(**data) for data in response.json()]
+        return decoding.parameters.validate_json(response.content)
+
+    async def get_cached_object_devices(self, object_id: int, token: str) -> list[Device]:
+        """Получить список устройств на объекте, переиспользуя список, недавно загруженный с тем же токеном.
+        :param object_id: идентификатор объекта
+        :param token: Личный токен авторизации пользователя
+        """
+        return await self.object_devices_cache.get((object_id, token),
+                                                   lambda: self.get_object_devices(object_id, token))
+
+    def find_cached_device(self, object_id: int, device_id: int, token: str) -> Device | None:
+        """Найти устройство в недавно загруженном с тем же токеном списке устройств объекта без запроса к API"""
+        devices = self.object_devices_cache.peek((object_id, token)) or []
+        return next((device for device in devices if device.id == device_id), None)
+
+    async def get_cached_device_status(self, device_id: int, token: str) -> list[Parameter]:
+        """Получить текущую информацию о параметрах устройства, недавно загруженную любым пользователем. Вызывается
+        только для устройств, доступ пользователя к которым подтвержден.
+        :param device_id: Идентификатор устройства
+        :param token: Личный токен авторизации пользователя (для загрузки отсутствующих в кеше значений)
+        """
+        return await self.device_status_cache.get(device_id, lambda: self.get_device_status(device_id, token))
@@ -1,34 +1,55 @@
 import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
-from energoatlas.database import main_thread_async_engine
+from energoatlas.database import get_async_engine
 
 
 class DbBaseManager:
     def __init__(self, engine: AsyncEngine = None, session: AsyncSession = None):
+        """
+        Менеджер, работающий с базой данных через сессию.
+        :param engine: движок, к которому привязывается сессия (по умолчанию - движок основного потока)
+        :param session: готовая сессия. Если не передана, сессия создается при первом обращении к ``session``
+        """
         self.engine = engine
-        self.session = session
-        if session is None:
+        self._session = session
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
             self._spawn_session()
+        return self._session
+
+    @session.setter
+    def session(self, session: AsyncSession):
+        self._session = session
 
     def __del__(self):
+        if self._session is None:
+            return
         loop = asyncio.get_event_loop()
         if loop.is_running():
-            loop.create_task(self.session.close())
+            loop.create_task(self._session.close())
         else:
-            loop.run_until_complete(self.session.close())
+            loop.run_until_complete(self._session.close())
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.session.close()
+        await self.release()
 
     def _spawn_session(self):
         if self.engine:
-            self.session = AsyncSession(expire_on_commit=False, bind=self.engine, autoflush=False)
+            self._session = AsyncSession(expire_on_commit=False, bind=self.engine, autoflush=False)
         else:
-            self.session = AsyncSession(expire_on_commit=False, bind=main_thread_async_engine, autoflush=False)
+            self._session = AsyncSession(expire_on_commit=False, bind=get_async_engine(), autoflush=False)
+
+    async def release(self):
+        """Завершить транзакцию сессии, вернув соединение в пул. Сессия остается пригодной для дальнейшей работы и
+        получает соединение заново при следующем запросе"""
+        if self._session is not None:
+            await self._session.close()
 
     async def refresh_session(self):
-        await self.session.close()
+        await self.release()
         self._spawn_session()
@@ -1,35 +1,63 @@
 import asyncio
+from datetime import datetime, timedelta, time
 from typing import Iterable
 
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
-from sqlalchemy import select, func
+from aiogram import Bot, Dispatcher
+from sqlalchemy import select, func, delete, update, any_, bindparam, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from loguru import logger
+from aiogram.exceptions import TelegramAPIError
 from httpx import HTTPError
 
-from energoatlas.models.background import DeviceWithLogs, DeviceDict, Device
-from energoatlas.tables import UserTable, UserDeviceTable, LogTable
+from energoatlas.models.background import DeviceWithLogs, DeviceDict, Device, NotifiedLogIndex, TelegramMessageParams
+from energoatlas.classification import classifier
+from energoatlas.alerts import AlertThreads, TELEGRAM_MESSAGE_LIMIT
+from energoatlas.delivery import DeliveryTracker, is_permanent_error, is_transient_error
+from energoatlas.routing import RoutingTable
+from energoatlas.tables import UserTable, UserDeviceTable, LogTable, NotificationFilterTable, AlertMessageTable
 from energoatlas.managers import ApiManager, DbBaseManager, MessageFormatter
-from energoatlas.utils import yesterday, strip_log
+from energoatlas.utils import yesterday, tz, local_now
+from energoatlas.metrics import (POLL_CYCLE_DURATION, POLLED_DEVICES, NEW_EVENTS, DELIVERY_LATENCY, DELIVERY_FAILURES,
+                                 NOTIFICATION_EDITS)
 from energoatlas.settings import settings
 
 
 class LogManager(DbBaseManager):
-    def __init__(self, api_manager: ApiManager, engine: AsyncEngine = None, session: AsyncSession = None):
+    routing_sync_margin = timedelta(minutes=1)
+    """Запас при выборке изменившихся пользователей: время изменения задается до фиксации транзакции. Изменения
+    пользователей фиксируются короткими транзакциями (см. ``UserManager.update_all_users``)"""
+
+    def __init__(self, api_manager: ApiManager, engine: AsyncEngine = None, session: AsyncSession = None,
+                 bot: Bot = None, dispatcher: Dispatcher = None):
         super().__init__(engine=engine, session=session)
         self.api_manager = api_manager
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.delivery = DeliveryTracker(settings.delivery_backoff_base, settings.delivery_backoff_max,
+                                        settings.delivery_deferred_max_logs)
         self.admin_user = UserTable(login=settings.admin_login, password=settings.admin_password)
+        self.notified_index: NotifiedLogIndex | None = None
+        self.routing: RoutingTable | None = None
+        self.routing_synced_at: datetime | None = None
+        self.alert_threads: AlertThreads | None = None
+        self.alert_threads_pruned_at: datetime | None = None
 
     async def request_logs_and_notify(self):
         """Запросить логи срабатываний аварийных критериев устройств за последние два дня из API Энергоатлас и отправить
         уведомления о неизвещенных срабатываниях подписанным на эти устройства пользователям в личные чаты Telegram"""
         await self.refresh_session()
         if token := await self.api_manager.get_auth_token(self.admin_user.login, self.admin_user.password):
-            tracked_devices = await self._get_tracked_devices(token)
-            devices_logs = await self._get_devices_logs(DeviceDict(tracked_devices), token)
-            notified_logs = await self.get_notified_logs()
-            logs_to_notify = self._determine_new_logs(notified_logs, devices_logs)
-            await self._notify_telegram_users(logs_to_notify)
-            await self._save_new_logs(logs_to_notify)
+            with POLL_CYCLE_DURATION.time():
+                tracked_devices = DeviceDict(await self._get_tracked_devices(token))
+                POLLED_DEVICES.set(len(tracked_devices))
+                devices_logs = await self._get_devices_logs(tracked_devices, token)
+                notified_logs = await self.get_notified_index()
+                logs_to_notify = self._determine_new_logs(notified_logs, devices_logs)
+                NEW_EVENTS.inc(sum(len(device.logs) for device in logs_to_notify))
+                await self.sync_routing_table(tracked_devices)
+                await self._notify_telegram_users(logs_to_notify)
+                await self._save_new_logs(logs_to_notify)
             logger.info('Успешно запрошены логи срабатываний аварийных критериев с API Энергоатлас')
         else:
             logger.critical('Не удалось получить токен авторизации администратора в API Энергоатлас')
@@ -51,12 +79,70 @@ class LogManager(DbBaseManager):
         rows = await self.session.execute(statement)
         return {row.device_id: row.telegram_ids for row in rows.all()}
 
+    async def sync_routing_table(self, devices: DeviceDict) -> RoutingTable:
+        """Перестроить таблицу маршрутизации уведомлений для пользователей, подписки или фильтры которых изменились с
+        предыдущего обращения, и удалить из нее удаленных пользователей. Из базы данных выбираются только пользователи,
+        измененные после предыдущей синхронизации
+        :param devices: отслеживаемые устройства (для фильтрации по названиям объектов)
+        """
+        statement = select(UserTable.telegram_user_id, UserTable.updated_at)
+        if self.routing is None:
+            self.routing = RoutingTable(classifier.categories)
+        full = self.routing_synced_at is None
+        if not full:
+            statement = statement.where(UserTable.updated_at > self.routing_synced_at - self.routing_sync_margin)
+        rows = await self.session.execute(statement)
+        versions = {row.telegram_user_id: row.updated_at for row in rows}
+        if versions:
+            self.routing_synced_at = max(self.routing_synced_at or datetime.min, *versions.values())
+        elif full:
+            # Время изменения пользователей задается часами базы данных, поэтому и отметка синхронизации берется из нее
+            self.routing_synced_at = await self.session.scalar(select(func.localtimestamp()))
+        changed = [user_id for user_id, version in versions.items() if self.routing.versions.get(user_id) != version]
+        if changed:
+            subscriptions = select(UserDeviceTable.telegram_user_id,
+                                   func.array_agg(UserDeviceTable.device_id).label('ids'))
+            filters = select(NotificationFilterTable)
+            if not full:
+                user_ids = bindparam('user_ids', changed, type_=ARRAY(UserTable.telegram_user_id.type))
+                subscriptions = subscriptions.where(UserDeviceTable.telegram_user_id == any_(user_ids))
+                filters = filters.where(NotificationFilterTable.telegram_user_id == any_(user_ids))
+            rows = await self.session.execute(subscriptions.group_by(UserDeviceTable.telegram_user_id))
+            device_ids = {row.telegram_user_id: row.ids for row in rows}
+            user_filters = {row.telegram_user_id: row for row in await self.session.scalars(filters)}
+            object_names = {device.id: device.object_name for device in devices}
+            for user_id in changed:
+                self.routing.set_user(user_id, versions[user_id], device_ids.get(user_id, ()),
+                                      user_filters.get(user_id), object_names)
+            logger.info(f'Обновлены маршруты уведомлений пользователей: {len(changed)}')
+        await self._remove_deleted_routes()
+        return self.routing
+
+    async def _remove_deleted_routes(self) -> None:
+        """Удалить из таблицы маршрутизации пользователей, удаленных из базы данных. Полный список пользователей
+        запрашивается только при расхождении их количества с таблицей маршрутизации"""
+        count = await self.session.scalar(select(func.count()).select_from(UserTable))
+        if count == len(self.routing.versions):
+            return
+        user_ids = set(await self.session.scalars(select(UserTable.telegram_user_id)))
+        for user_id in self.routing.versions.keys() - user_ids:
+            self.routing.remove_user(user_id)
+
     async def get_notified_logs(self) -> set[LogTable]:
         """Получить историю срабатывания аварийных критериев, по которым уже производились уведомления (из базы данных)
         за последние два дня"""
         logs = await self.session.scalars(select(LogTable).where(LogTable.latch_dt >= yesterday()))
         return set(logs)
 
+    async def get_notified_index(self) -> NotifiedLogIndex:
+        """Получить индекс срабатываний, по которым уже производились уведомления, за последние два дня. Индекс
+        загружается из базы данных при первом обращении и далее пополняется в памяти при сохранении новых срабатываний"""
+        if self.notified_index is None:
+            self.notified_index = NotifiedLogIndex(await self.get_notified_logs())
+        else:
+            self.notified_index.expire(yesterday())
+        return self.notified_index
+
     async def _get_tracked_devices_ids(self) -> list[int]:
         """Получить идентификаторы устройств, по которым проверяется история срабатываний аварийных критериев"""
         statement = select(UserDeviceTable.device_id).distinct()
@@ -65,10 +151,14 @@ class LogManager(DbBaseManager):
 
     async def _save_new_logs(self, devices_logs: Iterable[DeviceWithLogs]) -> None:
         """Сохранить историю срабатываний аварийных критериев в базу данных"""
+        saved_logs = []
         for device in devices_logs:
             rows = [LogTable(latch_dt=log.latch_dt, limit_id=log.limit_id) for log in device.logs]
             self.session.add_all(rows)
+            saved_logs += device.logs
         await self.session.commit()
+        if self.notified_index is not None:
+            self.notified_index.update(saved_logs)
 
     async def _get_devices_logs(self, devices: DeviceDict, token: str) -> list[DeviceWithLogs]:
         """Получить историю срабатывания аварийных критериев на устройствах из системы "Энергоатлас" за последние два дня
@@ -86,50 +176,233 @@ class LogManager(DbBaseManager):
             except HTTPError:
                 continue
             device_id, logs = response
-            vm = DeviceWithLogs.model_construct()
-            vm.device = devices.get_device(device_id)
-            vm.logs = [log for log in logs if strip_log(log.latch_message) in settings.targeted_logs]
-            DeviceWithLogs.model_validate(vm)
-            if vm.logs:
-                result.append(vm)
+            target_logs = []
+            for log in logs:
+                if category := classifier.classify(log.latch_message):
+                    log.category = category
+                    target_logs.append(log)
+            if target_logs:
+                result.append(DeviceWithLogs(devices.get_device(device_id), target_logs))
         return result
 
     @staticmethod
-    def _determine_new_logs(notified_logs: set[LogTable], devices_logs: Iterable[DeviceWithLogs]) -> list[DeviceWithLogs]:
+    def _determine_new_logs(notified_logs: set[LogTable] | NotifiedLogIndex, devices_logs: Iterable[DeviceWithLogs]) -> list[DeviceWithLogs]:
         """Определить какие из аварийных событий из ``devices_logs`` отсутствуют в ``notified_logs``"""
         result = []
         for device_logs_vm in devices_logs:
-            vm = DeviceWithLogs(device=device_logs_vm.device, logs=[])
-            for log in device_logs_vm.logs:
-                if log not in notified_logs:
-                    vm.logs.append(log)
-            if vm.logs:
-                result.append(vm)
+            new_logs = [log for log in device_logs_vm.logs if log not in notified_logs]
+            if not new_logs:
+                continue
+            if len(new_logs) == len(device_logs_vm.logs):
+                # Все срабатывания новые - новый объект не создается
+                result.append(device_logs_vm)
+            else:
+                result.append(DeviceWithLogs(device_logs_vm.device, new_logs))
         return result
 
     async def _notify_telegram_users(self, devices: list[DeviceWithLogs]) -> None:
-        """Уведомить пользователей в Telegram о срабатывании аварийных критериев конкурентно
+        """Уведомить пользователей в Telegram о срабатывании аварийных критериев конкурентно. Получатели каждого
+        срабатывания определяются по таблице маршрутизации (см. ``sync_routing_table``). Сообщение формируется один раз
+        для всех чатов, получающих одинаковый набор срабатываний. События об устранении аварий дописываются в
+        уведомления об этих авариях (см. ``energoatlas.alerts``). Срабатывания, не доставленные в чат из-за временных
+        ошибок, отправляются в него вместе с новыми
         :param devices: устройства (датчики) со списком срабатываний аварийных критериев"""
-        devices_ids = (item.device.id for item in devices)
-        subscribed_telegram_ids = await self.get_subscribed_telegram_ids(devices_ids)
-        user_devices = {}
-        for unit in devices:
+        deferred = self.delivery.pop_deferred()
+        # Срабатывания чата: номера устройств в ``devices`` и допустимые категории (None - все срабатывания устройства)
+        chat_units: dict[int, list[tuple[int, frozenset | None]]] = {}
+        for index, unit in enumerate(devices):
             device_id = unit.device.id
-            telegram_users_ids = subscribed_telegram_ids[device_id]
-            for user_id in telegram_users_ids:
-                if user_id not in user_devices:
-                    user_devices[user_id] = []
-                user_devices[user_id].append(unit)
-        coroutines = [self._send_notification_in_chat(id_, device) for id_, device in user_devices.items()]
+            user_categories: dict[int, set] = {}
+            categories = {log.category for log in unit.logs}
+            for category in categories:
+                for user_id in self.routing.route(device_id, category):
+                    user_categories.setdefault(user_id, set()).add(category)
+            for user_id, allowed in user_categories.items():
+                chat_units.setdefault(user_id, []).append(
+                    (index, None if len(allowed) == len(categories) else frozenset(allowed))
+                )
+
+        groups: dict[tuple, list[int]] = {}
+        for chat_id, units in chat_units.items():
+            groups.setdefault(tuple(units), []).append(chat_id)
+
+        self.alert_threads = await self._load_alert_threads(devices)
+        moment = datetime.now(tz).time()
+        coroutines = []
+        for units, chat_ids in groups.items():
+            device_logs = [
+                devices[index] if allowed is None else
+                DeviceWithLogs(devices[index].device, [log for log in devices[index].logs if log.category in allowed])
+                for index, allowed in units
+            ]
+            message_params = MessageFormatter.notification_message(device_logs)
+            for id_ in chat_ids:
+                if id_ in deferred:
+                    deferred[id_] = deferred[id_] + device_logs
+                else:
+                    coroutines.append(self._notify_chat(id_, device_logs, moment, message_params))
+        for id_, device_logs in deferred.items():
+            if id_ in self.routing.versions:
+                coroutines.append(self._notify_chat(id_, device_logs, moment))
         await asyncio.gather(*coroutines)
+        await self._save_alert_threads(self.alert_threads)
+        await self._unsubscribe_chats(self.delivery.pop_unreachable())
+
+    async def _notify_chat(self, chat_id: int, device_logs: list[DeviceWithLogs], moment: time,
+                           message_params: TelegramMessageParams | None = None) -> None:
+        """Отправить уведомление в чат или дописать события об устранении аварий в уведомления об этих авариях
+        :param moment: текущее время (для тихих часов пользователя)
+        :param message_params: готовое сообщение (по умолчанию формируется из ``device_logs``)
+        """
+        silent = self.routing.is_quiet(chat_id, moment)
+        edits, rest = self.alert_threads.split(chat_id, device_logs)
+        try:
+            if edits:
+                await self._edit_alerts_in_chat(chat_id, edits, rest, silent=silent)
+            else:
+                await self._send_notification_in_chat(chat_id, device_logs, message_params, silent=silent)
+        except Exception:
+            # Ошибка уведомления одного чата не прерывает рассылку и сохранение уже отправленных уведомлений
+            DELIVERY_FAILURES.labels('error').inc()
+            logger.exception(f'Не удалось уведомить чат {chat_id}')
 
-    async def _send_notification_in_chat(self, chat_id: int, device_logs: list[DeviceWithLogs]) -> None:
-        """Отправить уведомление в один чат Telegram о срабатывании аварийных критериев на устройствах
+    async def _load_alert_threads(self, devices: list[DeviceWithLogs]) -> AlertThreads:
+        """Загрузить не устаревшие уведомления об авариях, об устранении которых поступили события"""
+        recoveries = {(unit.device.id, log.category.event_type) for unit in devices for log in unit.logs
+                      if log.category is not None and log.category.severity == 'recovery'}
+        if not recoveries:
+            return AlertThreads()
+        t = AlertMessageTable
+        device_ids = bindparam('device_ids', list({device_id for device_id, _ in recoveries}),
+                               type_=ARRAY(t.device_id.type))
+        statement = select(t).where(t.device_id == any_(device_ids),
+                                    t.sent_at > local_now() - timedelta(seconds=settings.alert_thread_ttl))
+        rows = await self.session.scalars(statement)
+        return AlertThreads(row for row in rows if (row.device_id, row.event_type) in recoveries)
+
+    async def _save_alert_threads(self, threads: AlertThreads) -> None:
+        """Сохранить новые и дополненные уведомления об авариях. Устаревшие уведомления удаляются не чаще, чем раз в
+        ``settings.alert_thread_prune_interval``"""
+        now = local_now()
+        prune = (self.alert_threads_pruned_at is None
+                 or now - self.alert_threads_pruned_at >= timedelta(seconds=settings.alert_thread_prune_interval))
+        if not (threads.sent or threads.edited or threads.resolved or prune):
+            return
+        t = AlertMessageTable
+        rows = {(row.chat_id, row.device_id, row.event_type): row for row in threads.sent}
+        values = [{'chat_id': row.chat_id, 'device_id': row.device_id, 'event_type': row.event_type,
+                   'message_id': row.message_id, 'text': row.text, 'sent_at': row.sent_at} for row in rows.values()]
+        for i in range(0, len(values), 5000):
+            statement = insert(t).values(values[i:i + 5000])
+            statement = statement.on_conflict_do_update(
+                index_elements=[t.chat_id, t.device_id, t.event_type],
+                set_={column: statement.excluded[column] for column in ('message_id', 'text', 'sent_at')}
+            )
+            await self.session.execute(statement)
+        for thread, text in threads.edited:
+            await self.session.execute(
+                update(t).where(t.chat_id == thread.chat_id, t.message_id == thread.message_id).values(text=text)
+            )
+        if threads.resolved:
+            resolved = tuple_(t.chat_id, t.device_id, t.event_type).in_(threads.resolved)
+            await self.session.execute(delete(t).where(resolved))
+        if prune:
+            expired = t.sent_at <= now - timedelta(seconds=settings.alert_thread_ttl)
+            await self.session.execute(delete(t).where(expired))
+        await self.session.commit()
+        if prune:
+            self.alert_threads_pruned_at = now
+
+    async def _edit_alerts_in_chat(self, chat_id: int, edits: dict[int, tuple[AlertMessageTable, list[DeviceWithLogs]]],
+                                   rest: list[DeviceWithLogs], silent: bool = False) -> None:
+        """Дописать события об устранении аварий в уведомления об этих авариях. Остальные срабатывания и события,
+        которые не удалось дописать, отправляются новым сообщением
+        :param edits: уведомления об авариях и события об их устранении по идентификаторам сообщений
+        :param rest: остальные срабатывания
+        """
+        for thread, device_logs in edits.values():
+            text = f'{thread.text}\n\n{MessageFormatter.notification_message(device_logs).text}'
+            if len(text) <= TELEGRAM_MESSAGE_LIMIT and await self._edit_notification(chat_id, thread.message_id, text):
+                self.alert_threads.record_edit(thread, text, device_logs)
+                self._observe_delivery(device_logs)
+            else:
+                rest = rest + device_logs
+        if rest:
+            await self._send_notification_in_chat(chat_id, rest, silent=silent)
+
+    async def _edit_notification(self, chat_id: int, message_id: int, text: str) -> bool:
+        """Заменить текст уведомления. Возвращает False, если сообщение не удалось изменить"""
+        if not self.delivery.should_send(chat_id):
+            return False
+        try:
+            await self.api_manager.edit_telegram_message(chat_id, message_id,
+                                                         TelegramMessageParams(text=text, parse_mode='MarkdownV2'))
+        except TelegramAPIError as exc:
+            if is_permanent_error(exc):
+                self.delivery.record_failure(chat_id, exc)
+            return False
+        NOTIFICATION_EDITS.inc()
+        return True
+
+    async def _unsubscribe_chats(self, chat_ids: set[int]) -> None:
+        """Отписать от уведомлений чаты, которые больше не могут их получать: удалить пользователей вместе с их
+        устройствами и фильтрами и сбросить состояние FSM чата"""
+        if not chat_ids:
+            return
+        await self.session.execute(delete(UserTable).where(UserTable.telegram_user_id.in_(chat_ids)))
+        await self.session.commit()
+        for chat_id in chat_ids:
+            self.api_manager.auth_token_cache.discard(chat_id)
+            if self.routing is not None:
+                self.routing.remove_user(chat_id)
+            if self.dispatcher is not None:
+                state = self.dispatcher.fsm.resolve_context(bot=self.bot, chat_id=chat_id, user_id=chat_id)
+                await state.clear()
+            logger.warning(f'Чат {chat_id} недоступен для уведомлений, пользователь отписан от рассылки')
+
+    async def _send_notification_in_chat(self, chat_id: int, device_logs: list[DeviceWithLogs],
+                                         message_params: TelegramMessageParams | None = None,
+                                         silent: bool = False) -> None:
+        """Отправить уведомление в один чат Telegram о срабатывании аварийных критериев на устройствах. Ошибки доставки
+        учитываются в ``delivery``: в недоступные чаты уведомление не отправляется, а после временных ошибок
+        срабатывания откладываются до следующего цикла. Уведомления, отклоненные по другим причинам, не повторяются.
+        Слишком длинное уведомление отправляется несколькими сообщениями
         :param chat_id: идентификатор чата
         :param device_logs: устройства (датчики) со списком срабатываний аварийных критериев
+        :param message_params: готовое сообщение (по умолчанию формируется из ``device_logs``)
+        :param silent: отправить уведомление без звука (тихие часы пользователя)
         """
-        message_params = MessageFormatter.notification_message(device_logs)
-        await self.api_manager.send_telegram_message(chat_id, message_params)
+        if not self.delivery.should_send(chat_id):
+            self.delivery.defer(chat_id, device_logs)
+            return
+        if message_params is None:
+            message_params = MessageFormatter.notification_message(device_logs)
+        if len(message_params.text) > TELEGRAM_MESSAGE_LIMIT:
+            parts = MessageFormatter.split_notification(device_logs)
+            if len(parts) > 1:
+                for part in parts:
+                    await self._send_notification_in_chat(chat_id, part, silent=silent)
+                return
+        if silent:
+            message_params = message_params.model_copy(update={'disable_notification': True})
+        try:
+            message_id = await self.api_manager.send_telegram_message(chat_id, message_params)
+        except TelegramAPIError as exc:
+            self.delivery.record_failure(chat_id, exc)
+            if is_transient_error(exc):
+                self.delivery.defer(chat_id, device_logs)
+            return
+        self.delivery.record_success(chat_id)
+        if self.alert_threads is not None:
+            self.alert_threads.record_sent(chat_id, message_id, message_params.text, device_logs)
+        self._observe_delivery(device_logs)
+
+    @staticmethod
+    def _observe_delivery(device_logs: list[DeviceWithLogs]) -> None:
+        now = local_now()
+        for device in device_logs:
+            for log in device.logs:
+                DELIVERY_LATENCY.observe((now - log.latch_dt).total_seconds())
 
     async def _get_tracked_devices(self, token: str) -> set[Device]:
         """Получить набор объектов Device, по которым проверяется история срабатываний аварийных критериев"""
@@ -0,0 +1,109 @@
+import re
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from loguru import logger
+from sqlalchemy import text, delete
+from sqlalchemy.exc import DBAPIError
+
+from energoatlas.managers._DbBaseManager import DbBaseManager
+from energoatlas.settings import settings
+from energoatlas.tables import LogTable
+
+
+PARTITION_NAME = re.compile(r'^LimitLogs_(\d{8})$')
+
+
+def partition_name(day: date) -> str:
+    return f'LimitLogs_{day:%Y%m%d}'
+
+
+def expired_partitions(names: Iterable[str], cutoff: date) -> list[str]:
+    """Отобрать из ``names`` дневные секции, все строки которых старше ``cutoff``"""
+    expired = []
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            if datetime.strptime(match.group(1), '%Y%m%d').date() < cutoff:
+                expired.append(name)
+    return sorted(expired)
+
+
+class LogPartitionManager(DbBaseManager):
+    """Обслуживание секционированной по дням таблицы истории срабатываний ``LimitLogs``: создание секций на
+    ближайшие дни и удаление секций старше срока хранения целиком, без построчного удаления"""
+
+    async def maintain_partitions(self) -> None:
+        """Создать секции на ближайшие дни и удалить устаревшие"""
+        today = datetime.today().date()
+        await self.create_partitions(today - timedelta(days=1), today + timedelta(days=settings.log_partitions_ahead))
+        await self.drop_expired_partitions(today - timedelta(days=settings.log_retention_days))
+        await self.release()
+
+    async def create_partitions(self, first_day: date, last_day: date) -> None:
+        """Создать отсутствующие дневные секции за период ``[first_day, last_day]``. Строки за день, уже попавшие в
+        секцию по умолчанию, переносятся в создаваемую секцию: она создается отдельной таблицей, заполняется и только
+        затем присоединяется к ``LimitLogs``"""
+        table = LogTable.__tablename__
+        default = f'{table}_default'
+        existing = set(await self._get_partitions())
+        day = first_day
+        while day <= last_day:
+            name = partition_name(day)
+            start, end = datetime.combine(day, time()), datetime.combine(day + timedelta(days=1), time())
+            if name not in existing:
+                try:
+                    async with self.session.begin_nested():
+                        # Новые строки за этот день не попадут в секцию по умолчанию до присоединения секции
+                        await self.session.execute(text(f'LOCK TABLE "{default}" IN SHARE ROW EXCLUSIVE MODE'))
+                        await self.session.execute(text(
+                            f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                        ))
+                        moved = await self.session.execute(text(
+                            f'WITH moved AS (DELETE FROM "{default}" WHERE latch_dt >= :start AND latch_dt < :end '
+                            'RETURNING limit_id, latch_dt) '
+                            f'INSERT INTO "{name}" (limit_id, latch_dt) SELECT limit_id, latch_dt FROM moved'
+                        ), {'start': start, 'end': end})
+                        await self.session.execute(text(
+                            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                        ))
+                    if moved.rowcount:
+                        logger.info(f'[LimitLogs] В секцию {name} перенесено строк из секции по умолчанию: '
+                                    f'{moved.rowcount}')
+                except DBAPIError as exc:
+                    logger.warning(f'[LimitLogs] Не удалось создать секцию {name}: {exc.orig}')
+            day += timedelta(days=1)
+        await self.session.commit()
+
+    async def drop_expired_partitions(self, cutoff: date) -> None:
+        """Удалить секции, все строки которых старше ``cutoff``, предварительно выгрузив их в архив (если задан
+        ``log_archive_dir``). Устаревшие строки секции по умолчанию удаляются построчно"""
+        for name in expired_partitions(await self._get_partitions(), cutoff):
+            await self.session.execute(text(f'ALTER TABLE "{LogTable.__tablename__}" DETACH PARTITION "{name}"'))
+            if settings.log_archive_dir:
+                await self._archive(name)
+            await self.session.execute(text(f'DROP TABLE "{name}"'))
+            await self.session.commit()
+            logger.info(f'[LimitLogs] Удалена секция {name}')
+
+        await self.session.execute(delete(LogTable).where(LogTable.latch_dt < cutoff))
+        await self.session.commit()
+
+    async def _get_partitions(self) -> list[str]:
+        result = await self.session.scalars(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+            'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+            'WHERE parent.relname = :table'
+        ), {'table': LogTable.__tablename__})
+        return list(result)
+
+    async def _archive(self, name: str) -> None:
+        """Выгрузить содержимое секции в CSV-файл каталога ``log_archive_dir``"""
+        path = Path(settings.log_archive_dir) / f'{name}.csv'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_from_table(name, output=str(path), format='csv', header=True)
+        logger.info(f'[LimitLogs] Секция {name} выгружена в {path}')
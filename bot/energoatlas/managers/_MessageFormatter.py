@@ -1,23 +1,63 @@
-from energoatlas.models.background import DeviceWithLogs, TelegramMessageParams
+from functools import lru_cache
+
+from energoatlas.alerts import TELEGRAM_MESSAGE_LIMIT
+from energoatlas.models.background import Device, DeviceWithLogs, TelegramMessageParams
 from energoatlas.models.aiogram import Parameter
 
 
+MARKDOWN_ESCAPE = str.maketrans({char: '\\' + char for char in '_*[]()~`>#+-=|{}.!'})
+ESCAPED_DT_FORMAT = '%Y\\-%m\\-%d %H:%M:%S'
+
+
 class MessageFormatter:
+    # Экранированные заголовки уведомлений по идентификатору устройства вместе с данными, из которых они получены
+    _device_headers: dict[int, tuple[tuple[str, str, str], str]] = {}
+
     @staticmethod
     def notification_message(device_logs: list[DeviceWithLogs]) -> TelegramMessageParams:
         items = []
         for device in device_logs:
-            device_name = MessageFormatter.escape_markdown(device.device.name)
-            object_name = MessageFormatter.escape_markdown(device.device.object_name)
-            object_address = MessageFormatter.escape_markdown(device.device.object_address)
-            header = (f'На устройстве: *{device_name}*, установленном на объекте *{object_name}* '
-                      f'по адресу *{object_address}* обнаружены следующие срабатывания:\n\n')
-            messages = [(f'{MessageFormatter.escape_markdown(log.latch_message)}\n'
-                         f'{MessageFormatter.escape_markdown(log.latch_dt.strftime("%Y-%m-%d %H:%M:%S"))}') for log in device.logs]
+            header = MessageFormatter.device_header(device.device)
+            messages = [f'{MessageFormatter.escape_markdown(log.latch_message)}\n'
+                        f'{log.latch_dt.strftime(ESCAPED_DT_FORMAT)}' for log in device.logs]
             body = '\n\n'.join(messages)
             items.append(header + body)
         return TelegramMessageParams(text="\n\n".join(items), parse_mode='MarkdownV2')
 
+    @staticmethod
+    def split_notification(device_logs: list[DeviceWithLogs],
+                           limit: int = TELEGRAM_MESSAGE_LIMIT) -> list[list[DeviceWithLogs]]:
+        """Разбить срабатывания на части, уведомление о каждой из которых укладывается в ``limit`` символов.
+        Уведомление об одном срабатывании не разбивается"""
+        if len(MessageFormatter.notification_message(device_logs).text) <= limit:
+            return [device_logs]
+        units = [(unit.device, log) for unit in device_logs for log in unit.logs]
+        if len(units) == 1:
+            return [device_logs]
+        parts = []
+        for half in (units[:len(units) // 2], units[len(units) // 2:]):
+            merged: list[DeviceWithLogs] = []
+            for device, log in half:
+                if merged and merged[-1].device is device:
+                    merged[-1].logs.append(log)
+                else:
+                    merged.append(DeviceWithLogs(device, [log]))
+            parts += MessageFormatter.split_notification(merged, limit)
+        return parts
+
+    @staticmethod
+    def device_header(device: Device) -> str:
+        """Заголовок уведомления о срабатываниях на устройстве. Кэшируется по идентификатору устройства"""
+        fields = (device.name, device.object_name, device.object_address)
+        cached = MessageFormatter._device_headers.get(device.id)
+        if cached is not None and cached[0] == fields:
+            return cached[1]
+        device_name, object_name, object_address = map(MessageFormatter.escape_markdown, fields)
+        header = (f'На устройстве: *{device_name}*, установленном на объекте *{object_name}* '
+                  f'по адресу *{object_address}* обнаружены следующие срабатывания:\n\n')
+        MessageFormatter._device_headers[device.id] = (fields, header)
+        return header
+
     @staticmethod
     def device_params_message(device_name: str, device_params: list[Parameter]) -> TelegramMessageParams:
         text = f'__*{MessageFormatter.escape_markdown(device_name)}*__'
@@ -34,8 +74,7 @@ class MessageFormatter:
         return TelegramMessageParams(text=text, parse_mode='MarkdownV2')
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def escape_markdown(text: str) -> str:
-        escaped_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        for char in escaped_chars:
-            text = text.replace(char, '\\' + char)
-        return text
+        """Экранировать символы разметки MarkdownV2. Тексты срабатываний повторяются, поэтому результат кэшируется"""
+        return text.translate(MARKDOWN_ESCAPE)
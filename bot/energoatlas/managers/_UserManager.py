@@ -3,11 +3,11 @@ from typing import Iterable
 
 from aiogram import Bot, Dispatcher
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, func
 from loguru import logger
 
 from energoatlas.settings import settings
-from energoatlas.tables import UserTable, UserDeviceTable
+from energoatlas.tables import UserTable, UserDeviceTable, NotificationFilterTable
 from energoatlas.models.background import ItemWithId, TelegramMessageParams
 from energoatlas.managers._ApiManager import ApiManager
 from energoatlas.managers._DbBaseManager import DbBaseManager
@@ -33,6 +33,7 @@ class UserManager(DbBaseManager):
         statement = delete(UserTable).where(UserTable.telegram_user_id == telegram_id)
         await self.session.execute(statement)
         await self.session.commit()
+        self.api_manager.auth_token_cache.discard(telegram_id)
 
     async def add_user(self, telegram_id: int, login: str, password: str) -> UserTable:
         """Добавить учетные данные для авторизации в API Энергоатлас пользователя Telegram в базу данных"""
@@ -46,28 +47,75 @@ class UserManager(DbBaseManager):
         return list(users)
 
     async def _set_devices_for_user(self, user: UserTable, devices: Iterable[ItemWithId]):
-        """Установить пользователю относящиеся к нему устройства"""
+        """Установить пользователю относящиеся к нему устройства. Время изменения пользователя обновляется, только если
+        набор устройств изменился"""
+        devices = list(devices)
+        device_ids = {device.id for device in devices}
+        statement = select(UserDeviceTable.device_id).where(UserDeviceTable.telegram_user_id == user.telegram_user_id)
+        if set(await self.session.scalars(statement)) == device_ids:
+            return
         await self.session.execute(delete(UserDeviceTable).where(UserDeviceTable.telegram_user_id == user.telegram_user_id))
         rows = [UserDeviceTable(device_id=device.id) for device in devices]
         self.session.add_all(rows)
         user.devices.add_all(rows)
+        await self._touch_user(user.telegram_user_id)
+
+    async def _touch_user(self, telegram_id: int) -> None:
+        """Обновить время изменения подписок и фильтров пользователя. Время задается часами базы данных в момент
+        изменения: по нему ``LogManager.sync_routing_table`` отбирает изменившихся пользователей"""
+        statement = (
+            update(UserTable)
+            .where(UserTable.telegram_user_id == telegram_id)
+            .values(updated_at=func.clock_timestamp())
+        )
+        await self.session.execute(statement)
+
+    async def get_notification_filter(self, telegram_id: int) -> NotificationFilterTable:
+        """Получить фильтр уведомлений пользователя. Если пользователь не задавал фильтр, возвращается фильтр без
+        ограничений"""
+        notification_filter = await self.session.get(NotificationFilterTable, telegram_id)
+        if notification_filter is None:
+            notification_filter = NotificationFilterTable(telegram_user_id=telegram_id, event_types=None,
+                                                          mute_recoveries=False, muted_device_ids=[], muted_objects=[])
+        return notification_filter
+
+    async def save_notification_filter(self, notification_filter: NotificationFilterTable) -> None:
+        """Сохранить фильтр уведомлений пользователя. Маршруты уведомлений пользователя перестраиваются в следующем
+        цикле опроса"""
+        await self.session.merge(notification_filter)
+        await self._touch_user(notification_filter.telegram_user_id)
+        await self.session.commit()
 
     async def update_all_users(self) -> None:
-        """Обновить информацию по всем ранее авторизованным пользователям об относящихся к ним устройствах"""
+        """Обновить информацию по всем ранее авторизованным пользователям об относящихся к ним устройствах. Устройства
+        запрашиваются конкурентно, а изменения каждого пользователя фиксируются отдельной транзакцией, чтобы время
+        изменения пользователя становилось видимым сразу, а не после обновления всех пользователей"""
         await self.refresh_session()
         users = await self._get_all_users()
-        coroutines = [self.update_user(user) for user in users]
-        await asyncio.gather(*coroutines)
-        await self.session.commit()
+        await self.release()
+        users_devices = await asyncio.gather(*(self._get_user_devices(user) for user in users))
+        for user, devices in zip(users, users_devices):
+            await self._apply_user_devices(user, devices)
+            await self.session.commit()
         logger.info('Обновлена информация по авторизованным пользователям')
 
     async def update_user(self, user: UserTable) -> None:
         """Обновить информацию об относящихся к пользователю устройствах"""
+        await self._apply_user_devices(user, await self._get_user_devices(user))
+
+    async def _get_user_devices(self, user: UserTable) -> set[ItemWithId] | None:
+        """Запросить устройства пользователя из API Энергоатлас. None - учетные данные пользователя больше не действуют"""
         if token := await self.api_manager.get_auth_token(user.login, user.password):
             companies = await self.api_manager.get_user_companies(token)
             devices = set()
             for company in companies:
                 devices.update(iter(await self.api_manager.get_user_devices(token, company.id)))
+            return devices
+        return None
+
+    async def _apply_user_devices(self, user: UserTable, devices: set[ItemWithId] | None) -> None:
+        """Установить пользователю устройства или удалить пользователя, учетные данные которого больше не действуют"""
+        if devices is not None:
             await self._set_devices_for_user(user, devices)
         else:
             chat_id = user.telegram_user_id
@@ -3,3 +3,4 @@ from ._ApiManager import ApiManager
 from ._UserManager import UserManager
 from ._DbBaseManager import DbBaseManager
 from ._LogManager import LogManager
+from ._LogPartitionManager import LogPartitionManager
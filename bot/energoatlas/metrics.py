@@ -0,0 +1,102 @@
+from contextvars import ContextVar
+
+import httpx
+from aiohttp import web
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DELIVERY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+API_REQUEST_DURATION = Histogram(
+    'energoatlas_api_request_duration_seconds', 'Длительность вызовов API Энергоатлас / Telegram',
+    ['api', 'endpoint'], buckets=LATENCY_BUCKETS
+)
+API_RESPONSES = Counter(
+    'energoatlas_api_responses_total', 'Ответы API Энергоатлас / Telegram по кодам состояния',
+    ['api', 'endpoint', 'status']
+)
+API_HEDGED_REQUESTS = Counter(
+    'energoatlas_api_hedged_requests_total', 'Дублирующие запросы к API по исходу: копия ответила первой (won), '
+    'исходный запрос ответил первым (lost), обе попытки неудачны (failed), бюджет исчерпан (skipped)',
+    ['api', 'endpoint', 'outcome']
+)
+API_CACHE_REQUESTS = Counter(
+    'energoatlas_api_cache_requests_total', 'Обращения к кешу ответов API: значение из кеша (hit), ожидание начатой '
+    'загрузки (shared), новая загрузка (miss)', ['cache', 'result']
+)
+API_SEMAPHORE_WAIT = Histogram(
+    'energoatlas_api_semaphore_wait_seconds', 'Время ожидания семафора, ограничивающего число одновременных запросов',
+    ['api'], buckets=LATENCY_BUCKETS
+)
+POLL_CYCLE_DURATION = Histogram(
+    'energoatlas_poll_cycle_duration_seconds', 'Длительность цикла опроса логов и отправки уведомлений',
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 120, 300)
+)
+POLLED_DEVICES = Gauge('energoatlas_polled_devices', 'Количество устройств, опрошенных за последний цикл')
+NEW_EVENTS = Counter('energoatlas_new_events_total', 'Количество новых срабатываний аварийных критериев')
+DELIVERY_LATENCY = Histogram(
+    'energoatlas_notification_delivery_latency_seconds', 'Время от срабатывания критерия до доставки уведомления',
+    buckets=DELIVERY_BUCKETS
+)
+DELIVERY_FAILURES = Counter(
+    'energoatlas_notification_delivery_failures_total', 'Количество неудачных отправок уведомлений', ['kind']
+)
+DELIVERY_SUPPRESSED = Counter(
+    'energoatlas_notification_delivery_suppressed_total', 'Количество уведомлений, не отправленных в недоступные чаты'
+)
+NOTIFICATION_EDITS = Counter(
+    'energoatlas_notification_edits_total', 'Количество уведомлений об авариях, дополненных событиями об их устранении'
+)
+DB_POOL_CHECKOUT = Histogram(
+    'energoatlas_db_pool_checkout_seconds', 'Время получения соединения из пула базы данных', buckets=LATENCY_BUCKETS
+)
+DB_POOL_CHECKOUTS = Counter('energoatlas_db_pool_checkouts_total', 'Количество выдач соединений из пула базы данных')
+DB_POOL_CHECKED_OUT = Gauge('energoatlas_db_pool_checked_out', 'Количество выданных соединений пула базы данных')
+DB_POOL_OVERFLOW = Gauge('energoatlas_db_pool_overflow', 'Количество соединений, открытых сверх размера пула')
+DB_POOL_INVALIDATIONS = Counter(
+    'energoatlas_db_pool_invalidations_total', 'Количество инвалидированных соединений пула базы данных', ['kind']
+)
+ELASTIC_SHIPPED = Counter('energoatlas_elastic_shipped_total', 'Количество сообщений лога, отправленных в Elasticsearch')
+ELASTIC_DROPPED = Counter(
+    'energoatlas_elastic_dropped_total', 'Количество сообщений лога, не отправленных в Elasticsearch', ['reason']
+)
+ELASTIC_FLUSH_DURATION = Histogram(
+    'energoatlas_elastic_flush_duration_seconds', 'Длительность отправки пачки сообщений лога в Elasticsearch',
+    buckets=LATENCY_BUCKETS
+)
+ELASTIC_QUEUE_SIZE = Gauge('energoatlas_elastic_queue_size', 'Количество сообщений лога, ожидающих отправки')
+FSM_STORAGE_SIZE = Gauge('energoatlas_fsm_storage_records', 'Количество записей в хранилище состояний FSM')
+
+# Атомарный вызов API, в рамках которого выполняется текущий HTTP-запрос: (api, endpoint)
+current_api_call: ContextVar[tuple[str, str]] = ContextVar('current_api_call', default=('unknown', 'unknown'))
+
+
+async def observe_response(response: httpx.Response) -> None:
+    """Event hook ``httpx.AsyncClient``, учитывающий код состояния ответа в разрезе вызова API"""
+    api, endpoint = current_api_call.get()
+    API_RESPONSES.labels(api, endpoint, response.status_code).inc()
+
+
+def observe_fsm_storage(storage: BaseStorage) -> None:
+    """Отслеживать размер хранилища состояний FSM (для хранилищ, размер которых известен процессу)"""
+    if isinstance(storage, MemoryStorage):
+        FSM_STORAGE_SIZE.set_function(lambda: len(storage.storage))
+
+
+async def metrics_handler(_: web.Request) -> web.Response:
+    return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запустить встроенный HTTP-сервер с эндпоинтом /metrics"""
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f'Metrics are exposed on http://{host}:{port}/metrics')
+    return runner
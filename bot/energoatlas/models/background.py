@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Iterator, Iterable, Protocol, Literal
 
@@ -8,11 +9,35 @@ class ItemWithId(Protocol):
     id: int
 
 
-class Log(BaseModel):
+class LogKey(Protocol):
+    limit_id: int
+    latch_dt: datetime
+
+
+SEVERITY_PRIORITY = {'recovery': 0, 'warning': 1, 'critical': 2}
+
+
+@dataclass(frozen=True, slots=True)
+class LogCategory:
+    """Категория срабатывания: тип события и его важность"""
+    event_type: str
+    severity: Literal['recovery', 'warning', 'critical']
+
+    @property
+    def priority(self) -> int:
+        return SEVERITY_PRIORITY[self.severity]
+
+
+# Объекты цикла опроса создаются для каждого устройства и срабатывания, поэтому это легкие классы со ``__slots__``.
+# Данные API валидируются при разборе ответа (см. ``energoatlas.decoding``)
+@dataclass(slots=True, eq=False)
+class Log:
     """Срабатывание аварийного критерия"""
     limit_id: int
     latch_dt: datetime
     latch_message: str
+    category: LogCategory | None = None
+    """Категория срабатывания, определяемая при опросе (см. ``energoatlas.classification``)"""
 
     def __hash__(self):
         return hash((self.limit_id, self.latch_dt))
@@ -21,7 +46,8 @@ class Log(BaseModel):
         return (self.limit_id, self.latch_dt) == (other.limit_id, other.latch_dt)
 
 
-class Device(BaseModel):
+@dataclass(slots=True, eq=False)
+class Device:
     """Устройство (датчик)"""
     object_name: str
     object_address: str
@@ -35,7 +61,8 @@ class Device(BaseModel):
         return isinstance(other, Device) and self.id == other.id
 
 
-class DeviceWithLogs(BaseModel):
+@dataclass(slots=True)
+class DeviceWithLogs:
     """Устройства (датчики) со списком срабатываний аварийных критериев"""
     device: Device
     logs: list[Log]
@@ -44,6 +71,7 @@ class DeviceWithLogs(BaseModel):
 class TelegramMessageParams(BaseModel):
     text: str
     parse_mode: Literal['HTML', 'Markdown', 'MarkdownV2'] | None = None
+    disable_notification: bool | None = None
 
 
 class DeviceDict:
@@ -60,3 +88,41 @@ class DeviceDict:
     def __iter__(self) -> Iterator[ItemWithId]:
         """Позволяет итерировать по устройствам."""
         return iter(self._devices.values())
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+
+class NotifiedLogIndex:
+    """Множество ключей (limit_id, latch_dt) срабатываний, по которым отправлены уведомления. Ключи дополнительно
+    разбиты на часовые корзины по времени срабатывания, чтобы при выходе из окна опроса удалять их корзинами"""
+
+    def __init__(self, logs: Iterable[LogKey] = ()):
+        self._keys: set[tuple[int, datetime]] = set()
+        self._buckets: dict[datetime, list[tuple[int, datetime]]] = {}
+        self.update(logs)
+
+    def add(self, log: LogKey) -> None:
+        key = (log.limit_id, log.latch_dt)
+        if key not in self._keys:
+            self._keys.add(key)
+            self._buckets.setdefault(self._bucket(log.latch_dt), []).append(key)
+
+    def update(self, logs: Iterable[LogKey]) -> None:
+        for log in logs:
+            self.add(log)
+
+    def expire(self, since: datetime) -> None:
+        """Удалить срабатывания, произошедшие раньше начала часа ``since``"""
+        first_bucket = self._bucket(since)
+        for bucket in [bucket for bucket in self._buckets if bucket < first_bucket]:
+            self._keys.difference_update(self._buckets.pop(bucket))
+
+    def __contains__(self, log: LogKey) -> bool:
+        return (log.limit_id, log.latch_dt) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _bucket(self, dt: datetime) -> datetime:
+        return dt.replace(minute=0, second=0, microsecond=0)
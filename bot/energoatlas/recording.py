@@ -0,0 +1,158 @@
+"""
+Запись и воспроизведение HTTP-трафика ``httpx.AsyncClient``.
+
+Запись ведется в gzip-файл в формате JSON Lines: первая строка - заголовок, далее по строке на каждую пару
+запрос/ответ. Учетные данные, токены, идентификаторы чатов и наименования объектов обезличиваются с сохранением длины
+строк, чтобы при воспроизведении сохранялись размеры и форма ответов.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+
+FORMAT_VERSION = 1
+ANONYMIZED_KEYS = {'name', 'address', 'title', 'latitude', 'longitude', 'serial', 'first_name', 'last_name',
+                   'username'}
+IGNORED_QUERY_PARAMS = {'start_dt', 'end_dt'}
+KEPT_HEADERS = {'content-type', 'retry-after'}
+BOT_TOKEN_PATH = re.compile(r'^/bot[^/]+/')
+
+
+def pseudonym(value: str) -> str:
+    """Детерминированная замена строки на псевдоним той же длины"""
+    digest = hashlib.sha1(value.encode()).hexdigest()
+    return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+
+def anonymize_latch_message(message: str) -> str:
+    """Обезличить уточнение в скобках, сохранив наименование события, по которому ведется классификация"""
+    event, bracket, details = message.partition('(')
+    return event + bracket + pseudonym(details) if bracket else message
+
+
+def anonymize(value, key: str | None = None):
+    if isinstance(value, dict):
+        return {k: anonymize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item, key) for item in value]
+    if isinstance(value, str):
+        if key == 'latch_message':
+            return anonymize_latch_message(value)
+        if key in ANONYMIZED_KEYS or key == 'token':
+            return pseudonym(value)
+    return value
+
+
+def request_path(url: httpx.URL) -> str:
+    """Путь запроса без токена бота"""
+    return BOT_TOKEN_PATH.sub('/bot<token>/', url.path)
+
+
+def anonymize_query(params: httpx.QueryParams) -> dict[str, str]:
+    return {k: v if k in IGNORED_QUERY_PARAMS or k == 'id' else pseudonym(v) for k, v in params.items()}
+
+
+def request_key(method: str, path: str, query: dict[str, str]) -> tuple:
+    """Ключ, по которому запрос сопоставляется с записанными ответами. Параметры периода не учитываются: при
+    воспроизведении они заведомо отличаются от записанных"""
+    return method, path, tuple(sorted((k, v) for k, v in query.items() if k not in IGNORED_QUERY_PARAMS))
+
+
+def anonymize_body(path: str, content: bytes) -> str:
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return pseudonym(content.decode(errors='replace'))
+    if path.startswith('/bot<token>/'):
+        # Из ответов Telegram сохраняется только результат операции, а из отправленного сообщения - его идентификатор
+        result = body.get('result')
+        body = {k: v for k, v in body.items() if k in ('ok', 'error_code', 'description', 'parameters')}
+        if isinstance(result, dict) and 'message_id' in result:
+            body['result'] = {'message_id': result['message_id'], 'date': result.get('date', 0),
+                              'chat': {'id': 0, 'type': 'private'}}
+        elif result is not None and not isinstance(result, (dict, list)):
+            body['result'] = result
+    return json.dumps(anonymize(body), ensure_ascii=False, separators=(',', ':'))
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Транспорт, записывающий обезличенные пары запрос/ответ вместе с временем их выполнения"""
+    def __init__(self, transport: httpx.AsyncBaseTransport, path: str | Path):
+        self._transport = transport
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._started_at = time.monotonic()
+        self._write({'version': FORMAT_VERSION, 'recorded_at': datetime.now().isoformat(timespec='seconds')})
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        try:
+            raw = b''.join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        duration = time.monotonic() - started_at
+
+        replica = httpx.Response(response.status_code, headers=response.headers, stream=httpx.ByteStream(raw),
+                                 extensions=response.extensions)
+        content = await replica.aread()
+        path = request_path(request.url)
+        self._write({
+            't': round(started_at - self._started_at, 4),
+            'd': round(duration, 4),
+            'm': request.method,
+            'p': path,
+            'q': anonymize_query(request.url.params),
+            's': response.status_code,
+            'h': {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+            'b': anonymize_body(path, content),
+        })
+        return httpx.Response(response.status_code, headers=response.headers, stream=httpx.ByteStream(raw),
+                              extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        self._file.close()
+        await self._transport.aclose()
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Транспорт, воспроизводящий записанные ответы. Ответы на одинаковые запросы выдаются по кругу в порядке записи,
+    задержка каждого ответа равна записанной, деленной на ``speed`` (при ``speed=0`` ответы выдаются без задержки)"""
+    def __init__(self, path: str | Path, speed: float = 1.0):
+        self.speed = speed
+        self.records: dict[tuple, deque[dict]] = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            header = json.loads(next(file))
+            if header.get('version') != FORMAT_VERSION:
+                raise ValueError(f'Unsupported recording format version: {header.get("version")}')
+            for line in file:
+                record = json.loads(line)
+                if 'version' in record:
+                    # Заголовок очередного сеанса записи, дописанного в тот же файл
+                    continue
+                self.records.setdefault(request_key(record['m'], record['p'], record['q']), deque()).append(record)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = request_path(request.url)
+        query = anonymize_query(request.url.params)
+        responses = self.records.get(request_key(request.method, path, query))
+        if not responses:
+            logger.warning(f'[Replay] No recorded response for {request.method} {path} {query}')
+            return httpx.Response(404, json={'detail': 'Not recorded'})
+
+        record = responses[0]
+        responses.rotate(-1)
+        if self.speed > 0:
+            await asyncio.sleep(record['d'] / self.speed)
+        return httpx.Response(record['s'], headers=record['h'], content=record['b'].encode())
@@ -0,0 +1,96 @@
+"""
+Маршрутизация уведомлений о срабатываниях с учетом фильтров пользователей.
+
+Подписки и фильтры пользователей компилируются в таблицу маршрутизации: для каждой пары (устройство, категория
+срабатывания) хранится множество пользователей, которых нужно уведомить. Поэтому при рассылке фильтры не проверяются
+для каждого подписчика: затраты пропорциональны количеству получателей. При изменении подписок или фильтров
+пользователя (``UserTable.updated_at``) перестраиваются только его маршруты. Тихие часы зависят от времени отправки и
+проверяются только для получателей.
+"""
+from datetime import datetime, time
+from typing import Iterable, Mapping
+
+from energoatlas.models.background import LogCategory
+from energoatlas.tables import NotificationFilterTable
+
+
+def allows(notification_filter: NotificationFilterTable | None, device_id: int, object_name: str | None,
+           category: LogCategory) -> bool:
+    """Пропускает ли фильтр пользователя срабатывание категории ``category`` на устройстве"""
+    if notification_filter is None:
+        return True
+    if notification_filter.event_types is not None and category.event_type not in notification_filter.event_types:
+        return False
+    if notification_filter.mute_recoveries and category.severity == 'recovery':
+        return False
+    if device_id in notification_filter.muted_device_ids:
+        return False
+    return object_name is None or object_name not in notification_filter.muted_objects
+
+
+def is_quiet(quiet_hours: tuple[time, time], moment: time) -> bool:
+    """Попадает ли ``moment`` в тихие часы. Тихие часы могут переходить через полночь"""
+    start, end = quiet_hours
+    if start <= end:
+        return start <= moment < end
+    return moment >= start or moment < end
+
+
+class RoutingTable:
+    def __init__(self, categories: Iterable[LogCategory]):
+        """
+        Таблица маршрутизации уведомлений.
+        :param categories: категории срабатываний, для которых строятся маршруты
+        """
+        self.categories = tuple(categories)
+        self.versions: dict[int, datetime] = {}
+        """Версии (время изменения) подписок и фильтров пользователей, по которым построены маршруты"""
+        self._routes: dict[tuple[int, LogCategory], set[int]] = {}
+        self._user_devices: dict[int, tuple[int, ...]] = {}
+        self._quiet_hours: dict[int, tuple[time, time]] = {}
+
+    def set_user(self, user_id: int, version: datetime, device_ids: Iterable[int],
+                 notification_filter: NotificationFilterTable | None = None,
+                 object_names: Mapping[int, str] | None = None) -> None:
+        """
+        Перестроить маршруты пользователя.
+        :param version: время изменения подписок и фильтров пользователя
+        :param device_ids: устройства, на которые подписан пользователь
+        :param notification_filter: фильтр уведомлений пользователя
+        :param object_names: названия объектов устройств для фильтрации по объектам
+        """
+        self._drop_routes(user_id)
+        object_names = object_names or {}
+        device_ids = tuple(device_ids)
+        for device_id in device_ids:
+            object_name = object_names.get(device_id)
+            for category in self.categories:
+                if allows(notification_filter, device_id, object_name, category):
+                    self._routes.setdefault((device_id, category), set()).add(user_id)
+        self._user_devices[user_id] = device_ids
+        self.versions[user_id] = version
+        if notification_filter and notification_filter.quiet_from and notification_filter.quiet_to:
+            self._quiet_hours[user_id] = (notification_filter.quiet_from, notification_filter.quiet_to)
+
+    def remove_user(self, user_id: int) -> None:
+        self._drop_routes(user_id)
+        self.versions.pop(user_id, None)
+
+    def route(self, device_id: int, category: LogCategory | None) -> set[int]:
+        """Пользователи, которых нужно уведомить о срабатывании категории ``category`` на устройстве"""
+        return self._routes.get((device_id, category), set())
+
+    def is_quiet(self, user_id: int, moment: time) -> bool:
+        """Действуют ли у пользователя тихие часы (уведомления отправляются без звука)"""
+        quiet_hours = self._quiet_hours.get(user_id)
+        return quiet_hours is not None and is_quiet(quiet_hours, moment)
+
+    def _drop_routes(self, user_id: int) -> None:
+        for device_id in self._user_devices.pop(user_id, ()):
+            for category in self.categories:
+                key = (device_id, category)
+                if (users := self._routes.get(key)) is not None:
+                    users.discard(user_id)
+                    if not users:
+                        del self._routes[key]
+        self._quiet_hours.pop(user_id, None)
@@ -1,7 +1,36 @@
+from datetime import time
+from typing import Literal
+
 from aiogram.types import BotCommand
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 
+class LogRule(BaseModel):
+    """Правило классификации сообщения о срабатывании аварийного критерия"""
+    pattern: str
+    """Текст сообщения без уточнения в скобках"""
+    event_type: str
+    """Тип события: протечка, давление, задымление, пожар и т.п."""
+    severity: Literal['recovery', 'warning', 'critical']
+    """Важность: восстановление нормы, предупреждение или авария"""
+    match: Literal['exact', 'prefix'] = 'exact'
+    """Сообщение совпадает с ``pattern`` полностью или начинается с него"""
+
+
+class HttpClientProfile(BaseModel):
+    """Параметры HTTP-клиента группы запросов: пул соединений и ограничения времени"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5
+    """Время (в секундах), в течение которого простаивающее соединение остается открытым"""
+    http2: bool = False
+    """Мультиплексировать запросы в соединениях HTTP/2 (для адресов HTTPS)"""
+    connect_timeout: float = 10
+    read_timeout: float = 30
+    """Время ожидания ответа (и отправки запроса) в секундах"""
+
+
 class Settings(BaseSettings):
     timezone: str = 'Asia/Yekaterinburg'
 
@@ -12,12 +41,95 @@ class Settings(BaseSettings):
     db_port: str = '5432'
     db_database: str = 'EnergoAtlasBot'
     test_database: str = 'TestDatabase'
+    db_pool_size: int = 5
+    db_max_overflow: int = 0
+    db_pool_timeout: float = 30
+    """Время (в секундах) ожидания свободного соединения в пуле"""
+    db_pool_recycle: int = 1800
+    """Время (в секундах), после которого соединение пула пересоздается. -1 - не пересоздавать"""
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    """Размер кэша подготовленных выражений asyncpg. 0 - для работы через pgbouncer в режиме transaction"""
+    db_command_timeout: float = 60
+    """Время (в секундах) ожидания результата запроса клиентом. 0 - без ограничения"""
+    db_statement_timeout: int = 60_000
+    """Ограничение длительности запроса на стороне сервера (в миллисекундах). 0 - без ограничения"""
+    db_idle_in_transaction_timeout: int = 300_000
+    """Ограничение простоя сеанса в открытой транзакции на стороне сервера (в миллисекундах). 0 - без ограничения"""
+
+    log_retention_days: int = 3
+    """Срок хранения истории срабатываний (в днях), после которого дневные секции LimitLogs удаляются"""
+    log_partitions_ahead: int = 2
+    """Количество дней, на которые секции LimitLogs создаются заранее"""
+    log_archive_dir: str = ''
+    """Каталог, в который удаляемые секции LimitLogs выгружаются в CSV. Пустое значение - не выгружать"""
+
+    role: Literal['all', 'bot', 'poller', 'notifier'] = 'all'
+    """Роль процесса: обработка обновлений бота (bot), обновление устройств пользователей (poller), опрос логов и
+    рассылка уведомлений (notifier) или все сразу (all)"""
+    api_concurrency: int = 10
+    """Количество одновременных запросов процесса к API Энергоатлас"""
+    telegram_concurrency: int = 10
+    """Количество одновременных запросов процесса к API Telegram"""
+    telegram_rate: float = 30
+    """Количество сообщений в секунду, отправляемых процессом во все чаты Telegram. 0 - без ограничения"""
+    telegram_chat_interval: float = 1
+    """Минимальный интервал (в секундах) между сообщениями в один чат"""
+    telegram_max_retries: int = 3
+    """Количество повторов запроса к API Telegram после ответа 429 (Too Many Requests)"""
+    db_concurrency: int = 10
+
+    device_status_cache_ttl: float = 5
+    """Время (в секундах), в течение которого текущие значения параметров устройства показываются всем пользователям
+    без повторного запроса к API"""
+    object_devices_cache_ttl: float = 300
+    """Время (в секундах), в течение которого переиспользуется загруженный пользователем список устройств объекта"""
+    auth_token_cache_ttl: float = 600
+    """Время (в секундах), в течение которого переиспользуется токен API Энергоатлас авторизованного пользователя бота"""
+
+    api_hedge_enable: bool = False
+    """Дублировать задержавшиеся запросы истории срабатываний и текущих значений устройств к API Энергоатлас"""
+    api_hedge_quantile: float = 0.95
+    """Копия запроса отправляется, если ответ не получен за время, в которое укладывается эта доля недавних запросов"""
+    api_hedge_budget: float = 0.1
+    """Наибольшая доля дублирующих запросов"""
+
+    alert_thread_ttl: int = 24 * 3600
+    """Время (в секундах), в течение которого уведомление об аварии дополняется событием об ее устранении. Об
+    устранении более старой аварии отправляется новое сообщение"""
+    alert_thread_prune_interval: int = 3600
+    """Периодичность (в секундах) удаления устаревших уведомлений об авариях из базы данных"""
+
+    delivery_backoff_base: float = 60
+    """Время (в секундах), на которое приостанавливается отправка уведомлений в чат после временной ошибки доставки.
+    Удваивается с каждой следующей ошибкой подряд"""
+    delivery_backoff_max: float = 6 * 3600
+    delivery_deferred_max_logs: int = 200
+    """Наибольшее количество срабатываний, откладываемых для чата до восстановления доставки. Более старые
+    отбрасываются"""
 
     base_url: str = 'http://stub:8888'
 
+    api_trusted_payloads: bool = False
+    """Не валидировать поэлементно ответы массовых методов опроса API Энергоатлас"""
+
     bot_token: str = 'specify-your-token'
     telegram_api_base: str = 'https://api.telegram.org/bot'
-    telegram_api_url: str = ''
+
+    bot_mode: Literal['polling', 'webhook'] = 'polling'
+    """Способ получения обновлений от Telegram: long polling или вебхук"""
+    webhook_url: str = ''
+    """Внешний HTTPS-адрес, по которому Telegram доступен сервер вебхука"""
+    webhook_path: str = '/webhook'
+    webhook_secret: str = ''
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    webhook_workers: int = 1
+    """Количество процессов, принимающих обновления на одном порту"""
+    webhook_max_concurrency: int = 100
+    """Количество обновлений, одновременно обрабатываемых одним процессом"""
+    webhook_max_connections: int = 40
+    """Количество одновременных соединений Telegram с вебхуком (от 1 до 100)"""
 
     elasticsearch_url: str = 'http://elastic:80'
     elasticsearch_username: str = 'elasticUsername'
@@ -25,26 +137,71 @@ class Settings(BaseSettings):
     elasticsearch_template: str = 'energoatlas_bot'
     elasticsearch_status: str = 'dev'
     elasticsearch_enable: bool = False
+    elasticsearch_batch_size: int = 500
+    elasticsearch_flush_interval: float = 5.0
+    elasticsearch_queue_size: int = 10_000
+
+    http_profiles: dict[str, HttpClientProfile] = {
+        'default': HttpClientProfile(),
+        'auth': HttpClientProfile(max_connections=10, max_keepalive_connections=5, connect_timeout=5, read_timeout=10),
+        'catalog': HttpClientProfile(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30,
+                                     connect_timeout=5, read_timeout=20),
+        'poll': HttpClientProfile(max_connections=20, max_keepalive_connections=20, keepalive_expiry=90,
+                                  connect_timeout=3, read_timeout=10),
+        'telegram': HttpClientProfile(max_connections=20, max_keepalive_connections=20, keepalive_expiry=90, http2=True,
+                                      connect_timeout=5, read_timeout=30),
+    }
+    """Профили HTTP-клиентов: авторизация (auth), справочники компаний, объектов и устройств (catalog), опрос истории
+    срабатываний (poll), Telegram (telegram) и прочие запросы (default). Соединения опроса живут дольше интервала
+    опроса, чтобы переиспользоваться между циклами"""
+    http_dns_cache_ttl: float = 300
+    """Время (в секундах), в течение которого переиспользуется результат разрешения DNS-имени. 0 - не кешировать"""
+    http_record_path: str = ''
+    """Файл, в который записывается HTTP-трафик к API Энергоатлас и Telegram"""
+    http_replay_path: str = ''
+    """Файл записанного HTTP-трафика, ответы из которого воспроизводятся вместо обращения к API"""
+    http_replay_speed: float = 1.0
+
+    fsm_storage: Literal['memory', 'postgres', 'redis'] = 'postgres'
+    """Хранилище состояний FSM: в памяти процесса, в базе данных или в Redis"""
+    fsm_redis_url: str = 'redis://redis:6379/0'
+    fsm_ttl: int = 30 * 24 * 3600
+    """Время (в секундах), по истечении которого состояние неактивного чата удаляется. 0 - хранить бессрочно"""
+
+    metrics_enable: bool = False
+    metrics_host: str = '0.0.0.0'
+    metrics_port: int = 9100
 
     admin_login: str = 'admin@example.com'
     admin_password: str = 'Jb21uHa73omYia'
 
     device_params_descr: list[str] = ['Связь', 'Уровень заряда батареи', 'Количество дыма', 'Влажность', 'Температура']
 
-    targeted_logs: list[str] = [
-        'Протечка',
-        'Протечка произошла',
-        'Протечка устранена',
-        'Предупреждение: давление выше нормы',
-        'Давление в норме',
-        'Авария падения давления',
-        'Авария превышения давления',
-        'Задымление',
-        'Предупреждение: обнаружено незначительное задымление',
-        'Задымление устранено',
-        'Пожар обнаружен',
-        'Пожар устранен'
+    log_rules: list[LogRule] = [
+        LogRule(pattern='Протечка', event_type='leak', severity='critical'),
+        LogRule(pattern='Протечка произошла', event_type='leak', severity='critical'),
+        LogRule(pattern='Протечка устранена', event_type='leak', severity='recovery'),
+        LogRule(pattern='Предупреждение: давление выше нормы', event_type='pressure', severity='warning'),
+        LogRule(pattern='Давление в норме', event_type='pressure', severity='recovery'),
+        LogRule(pattern='Авария падения давления', event_type='pressure', severity='critical'),
+        LogRule(pattern='Авария превышения давления', event_type='pressure', severity='critical'),
+        LogRule(pattern='Задымление', event_type='smoke', severity='critical'),
+        LogRule(pattern='Предупреждение: обнаружено незначительное задымление', event_type='smoke', severity='warning'),
+        LogRule(pattern='Задымление устранено', event_type='smoke', severity='recovery'),
+        LogRule(pattern='Пожар обнаружен', event_type='fire', severity='critical'),
+        LogRule(pattern='Пожар устранен', event_type='fire', severity='recovery'),
     ]
+    """Правила классификации срабатываний. Уведомления отправляются только о срабатываниях, подходящих под правила"""
+    event_type_names: dict[str, str] = {
+        'leak': 'Протечки',
+        'pressure': 'Давление',
+        'smoke': 'Задымление',
+        'fire': 'Пожар',
+    }
+    """Названия типов событий в настройках уведомлений"""
+    quiet_hours_from: time = time(22)
+    quiet_hours_to: time = time(8)
+    """Тихие часы, включаемые в настройках уведомлений: уведомления в это время приходят без звука"""
 
     bot_commands: list[BotCommand] = [
         BotCommand(command="start", description="Начало работы"),
@@ -55,10 +212,13 @@ class Settings(BaseSettings):
     api_error_message: str = 'Произошла ошибка обработки запроса к API Энергоатлас. Попробуйте повторить запрос позже.'
     need_authorize_message: str = 'Необходимо повторно авторизоваться в боте. Используйте команду /start'
 
+    @property
+    def targeted_logs(self) -> list[str]:
+        """Тексты отслеживаемых сообщений о срабатываниях"""
+        return [rule.pattern for rule in self.log_rules]
+
 
 settings = Settings(
     _env_file='.env',
     _env_file_encoding='utf-8',
 )
-
-settings.telegram_api_url = f'{settings.telegram_api_base}{settings.bot_token}'
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, time
 from functools import partial
 
-from sqlalchemy import ForeignKey, BigInteger
+from sqlalchemy import ForeignKey, BigInteger, Index, UniqueConstraint, DDL, String, event, func
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.orm import DeclarativeBase, relationship, Mapped
 from sqlalchemy.orm import WriteOnlyMapped, mapped_column
 
@@ -19,10 +20,17 @@ class Base(DeclarativeBase):
 class UserTable(Base):
     """Таблица успешно авторизованных в системе "Энергоатлас" пользователей на момент авторизации в чат-боте"""
     __tablename__ = 'Users'
+    __table_args__ = (
+        Index('ix_Users_updated_at', 'updated_at'),
+    )
+    # Время изменения, заданное базой данных, загружается сразу после вставки строки
+    __mapper_args__ = {'eager_defaults': True}
 
     telegram_user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, comment="Идентификатор пользователя в Telegram")
     login: Mapped[str] = mapped_column(comment='Логин в системе "Энергоатлас"')
     password: Mapped[str] = mapped_column(comment='Пароль в системе "Энергоатлас"')
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(),
+                                                 comment='Время последнего изменения подписок и фильтров уведомлений')
 
     devices: WriteOnlyMapped[UserDeviceTable] = relationship(cascade='delete', passive_deletes=True)
 
@@ -30,6 +38,10 @@ class UserTable(Base):
 class LogTable(Base):
     """Таблица истории срабатывания аварийных критериев, по которым были отправлены уведомления пользователям"""
     __tablename__ = 'LimitLogs'
+    __table_args__ = (
+        Index('ix_LimitLogs_latch_dt', 'latch_dt'),
+        {'postgresql_partition_by': 'RANGE (latch_dt)'},
+    )
 
     limit_id: Mapped[int] = mapped_column(BigInteger, comment='Идентификатор аварийного критерия устройства', primary_key=True)
     latch_dt: Mapped[datetime] = mapped_column(comment='Время срабатывания аварийного критерия', primary_key=True)
@@ -41,12 +53,67 @@ class LogTable(Base):
         return (self.limit_id, self.latch_dt) == (other.limit_id, other.latch_dt)
 
 
+# Секция по умолчанию принимает строки, для дней которых еще не создана дневная секция (см. LogPartitionManager)
+event.listen(LogTable.__table__, 'after_create',
+             DDL('CREATE TABLE IF NOT EXISTS "LimitLogs_default" PARTITION OF "LimitLogs" DEFAULT'))
+
+
 class UserDeviceTable(Base):
     """Таблица относящихся к пользователям устройств, с которых собираются параметры и логи"""
     __tablename__ = 'UserDevices'
+    __table_args__ = (
+        UniqueConstraint('telegram_user_id', 'device_id', name='uq_UserDevices_telegram_user_id_device_id'),
+        Index('ix_UserDevices_device_id', 'device_id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('Users.telegram_user_id', ondelete='cascade'),
                                                   comment="Идентификатор пользователя в Telegram")
     device_id: Mapped[int] = mapped_column(BigInteger, comment='Идентификатор устройства')
 
+
+class FsmStateTable(Base):
+    """Таблица состояний FSM чатов Telegram"""
+    __tablename__ = 'FsmStates'
+
+    key: Mapped[str] = mapped_column(primary_key=True, comment='Ключ хранилища: бот, чат, пользователь')
+    state: Mapped[str | None] = mapped_column(comment='Текущее состояние')
+    data: Mapped[dict] = mapped_column(JSONB, default=dict, comment='Данные состояния')
+    updated_at: Mapped[datetime] = mapped_column(comment='Время последнего изменения')
+
+    __table_args__ = (
+        Index('ix_FsmStates_updated_at', 'updated_at'),
+    )
+
+
+class NotificationFilterTable(Base):
+    """Таблица фильтров уведомлений пользователей. Пользователь без фильтра получает уведомления о всех срабатываниях"""
+    __tablename__ = 'NotificationFilters'
+
+    telegram_user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('Users.telegram_user_id', ondelete='cascade'),
+                                                  primary_key=True, comment="Идентификатор пользователя в Telegram")
+    event_types: Mapped[list[str] | None] = mapped_column(ARRAY(String),
+                                                          comment='Типы событий, о которых уведомлять. NULL - все')
+    mute_recoveries: Mapped[bool] = mapped_column(default=False, comment='Не уведомлять о восстановлении нормы')
+    muted_device_ids: Mapped[list[int]] = mapped_column(ARRAY(BigInteger), default=list,
+                                                        comment='Устройства, о которых не уведомлять')
+    muted_objects: Mapped[list[str]] = mapped_column(ARRAY(String), default=list,
+                                                     comment='Названия объектов, о которых не уведомлять')
+    quiet_from: Mapped[time | None] = mapped_column(comment='Начало тихих часов')
+    quiet_to: Mapped[time | None] = mapped_column(comment='Окончание тихих часов')
+
+
+class AlertMessageTable(Base):
+    """Таблица отправленных уведомлений об авариях, которые дополняются при поступлении события об их устранении"""
+    __tablename__ = 'AlertMessages'
+    __table_args__ = (
+        Index('ix_AlertMessages_device_id', 'device_id'),
+        Index('ix_AlertMessages_sent_at', 'sent_at'),
+    )
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, comment='Идентификатор чата Telegram')
+    device_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, comment='Идентификатор устройства')
+    event_type: Mapped[str] = mapped_column(primary_key=True, comment='Тип события (см. settings.log_rules)')
+    message_id: Mapped[int] = mapped_column(BigInteger, comment='Идентификатор сообщения в чате')
+    text: Mapped[str] = mapped_column(comment='Текущий текст сообщения (MarkdownV2)')
+    sent_at: Mapped[datetime] = mapped_column(comment='Время отправки сообщения')
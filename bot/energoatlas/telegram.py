@@ -0,0 +1,154 @@
+"""
+Единый транспорт запросов к Telegram Bot API.
+
+Обработчики бота (через ``aiogram.Bot``) и фоновая рассылка уведомлений (через ``ApiManager``) выполняют запросы
+через сессию ``HttpxSession`` поверх общего HTTP-клиента httpx: соединения с Telegram переиспользуются из одного пула,
+а ограничение частоты отправки и обработка ответов 429 (``TelegramRateLimiter``) общие для всех запросов процесса.
+"""
+import asyncio
+import time
+from typing import Any, AsyncGenerator
+
+import httpx
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from loguru import logger
+
+from energoatlas.metrics import API_SEMAPHORE_WAIT, current_api_call
+from energoatlas.settings import settings
+
+
+def telegram_api_server() -> TelegramAPIServer:
+    """Адреса методов Bot API по настройке ``telegram_api_base`` (например, эмулятора Telegram)"""
+    base = settings.telegram_api_base
+    return TelegramAPIServer(base=f'{base}{{token}}/{{method}}',
+                             file=f'{base.removesuffix("/bot")}/file/bot{{token}}/{{path}}')
+
+
+class HttpxSession(BaseSession):
+    def __init__(self, client: httpx.AsyncClient | None = None, **kwargs: Any):
+        """
+        Сессия aiogram, выполняющая запросы к Bot API через HTTP-клиент httpx.
+        :param client: общий HTTP-клиент. Если не передан, сессия создает собственный клиент при первом запросе
+        """
+        super().__init__(**kwargs)
+        self.client = client
+        self._own_client = client is None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient()
+        return self.client
+
+    async def close(self) -> None:
+        if self._own_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _build_request_data(self, bot: Bot, method: TelegramMethod) -> tuple[dict[str, str], dict]:
+        data = {}
+        files = {}
+        for key, value in method.model_dump(warnings=False).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if value:
+                data[key] = value
+        uploads = {key: (file.filename or key, b''.join([chunk async for chunk in file.read(bot)]))
+                   for key, file in files.items()}
+        return data, uploads
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType],
+                           timeout: int | None = None) -> TelegramType:
+        url = self.api.api_url(token=bot.token, method=method.__api_method__)
+        data, files = await self._build_request_data(bot, method)
+        token = None
+        if current_api_call.get()[0] != 'telegram':
+            token = current_api_call.set(('telegram', method.__api_method__))
+        try:
+            response = await self._get_client().post(url, data=data, files=files or None,
+                                                     timeout=self.timeout if timeout is None else timeout)
+        except httpx.TimeoutException:
+            raise TelegramNetworkError(method=method, message='Request timeout error')
+        except httpx.HTTPError as exc:
+            raise TelegramNetworkError(method=method, message=f'{type(exc).__name__}: {exc}')
+        finally:
+            if token is not None:
+                current_api_call.reset(token)
+        result = self.check_response(bot=bot, method=method, status_code=response.status_code, content=response.text)
+        return result.result
+
+    async def stream_content(self, url: str, headers: dict[str, Any] | None = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        async with self._get_client().stream('GET', url, headers=headers, timeout=timeout) as response:
+            if raise_for_status:
+                response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+
+
+class TelegramRateLimiter(BaseRequestMiddleware):
+    def __init__(self, concurrency: int, rate: float, chat_interval: float, max_retries: int):
+        """
+        Общее для всех запросов процесса ограничение отправки сообщений в Telegram. Ограничиваются только методы,
+        адресованные чату (отправка, изменение и удаление сообщений), остальные методы (в том числе long polling)
+        выполняются без ожидания.
+        :param concurrency: количество одновременных запросов
+        :param rate: количество запросов в секунду по всем чатам
+        :param chat_interval: минимальный интервал (в секундах) между запросами в один чат
+        :param max_retries: количество повторов запроса после ответа 429
+        """
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._next_slot = 0.0
+        self._chat_slots: dict[int | str, float] = {}
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        for attempt in range(self.max_retries + 1):
+            started_at = time.perf_counter()
+            await asyncio.sleep(self._reserve(chat_id))
+            async with self.semaphore:
+                API_SEMAPHORE_WAIT.labels('telegram').observe(time.perf_counter() - started_at)
+                try:
+                    return await make_request(bot, method)
+                except TelegramRetryAfter as exc:
+                    if attempt == self.max_retries:
+                        raise
+                    logger.warning(f'[Telegram API] Flood control for chat {chat_id}, retry in {exc.retry_after} s')
+                    self._postpone(chat_id, exc.retry_after)
+
+    def _reserve(self, chat_id: int | str) -> float:
+        """Занять ближайшее время отправки с учетом общего и чатового ограничений. Возвращает время ожидания"""
+        now = time.monotonic()
+        slot = now
+        if self.rate:
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+        slot = max(slot, self._chat_slots.get(chat_id, 0.0))
+        self._chat_slots[chat_id] = slot + self.chat_interval
+        if len(self._chat_slots) > 10_000:
+            self._chat_slots = {chat: until for chat, until in self._chat_slots.items() if until > now}
+        return slot - now
+
+    def _postpone(self, chat_id: int | str, delay: float) -> None:
+        self._chat_slots[chat_id] = max(self._chat_slots.get(chat_id, 0.0), time.monotonic() + delay)
+
+
+rate_limiter = TelegramRateLimiter(settings.telegram_concurrency, settings.telegram_rate,
+                                   settings.telegram_chat_interval, settings.telegram_max_retries)
+
+
+def create_bot(client: httpx.AsyncClient | None = None) -> Bot:
+    """Бот, выполняющий запросы через общий HTTP-клиент ``client`` с общим для процесса ограничением отправки"""
+    session = HttpxSession(client, api=telegram_api_server())
+    session.middleware(rate_limiter)
+    return Bot(token=settings.bot_token, session=session)
@@ -68,10 +68,10 @@ async def test_session(test_engine):
 @pytest.fixture
 def devices():
     return [
-        Device.model_construct(id=0),
-        Device.model_construct(id=1),
-        Device.model_construct(id=2),
-        Device.model_construct(id=3),
+        Device(object_name='', object_address='', id=0, name=''),
+        Device(object_name='', object_address='', id=1, name=''),
+        Device(object_name='', object_address='', id=2, name=''),
+        Device(object_name='', object_address='', id=3, name=''),
     ]
 
 
@@ -1,10 +1,15 @@
+import json
+from datetime import datetime
+
 import pytest
 from httpx import Response, Request
+from prometheus_client import REGISTRY
 from pytest_mock import MockFixture
 
 from energoatlas.models.background import Device, Log
 from energoatlas.models.aiogram import Company, Object, Parameter
 from energoatlas.models.aiogram import Device as ObjectDevice
+from energoatlas.settings import settings
 
 
 @pytest.fixture
@@ -48,7 +53,7 @@ async def test_get_user_devices_success(api_manager, mock_response):
             ]
         }
     ]
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     devices = await api_manager.get_user_devices('test_token', 123)
@@ -73,7 +78,7 @@ async def test_get_limit_logs(api_manager, mock_response):
         }
     ]
     device_id = 123
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     device_id_result, logs = await api_manager.get_limit_logs(device_id, 'test_token')
@@ -82,6 +87,30 @@ async def test_get_limit_logs(api_manager, mock_response):
     assert len(logs) == 2 and all((isinstance(log, Log) for log in logs))
 
 
+@pytest.mark.asyncio
+async def test_get_limit_logs_trusted_payloads(api_manager, mock_response, monkeypatch):
+    monkeypatch.setattr(settings, 'api_trusted_payloads', True)
+    response_data = [{"limit_id": 386836, "latch_dt": "2024-01-29 14:02:19", "latch_message": "Протечка", "foo": "bar"}]
+    mock_response.content = json.dumps(response_data).encode()
+    api_manager.client.get.return_value = mock_response
+
+    _, logs = await api_manager.get_limit_logs(123, 'test_token')
+
+    assert logs == [Log(limit_id=386836, latch_dt=datetime(2024, 1, 29, 14, 2, 19), latch_message='Протечка')]
+
+
+@pytest.mark.asyncio
+async def test_get_limit_logs_uses_poll_profile(api_manager, mock_response, mocker: MockFixture):
+    mock_response.content = b'[]'
+    poll_client = mocker.Mock(get=mocker.AsyncMock(return_value=mock_response))
+    api_manager.clients = {'poll': poll_client}
+
+    await api_manager.get_limit_logs(123, 'test_token')
+
+    poll_client.get.assert_awaited_once()
+    api_manager.client.get.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_get_user_companies(api_manager, mock_response):
     response_data = [
@@ -91,7 +120,7 @@ async def test_get_user_companies(api_manager, mock_response):
             "foo": "bar"
         }
     ]
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     companies = await api_manager.get_user_companies('test_token')
@@ -115,7 +144,7 @@ async def test_get_company_objects(api_manager, mock_response):
             "foo": "bar"
         }
     ]
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     objects = await api_manager.get_company_objects(123, 'token')
@@ -146,7 +175,7 @@ async def test_get_objects_devices(api_manager, mock_response):
             }
         ]
     }
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     objects = await api_manager.get_object_devices(123, 'token')
@@ -176,7 +205,7 @@ async def test_get_device_status(api_manager, mock_response):
             "foo": "bar"
         }
     ]
-    mock_response.json.return_value = response_data
+    mock_response.content = json.dumps(response_data).encode()
     api_manager.client.get.return_value = mock_response
 
     objects = await api_manager.get_device_status(123, 'token')
@@ -184,3 +213,34 @@ async def test_get_device_status(api_manager, mock_response):
     assert len(objects) == 2
     assert all((isinstance(obj, Parameter) for obj in objects))
 
+
+@pytest.mark.asyncio
+async def test_api_call_observes_duration(api_manager, mock_response):
+    labels = {'api': 'energoatlas', 'endpoint': 'get_user_companies'}
+    before = REGISTRY.get_sample_value('energoatlas_api_request_duration_seconds_count', labels) or 0
+    mock_response.content = b'[]'
+    api_manager.client.get.return_value = mock_response
+
+    await api_manager.get_user_companies('test_token')
+
+    assert REGISTRY.get_sample_value('energoatlas_api_request_duration_seconds_count', labels) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_device_lookups_are_cached(api_manager, mock_response):
+    mock_response.content = json.dumps({'devices': [{'id': 1, 'name': 'Датчик', 'type': 'Протечка'}]}).encode()
+    api_manager.client.get.return_value = mock_response
+
+    assert api_manager.find_cached_device(10, 1, 'token') is None
+    await api_manager.get_cached_object_devices(10, 'token')
+    await api_manager.get_cached_object_devices(10, 'token')
+    assert api_manager.find_cached_device(10, 1, 'token').name == 'Датчик'
+    assert api_manager.find_cached_device(10, 1, 'other_token') is None
+    assert api_manager.client.get.await_count == 1
+
+    mock_response.content = json.dumps([{'descr': 'Связь', 'measurement': '', 'val': 1, 'visible': 1,
+                                         'expired': 0}]).encode()
+    await api_manager.get_cached_device_status(1, 'token')
+    await api_manager.get_cached_device_status(1, 'other_token')  # значения устройства общие для пользователей
+    assert api_manager.client.get.await_count == 2
+
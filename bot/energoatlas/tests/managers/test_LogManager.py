@@ -2,17 +2,25 @@ import asyncio
 from datetime import datetime
 
 import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramServerError
+from aiogram.methods import SendMessage
 from dateutil.relativedelta import relativedelta as rd
 from pytest_mock import MockerFixture
+from sqlalchemy import func, update
 
-from energoatlas.models.background import DeviceWithLogs, Log, DeviceDict
+from energoatlas.managers import MessageFormatter
+from energoatlas.models.background import DeviceWithLogs, Log, DeviceDict, LogCategory
+from energoatlas.routing import RoutingTable
 from energoatlas.settings import settings
-from energoatlas.tables import LogTable
+from energoatlas.alerts import AlertThreads
+from energoatlas.tables import LogTable, NotificationFilterTable, UserTable, AlertMessageTable
 
 
 dt1 = datetime.now()
 dt2 = dt1 + rd(days=1)
 dt3 = dt2 + rd(days=1)
+leak = LogCategory('leak', 'critical')
+leak_recovery = LogCategory('leak', 'recovery')
 
 
 @pytest.fixture
@@ -30,12 +38,12 @@ def logs_table():
 @pytest.fixture
 def logs():
     return [
-        Log.model_construct(limit_id=0, latch_dt=dt1, latch_message=''),
-        Log.model_construct(limit_id=0, latch_dt=dt2, latch_message=''),
-        Log.model_construct(limit_id=0, latch_dt=dt3, latch_message=''),
-        Log.model_construct(limit_id=1, latch_dt=dt1, latch_message=''),
-        Log.model_construct(limit_id=1, latch_dt=dt2, latch_message=''),
-        Log.model_construct(limit_id=1, latch_dt=dt3, latch_message=''),
+        Log(limit_id=0, latch_dt=dt1, latch_message=''),
+        Log(limit_id=0, latch_dt=dt2, latch_message=''),
+        Log(limit_id=0, latch_dt=dt3, latch_message=''),
+        Log(limit_id=1, latch_dt=dt1, latch_message=''),
+        Log(limit_id=1, latch_dt=dt2, latch_message=''),
+        Log(limit_id=1, latch_dt=dt3, latch_message=''),
     ]
 
 
@@ -127,7 +135,6 @@ async def test_get_devices_logs(log_manager, logs, devices, mocker: MockerFixtur
         future.set_result(response)
 
     mocker.patch('asyncio.as_completed', return_value=mocked_futures)
-    mocker.patch.object(DeviceWithLogs, 'model_validate')
     mocker.patch.object(log_manager.api_manager, 'get_limit_logs')
 
     result = await log_manager._get_devices_logs(DeviceDict(devices), 'test_token')
@@ -141,7 +148,12 @@ async def test_get_devices_logs(log_manager, logs, devices, mocker: MockerFixtur
 @pytest.mark.asyncio
 async def test_notify_telegram_users(log_manager, devices, logs, mocker: MockerFixture):
     subscribed_telegram_ids = {0: [10, 20, 30], 1: [10, 20], 2: [10], 3: [20, 30]}
-    mocker.patch.object(log_manager, 'get_subscribed_telegram_ids', new=mocker.AsyncMock(return_value=subscribed_telegram_ids))
+    for log in logs:
+        log.category = leak
+    log_manager.routing = RoutingTable([leak])
+    for user_id in (10, 20, 30):
+        device_ids = [device_id for device_id, users in subscribed_telegram_ids.items() if user_id in users]
+        log_manager.routing.set_user(user_id, dt1, device_ids)
     devices = [DeviceWithLogs(device=d, logs=logs) for d in devices]
     user_devices = {
         10: [devices[0], devices[1], devices[2]],
@@ -153,5 +165,158 @@ async def test_notify_telegram_users(log_manager, devices, logs, mocker: MockerF
     await log_manager._notify_telegram_users(devices)
 
     method.assert_has_calls([
-        mocker.call(id_, device) for id_, device in user_devices.items()
+        mocker.call(id_, device, MessageFormatter.notification_message(device), silent=False)
+        for id_, device in user_devices.items()
     ])
+
+
+@pytest.mark.asyncio
+async def test_notify_telegram_users_renders_once_per_device_set(log_manager, devices, logs, mocker: MockerFixture):
+    for log in logs:
+        log.category = leak
+    log_manager.routing = RoutingTable([leak])
+    for user_id in (10, 20, 30):
+        log_manager.routing.set_user(user_id, dt1, [0, 1])
+    devices = [DeviceWithLogs(device=d, logs=logs) for d in devices[:2]]
+    render = mocker.spy(MessageFormatter, 'notification_message')
+    method = mocker.patch.object(log_manager, '_send_notification_in_chat', new_callable=mocker.AsyncMock)
+
+    await log_manager._notify_telegram_users(devices)
+
+    render.assert_called_once_with(devices)
+    assert method.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_sync_routing_table(log_manager, users, user_devices, test_session):
+    test_session.add(NotificationFilterTable(telegram_user_id=2, mute_recoveries=True))
+    await test_session.commit()
+
+    routing = await log_manager.sync_routing_table(DeviceDict([]))
+
+    assert routing.route(100, leak) == {1, 2, 3}
+    assert routing.route(100, leak_recovery) == {1, 3}
+    assert routing.route(300, leak) == {1}
+
+    # Перестраиваются маршруты только изменившегося пользователя
+    notification_filter = await test_session.get(NotificationFilterTable, 2)
+    await test_session.delete(notification_filter)
+    await test_session.execute(update(UserTable).where(UserTable.telegram_user_id == users[1].telegram_user_id)
+                               .values(updated_at=func.clock_timestamp()))
+    await test_session.commit()
+
+    routing = await log_manager.sync_routing_table(DeviceDict([]))
+
+    assert routing.route(100, leak_recovery) == {1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_sync_routing_table_removes_deleted_users(log_manager, users, user_devices, test_session):
+    await log_manager.sync_routing_table(DeviceDict([]))
+    await test_session.delete(users[0])
+    await test_session.commit()
+
+    routing = await log_manager.sync_routing_table(DeviceDict([]))
+
+    assert users[0].telegram_user_id not in routing.versions
+    assert routing.versions.keys() == {user.telegram_user_id for user in users[1:]}
+
+
+@pytest.mark.asyncio
+async def test_blocked_chat_is_unsubscribed(log_manager, devices, logs, test_session, mocker: MockerFixture):
+    test_session.add(UserTable(telegram_user_id=50, login='', password=''))
+    await test_session.commit()
+    for log in logs:
+        log.category = leak
+    log_manager.routing = RoutingTable([leak])
+    log_manager.routing.set_user(50, dt1, [0])
+    mocker.patch.object(log_manager.api_manager, 'send_telegram_message', new=mocker.AsyncMock(
+        side_effect=TelegramForbiddenError(method=SendMessage(chat_id=50, text=''),
+                                           message='Forbidden: bot was blocked by the user')
+    ))
+
+    await log_manager._notify_telegram_users([DeviceWithLogs(device=devices[0], logs=logs)])
+
+    assert await test_session.get(UserTable, 50, populate_existing=True) is None
+    assert log_manager.routing.route(0, leak) == set()
+
+
+@pytest.mark.asyncio
+async def test_undelivered_logs_are_retried(log_manager, devices, logs, mocker: MockerFixture):
+    for log in logs:
+        log.category = leak
+    log_manager.routing = RoutingTable([leak])
+    log_manager.routing.set_user(10, dt1, [0, 1])
+    mocker.patch.object(log_manager, '_save_alert_threads', new=mocker.AsyncMock())
+    send = mocker.patch.object(log_manager.api_manager, 'send_telegram_message', new=mocker.AsyncMock(
+        side_effect=[TelegramServerError(method=SendMessage(chat_id=10, text=''), message='Bad Gateway'), 1]
+    ))
+    log_manager.delivery.should_send = lambda chat_id: True
+
+    await log_manager._notify_telegram_users([DeviceWithLogs(device=devices[0], logs=logs)])
+    await log_manager._notify_telegram_users([DeviceWithLogs(device=devices[1], logs=logs)])
+
+    assert send.await_count == 2
+    assert send.await_args.args[1].text == MessageFormatter.notification_message(
+        [DeviceWithLogs(device=devices[0], logs=logs), DeviceWithLogs(device=devices[1], logs=logs)]
+    ).text
+
+
+@pytest.mark.asyncio
+async def test_rejected_notification_does_not_abort_cycle(log_manager, devices, logs, mocker: MockerFixture):
+    for log in logs:
+        log.category = leak
+    log_manager.routing = RoutingTable([leak])
+    log_manager.routing.set_user(10, dt1, [0])
+    log_manager.routing.set_user(20, dt1, [1])
+
+    async def send(chat_id, message_params):
+        if chat_id == 10:
+            raise TelegramBadRequest(method=SendMessage(chat_id=10, text=''), message="can't parse entities")
+        return 5
+    mocker.patch.object(log_manager.api_manager, 'send_telegram_message', new=send)
+    save_threads = mocker.patch.object(log_manager, '_save_alert_threads', new=mocker.AsyncMock())
+    save_logs = mocker.patch.object(log_manager, '_save_new_logs', new=mocker.AsyncMock())
+    mocker.patch.object(log_manager.api_manager, 'get_auth_token', new=mocker.AsyncMock(return_value='token'))
+    mocker.patch.object(log_manager, '_get_tracked_devices', new=mocker.AsyncMock(return_value=set(devices[:2])))
+    devices_logs = [DeviceWithLogs(device=devices[0], logs=logs), DeviceWithLogs(device=devices[1], logs=logs)]
+    mocker.patch.object(log_manager, '_get_devices_logs', new=mocker.AsyncMock(return_value=devices_logs))
+    mocker.patch.object(log_manager, 'get_notified_index', new=mocker.AsyncMock())
+    mocker.patch.object(log_manager, '_determine_new_logs', return_value=devices_logs)
+    mocker.patch.object(log_manager, 'sync_routing_table', new=mocker.AsyncMock())
+
+    await log_manager.request_logs_and_notify()
+
+    save_logs.assert_awaited_once_with(devices_logs)
+    assert [row.chat_id for row in save_threads.await_args.args[0].sent] == [20]
+    assert log_manager.delivery.pop_deferred() == {}
+    assert log_manager.delivery.should_send(10)
+
+
+@pytest.mark.asyncio
+async def test_recovery_edits_alert_message(log_manager, devices, mocker: MockerFixture):
+    recovery = Log(limit_id=0, latch_dt=dt1, latch_message='Протечка устранена', category=leak_recovery)
+    log_manager.routing = RoutingTable([leak_recovery])
+    log_manager.routing.set_user(10, dt1, [0])
+    thread = AlertMessageTable(chat_id=10, device_id=0, event_type='leak', message_id=5, text='Протечка', sent_at=dt1)
+    mocker.patch.object(log_manager, '_load_alert_threads', new=mocker.AsyncMock(return_value=AlertThreads([thread])))
+    save = mocker.patch.object(log_manager, '_save_alert_threads', new=mocker.AsyncMock())
+    edit = mocker.patch.object(log_manager.api_manager, 'edit_telegram_message', new=mocker.AsyncMock())
+    send = mocker.patch.object(log_manager.api_manager, 'send_telegram_message', new=mocker.AsyncMock())
+
+    await log_manager._notify_telegram_users([DeviceWithLogs(device=devices[0], logs=[recovery])])
+
+    send.assert_not_awaited()
+    assert edit.await_args.args[:2] == (10, 5)
+    assert edit.await_args.args[2].text.startswith('Протечка\n\n')
+    assert save.await_args.args[0].resolved == [(10, 0, 'leak')]
+
+
+@pytest.mark.asyncio
+async def test_save_alert_threads_skips_empty_cycles(log_manager, mocker: MockerFixture):
+    await log_manager._save_alert_threads(AlertThreads())
+    execute = mocker.spy(log_manager.session, 'execute')
+
+    await log_manager._save_alert_threads(AlertThreads())
+
+    execute.assert_not_called()
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import select, text
+
+from energoatlas.managers._LogPartitionManager import LogPartitionManager, expired_partitions, partition_name
+from energoatlas.tables import LogTable
+
+
+def test_partition_name():
+    assert partition_name(date(2024, 5, 7)) == 'LimitLogs_20240507'
+
+
+def test_expired_partitions_keeps_default_and_recent_partitions():
+    names = ['LimitLogs_default', 'LimitLogs_20240506', 'LimitLogs_20240504', 'LimitLogs_20240505',
+             'LimitLogs_20240507', 'OtherTable_20240501']
+    assert expired_partitions(names, cutoff=date(2024, 5, 6)) == ['LimitLogs_20240504', 'LimitLogs_20240505']
+
+
+@pytest.mark.asyncio
+async def test_create_partitions_moves_rows_out_of_default_partition(test_session):
+    day = date(2199, 1, 1)
+    test_session.add(LogTable(limit_id=1, latch_dt=datetime(2199, 1, 1, 12)))
+    await test_session.commit()
+
+    with patch.object(LogPartitionManager, '__del__', MagicMock()):
+        manager = LogPartitionManager(session=test_session)
+        await manager.create_partitions(day, day)
+
+        assert partition_name(day) in await manager._get_partitions()
+    assert list(await test_session.scalars(text(f'SELECT limit_id FROM "{partition_name(day)}"'))) == [1]
+    assert list(await test_session.scalars(text('SELECT limit_id FROM "LimitLogs_default"'))) == []
+    assert len(list(await test_session.scalars(select(LogTable).where(LogTable.limit_id == 1)))) == 1
+    await test_session.execute(text(f'DROP TABLE "{partition_name(day)}"'))
+    await test_session.commit()
+
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from energoatlas.managers import MessageFormatter
+from energoatlas.models.background import Device, DeviceWithLogs, Log
+
+
+def test_escape_markdown():
+    text = 'ДЗ_1*[2](3)~`>#+-=|{4}.!'
+
+    assert MessageFormatter.escape_markdown(text) == r'ДЗ\_1\*\[2\]\(3\)\~\`\>\#\+\-\=\|\{4\}\.\!'
+
+
+def test_device_header_cache_follows_device_changes():
+    device = Device(object_name='Склад №1', object_address='ул. Ленина, 1', id=42, name='ДЗ 1')
+    header = MessageFormatter.device_header(device)
+
+    assert 'ул\\. Ленина, 1' in header
+    assert MessageFormatter.device_header(device) is header
+
+    device.object_address = 'ул. Мира, 2'
+    assert 'ул\\. Мира, 2' in MessageFormatter.device_header(device)
+
+
+def test_split_notification_fits_message_limit():
+    devices = [Device(object_name='Склад', object_address='ул. Ленина, 1', id=i, name=f'ДЗ {i}') for i in range(3)]
+    device_logs = [DeviceWithLogs(device, [Log(limit_id=j, latch_dt=datetime(2024, 5, 1), latch_message='Пожар ' * 20)
+                                           for j in range(10)]) for device in devices]
+    limit = 1000
+
+    parts = MessageFormatter.split_notification(device_logs, limit)
+
+    assert len(parts) > 1
+    assert all(len(MessageFormatter.notification_message(part).text) <= limit for part in parts)
+    assert [(unit.device.id, log.limit_id) for part in parts for unit in part for log in unit.logs] == \
+           [(unit.device.id, log.limit_id) for unit in device_logs for log in unit.logs]
+    assert MessageFormatter.split_notification(device_logs[:1]) == [device_logs[:1]]
+
@@ -1,5 +1,8 @@
 import pytest
 from pytest_mock import MockerFixture
+from sqlalchemy import select
+
+from energoatlas.tables import UserTable
 
 
 @pytest.fixture
@@ -32,6 +35,22 @@ async def test_set_devices_for_user_removes_devices(user_manager, user, devices,
     assert [d.id for d in devices[2:]] == [d.device_id for d in set_devices]
 
 
+@pytest.mark.asyncio
+async def test_set_devices_for_user_keeps_version_of_unchanged_devices(user_manager, user, devices, test_session):
+    statement = select(UserTable.updated_at).where(UserTable.telegram_user_id == user.telegram_user_id)
+    await user_manager._set_devices_for_user(user, devices)
+    await user_manager.session.commit()
+    updated_at = await test_session.scalar(statement)
+
+    await user_manager._set_devices_for_user(user, reversed(devices))
+    await user_manager.session.commit()
+    assert await test_session.scalar(statement) == updated_at
+
+    await user_manager._set_devices_for_user(user, devices[1:])
+    await user_manager.session.commit()
+    assert await test_session.scalar(statement) > updated_at
+
+
 @pytest.mark.asyncio
 async def test_update_user_sets_devices(user_manager, user, devices, companies, mocker: MockerFixture):
     mocker.patch.object(user_manager.api_manager, 'get_auth_token', new=mocker.AsyncMock(return_value='123'))
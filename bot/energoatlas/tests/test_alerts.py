@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from energoatlas.alerts import AlertThreads
+from energoatlas.models.background import Device, DeviceWithLogs, Log, LogCategory
+from energoatlas.tables import AlertMessageTable
+
+
+now = datetime(2024, 6, 10, 12, 0)
+device = Device(object_name='Склад', object_address='ул. Ленина, 1', id=100, name='ДЗ 1')
+leak = Log(1, now, 'Протечка', LogCategory('leak', 'critical'))
+leak_recovery = Log(2, now, 'Протечка устранена', LogCategory('leak', 'recovery'))
+smoke_recovery = Log(3, now, 'Задымление устранено', LogCategory('smoke', 'recovery'))
+
+
+def test_split_recoveries_of_notified_alerts():
+    thread = AlertMessageTable(chat_id=10, device_id=100, event_type='leak', message_id=5, text='Протечка', sent_at=now)
+    threads = AlertThreads([thread])
+    unit = DeviceWithLogs(device, [leak_recovery, smoke_recovery])
+
+    edits, rest = threads.split(10, [unit])
+    assert edits == {5: (thread, [DeviceWithLogs(device, [leak_recovery])])}
+    assert rest == [DeviceWithLogs(device, [smoke_recovery])]
+
+    # В другой чат уведомление об аварии не отправлялось
+    assert threads.split(20, [unit]) == ({}, [unit])
+
+
+def test_record_sent_alerts():
+    threads = AlertThreads()
+
+    threads.record_sent(10, 7, 'text', [DeviceWithLogs(device, [leak, smoke_recovery])])
+
+    assert [(row.chat_id, row.device_id, row.event_type, row.message_id) for row in threads.sent] == [(10, 100, 'leak', 7)]
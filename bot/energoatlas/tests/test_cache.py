@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from energoatlas.cache import TtlCache
+
+
+@pytest.mark.asyncio
+async def test_cache_loads_once_for_concurrent_requests():
+    cache = TtlCache('test', ttl=0.05)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return ['value']
+
+    assert await asyncio.gather(cache.get(1, load), cache.get(1, load)) == [['value'], ['value']]
+    assert await cache.get(1, load) == ['value']
+    assert len(loads) == 1
+
+    await asyncio.sleep(0.06)
+    assert cache.peek(1) is None
+    await cache.get(1, load)
+    assert len(loads) == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_skips_errors_and_empty_values():
+    cache = TtlCache('test', ttl=5, maxsize=1)
+
+    async def fail():
+        raise ValueError('boom')
+
+    async def empty():
+        return []
+
+    with pytest.raises(ValueError):
+        await cache.get(1, fail)
+    assert await cache.get(1, empty) == []
+    assert cache.peek(1) is None
+
+    async def value():
+        return ['value']
+
+    await cache.get(1, value)
+    await cache.get(2, value)
+    assert cache.peek(1) is None and cache.peek(2) == ['value']  # вытеснено самое старое значение
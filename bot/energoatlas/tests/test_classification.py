@@ -0,0 +1,24 @@
+from energoatlas.classification import LogClassifier, classifier
+from energoatlas.models.background import LogCategory
+from energoatlas.settings import LogRule
+
+
+def test_classify_exact_with_parenthesized_variant():
+    assert classifier.classify('Протечка (Хранилище 2 ) ') == LogCategory('leak', 'critical')
+    assert classifier.classify('Протечка устранена') == LogCategory('leak', 'recovery')
+    assert classifier.classify('Давление в норме (Насосная)').priority == 0
+    assert classifier.classify('Протечка обнаружена') is None
+    assert classifier.classify('Температура выше нормы') is None
+
+
+def test_classify_longest_prefix():
+    log_classifier = LogClassifier([
+        LogRule(pattern='Авария', event_type='alarm', severity='warning', match='prefix'),
+        LogRule(pattern='Авария превышения', event_type='pressure', severity='critical', match='prefix'),
+        LogRule(pattern='Авария превышения давления', event_type='pressure_exact', severity='critical'),
+    ])
+
+    assert log_classifier.classify('Авария превышения давления (Котельная)') == LogCategory('pressure_exact', 'critical')
+    assert log_classifier.classify('Авария превышения давления на входе') == LogCategory('pressure', 'critical')
+    assert log_classifier.classify('Авария насоса') == LogCategory('alarm', 'warning')
+    assert log_classifier.classify('Авари') is None
@@ -0,0 +1,38 @@
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text, QueuePool
+from prometheus_client import REGISTRY
+
+from energoatlas.database import MIGRATIONS_CONFIG, get_async_engine, observe_pool
+from energoatlas.settings import settings
+
+
+def test_async_engine_is_configured_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'db_pool_size', 12)
+    monkeypatch.setattr(settings, 'db_max_overflow', 3)
+    monkeypatch.setattr(settings, 'db_pool_timeout', 7)
+    get_async_engine.cache_clear()
+    try:
+        pool = get_async_engine().sync_engine.pool
+        assert (pool.size(), pool._max_overflow, pool._timeout) == (12, 3, 7)
+        assert get_async_engine() is get_async_engine()
+    finally:
+        get_async_engine.cache_clear()
+
+
+def test_pool_events_are_observed():
+    engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=1)
+    observe_pool(engine.pool)
+    checkouts = REGISTRY.get_sample_value('energoatlas_db_pool_checkouts_total') or 0
+
+    with engine.connect() as conn:
+        conn.execute(text('select 1'))
+        assert REGISTRY.get_sample_value('energoatlas_db_pool_checked_out') == 1
+    assert REGISTRY.get_sample_value('energoatlas_db_pool_checkouts_total') == checkouts + 1
+    assert REGISTRY.get_sample_value('energoatlas_db_pool_checked_out') == 0
+
+
+def test_migrations_form_a_single_chain():
+    script = ScriptDirectory.from_config(Config(MIGRATIONS_CONFIG))
+    assert len(script.get_heads()) == 1
+    assert [revision.down_revision for revision in script.walk_revisions()][-1] is None
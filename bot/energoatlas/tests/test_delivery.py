@@ -0,0 +1,96 @@
+from aiogram.exceptions import (TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter,
+                                TelegramServerError)
+from aiogram.methods import SendMessage
+
+from energoatlas.delivery import DeliveryTracker, is_permanent_error, is_transient_error
+from energoatlas.models.background import DeviceWithLogs
+
+
+method = SendMessage(chat_id=1, text='')
+
+
+def telegram_error(status_code: int, description: str) -> TelegramAPIError:
+    if status_code == 403:
+        return TelegramForbiddenError(method=method, message=description)
+    if status_code == 400:
+        return TelegramBadRequest(method=method, message=description)
+    if status_code == 429:
+        return TelegramRetryAfter(method=method, message=description, retry_after=5)
+    return TelegramServerError(method=method, message=description)
+
+
+def test_is_permanent_error():
+    assert is_permanent_error(telegram_error(403, 'Forbidden: bot was blocked by the user'))
+    assert is_permanent_error(telegram_error(400, 'Bad Request: chat not found'))
+    assert not is_permanent_error(telegram_error(400, "Bad Request: can't parse entities"))
+    assert not is_permanent_error(telegram_error(429, 'Too Many Requests: retry after 5'))
+
+
+def test_is_transient_error():
+    assert is_transient_error(telegram_error(502, 'Bad Gateway'))
+    assert is_transient_error(telegram_error(429, 'Too Many Requests: retry after 5'))
+    assert not is_transient_error(telegram_error(400, "Bad Request: can't parse entities"))
+    assert not is_transient_error(telegram_error(403, 'Forbidden: bot was blocked by the user'))
+
+
+def test_delivery_tracker_suppresses_failing_chats(mocker):
+    clock = mocker.patch('energoatlas.delivery.time.monotonic', return_value=1000.0)
+    tracker = DeliveryTracker(backoff_base=60, backoff_max=600)
+
+    tracker.record_failure(1, telegram_error(502, 'Bad Gateway'))
+    assert not tracker.should_send(1)
+    clock.return_value = 1060.0
+    assert tracker.should_send(1)
+
+    tracker.record_failure(1, telegram_error(502, 'Bad Gateway'))
+    clock.return_value = 1150.0
+    assert not tracker.should_send(1)  # вторая ошибка подряд - приостановка на 120 секунд
+    tracker.record_success(1)
+    assert tracker.should_send(1)
+
+
+def test_delivery_tracker_collects_unreachable_chats():
+    tracker = DeliveryTracker(backoff_base=60, backoff_max=600)
+
+    tracker.record_failure(1, telegram_error(403, 'Forbidden: user is deactivated'))
+    tracker.record_failure(2, telegram_error(502, 'Bad Gateway'))
+
+    assert not tracker.should_send(1)
+    assert tracker.pop_unreachable() == {1}
+    assert tracker.pop_unreachable() == set()
+
+
+def test_delivery_tracker_defers_undelivered_logs():
+    tracker = DeliveryTracker(backoff_base=60, backoff_max=600)
+    leak, smoke, fire = (DeviceWithLogs(None, [name]) for name in ('leak', 'smoke', 'fire'))
+
+    tracker.defer(1, [leak])
+    tracker.defer(1, [smoke])
+    tracker.defer(2, [leak])
+    tracker.record_failure(2, telegram_error(403, 'Forbidden: bot was blocked by the user'))
+    tracker.defer(2, [fire])
+    assert tracker.pop_unreachable() == {2}
+
+    assert tracker.pop_deferred() == {1: [leak, smoke]}
+    assert tracker.pop_deferred() == {}
+
+
+def test_delivery_tracker_keeps_latest_deferred_logs():
+    tracker = DeliveryTracker(backoff_base=60, backoff_max=600, max_deferred_logs=3)
+
+    tracker.defer(1, [DeviceWithLogs(None, [1, 2])])
+    tracker.defer(1, [DeviceWithLogs(None, [3]), DeviceWithLogs(None, [4, 5])])
+
+    assert [unit.logs for unit in tracker.pop_deferred()[1]] == [[3], [4, 5]]
+
+    tracker.defer(1, [DeviceWithLogs(None, [1, 2, 3, 4])])
+    assert [unit.logs for unit in tracker.pop_deferred()[1]] == [[2, 3, 4]]
+
+
+def test_rejected_notifications_do_not_suspend_chat():
+    tracker = DeliveryTracker(backoff_base=60, backoff_max=600)
+
+    tracker.record_failure(1, telegram_error(400, 'Bad Request: message is too long'))
+
+    assert tracker.should_send(1)
+    assert tracker.pop_unreachable() == set()
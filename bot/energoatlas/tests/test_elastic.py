@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from pytest_mock import MockFixture
+
+from energoatlas.elastic import ElasticLogShipper
+
+
+@pytest.fixture
+def es(mocker: MockFixture):
+    es = mocker.Mock()
+    es.bulk = mocker.AsyncMock(return_value={'errors': False, 'items': []})
+    es.close = mocker.AsyncMock()
+    return es
+
+
+@pytest.mark.asyncio
+async def test_shipper_flushes_full_batch(es):
+    shipper = ElasticLogShipper(es, index='logs', batch_size=2, flush_interval=60)
+    shipper.start(asyncio.get_running_loop())
+
+    shipper.sink('{"text": "1"}\n')
+    shipper.sink('{"text": "2"}\n')
+    for _ in range(100):
+        if es.bulk.await_count:
+            break
+        await asyncio.sleep(0.01)
+
+    es.bulk.assert_awaited_once_with(
+        operations=['{"index":{}}', '{"text": "1"}\n', '{"index":{}}', '{"text": "2"}\n'], index='logs'
+    )
+    await shipper.close()
+
+
+@pytest.mark.asyncio
+async def test_shipper_drops_messages_when_full_and_flushes_on_close(es):
+    shipper = ElasticLogShipper(es, index='logs', batch_size=10, queue_size=2)
+
+    for i in range(5):
+        shipper.sink(f'{{"text": "{i}"}}\n')
+    await shipper.close()
+
+    operations = es.bulk.await_args.kwargs['operations']
+    assert operations[1::2] == ['{"text": "0"}\n', '{"text": "1"}\n']
+    es.close.assert_awaited_once()
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from energoatlas.hedging import HedgeBudget, LatencyTracker, hedge_request, hedged
+from energoatlas.settings import settings
+from energoatlas.utils import api_call
+
+
+def warmed_tracker(delay: float) -> LatencyTracker:
+    tracker = LatencyTracker(quantile=0.9, min_samples=10, min_delay=0.01)
+    for i in range(10):
+        tracker.observe(delay if i == 8 else delay / 10)
+    return tracker
+
+
+def test_latency_tracker_estimates_quantile():
+    tracker = LatencyTracker(quantile=0.9, min_samples=10, min_delay=0.05, refresh=5)
+    for duration in range(1, 10):
+        tracker.observe(duration / 10)
+    assert tracker.delay is None
+
+    tracker.observe(1.0)
+    assert tracker.delay == 0.9
+    for _ in range(5):
+        tracker.observe(0.01)
+    assert tracker.delay == pytest.approx(0.9)  # 90-й перцентиль последних 15 запросов
+
+
+def test_hedge_budget_limits_extra_requests():
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_primary():
+    delays = [10, 0]
+    cancelled = []
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert await asyncio.wait_for(hedged(call, warmed_tracker(0.02), HedgeBudget(0.1), ('test', 'call')), 1) == 0
+    await asyncio.sleep(0)
+    assert cancelled == [10]
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_respects_budget_and_errors():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'primary'
+
+    assert await hedged(slow, warmed_tracker(0.01), HedgeBudget(0, burst=0), ('test', 'slow')) == 'primary'
+    assert len(calls) == 1
+
+    async def failing():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        await hedged(failing, warmed_tracker(0.01), HedgeBudget(0.1), ('test', 'failing'))
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_are_observed():
+    tracker = LatencyTracker(0.5, min_samples=1)
+
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        await hedged(failing, tracker, HedgeBudget(0.1), ('test', 'failing'))
+    assert tracker.delay >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_hedge_request_duplicates_only_http_request_of_hedged_method(mocker):
+    mocker.patch.object(settings, 'api_hedge_enable', True)
+    requests = []
+    decoded = []
+
+    @api_call(hedge=True)
+    async def method():
+        response = await hedge_request(request)
+        decoded.append(response)
+        return response
+
+    async def request():
+        requests.append(len(requests))
+        await asyncio.sleep(0.5 if len(requests) == 1 else 0)
+        return len(requests)
+
+    for _ in range(60):
+        await method()
+    requests.clear()
+    decoded.clear()
+
+    await method()
+    assert len(requests) == 2 and len(decoded) == 1
+
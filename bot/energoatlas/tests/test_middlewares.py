@@ -0,0 +1,95 @@
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from pytest_mock import MockFixture
+
+from energoatlas.aiogram.middlewares import AuthValidationMiddleware, DependencyInjectionMiddleware
+from energoatlas.aiogram.states import Auth
+from energoatlas.cache import TtlCache
+from energoatlas.managers import UserManager
+
+
+@pytest.mark.asyncio
+async def test_dependency_injection_opens_no_session_for_handlers_without_db(mocker: MockFixture):
+    handler = mocker.AsyncMock(return_value='rendered')
+    data = {'api_manager': mocker.Mock()}
+
+    assert await DependencyInjectionMiddleware()(handler, mocker.Mock(), data) == 'rendered'
+    assert data['user_manager']._session is None
+
+
+@pytest.mark.asyncio
+async def test_dependency_injection_releases_session_after_handler(mocker: MockFixture):
+    session = mocker.Mock(close=mocker.AsyncMock())
+
+    def spawn_session(manager):
+        manager._session = session
+    mocker.patch.object(UserManager, '_spawn_session', spawn_session)
+
+    async def handler(_, data):
+        assert data['user_manager'].session is session
+        session.close.assert_not_awaited()
+
+    await DependencyInjectionMiddleware()(handler, mocker.Mock(), {'api_manager': mocker.Mock()})
+    session.close.assert_awaited_once()
+
+
+@pytest.fixture
+def state():
+    return FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=10, user_id=10))
+
+
+@pytest.mark.asyncio
+async def test_auth_validation_reads_credentials_from_database_on_cache_miss(state, mocker: MockFixture):
+    await state.set_state(Auth.authorized)
+    user_manager = mocker.Mock(get_user_credentials=mocker.AsyncMock(return_value=('login', 'password')),
+                               release=mocker.AsyncMock())
+    api_manager = mocker.Mock(get_auth_token=mocker.AsyncMock(return_value='token'),
+                              auth_token_cache=TtlCache('auth_token', 60))
+    handler = mocker.AsyncMock()
+    data = {'state': state, 'api_manager': api_manager, 'user_manager': user_manager}
+
+    await AuthValidationMiddleware()(handler, mocker.Mock(from_user=mocker.Mock(id=10)), data)
+
+    api_manager.get_auth_token.assert_awaited_once_with('login', 'password')
+    assert data['auth_token'] == 'token'
+    assert await state.get_data() == {}
+    handler.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_auth_validation_survives_undelivered_reauthorization_request(state, mocker: MockFixture):
+    await state.set_state(Auth.authorized)
+    user_manager = mocker.Mock(get_user_credentials=mocker.AsyncMock(return_value=('login', 'password')),
+                               release=mocker.AsyncMock(), remove_user=mocker.AsyncMock())
+    error = TelegramForbiddenError(method=SendMessage(chat_id=10, text=''), message='Forbidden: bot was blocked by the user')
+    api_manager = mocker.Mock(get_auth_token=mocker.AsyncMock(return_value=None), auth_token_cache=TtlCache('auth_token', 60),
+                              send_telegram_message=mocker.AsyncMock(side_effect=error))
+    handler = mocker.AsyncMock()
+    data = {'state': state, 'api_manager': api_manager, 'user_manager': user_manager}
+
+    await AuthValidationMiddleware()(handler, mocker.Mock(from_user=mocker.Mock(id=10)), data)
+
+    user_manager.remove_user.assert_awaited_once_with(10)
+    assert await state.get_state() is None
+    handler.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_auth_validation_serves_authorized_updates_from_cache(state, mocker: MockFixture):
+    await state.set_state(Auth.authorized)
+    api_manager = mocker.Mock(auth_token_cache=TtlCache('auth_token', 60))
+    await api_manager.auth_token_cache.get(10, mocker.AsyncMock(return_value='token'))
+    user_manager = mocker.Mock()
+    handler = mocker.AsyncMock()
+    data = {'state': state, 'api_manager': api_manager, 'user_manager': user_manager}
+
+    await AuthValidationMiddleware()(handler, mocker.Mock(from_user=mocker.Mock(id=10)), data)
+
+    assert data['auth_token'] == 'token'
+    assert user_manager.mock_calls == []
+    api_manager.get_auth_token.assert_not_called()
+
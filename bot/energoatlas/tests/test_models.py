@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from energoatlas.models.background import Log, NotifiedLogIndex
+from energoatlas.tables import LogTable
+
+
+now = datetime(2024, 5, 20, 14, 30)
+
+
+def test_notified_log_index_matches_exact_keys():
+    index = NotifiedLogIndex([LogTable(limit_id=1, latch_dt=now), LogTable(limit_id=2, latch_dt=now)])
+
+    assert Log(limit_id=1, latch_dt=now, latch_message='Протечка') in index
+    assert Log(limit_id=1, latch_dt=now + timedelta(seconds=1), latch_message='Протечка') not in index
+    assert Log(limit_id=3, latch_dt=now, latch_message='Протечка') not in index
+    assert len(index) == 2
+
+
+def test_notified_log_index_expires_whole_buckets():
+    index = NotifiedLogIndex()
+    index.update([LogTable(limit_id=1, latch_dt=now - timedelta(days=2)),
+                  LogTable(limit_id=2, latch_dt=now - timedelta(hours=1)),
+                  LogTable(limit_id=3, latch_dt=now)])
+
+    index.expire(since=now - timedelta(hours=1, minutes=10))
+
+    assert LogTable(limit_id=1, latch_dt=now - timedelta(days=2)) not in index
+    assert LogTable(limit_id=2, latch_dt=now - timedelta(hours=1)) in index
+    assert len(index) == 2
@@ -0,0 +1,32 @@
+
+from energoatlas.aiogram.callbacks import NotificationSettings
+from energoatlas.aiogram.handlers import notification_settings_keyboard, _toggle_notification_filter
+from energoatlas.settings import settings
+from energoatlas.tables import NotificationFilterTable
+
+
+def notification_filter(**values) -> NotificationFilterTable:
+    return NotificationFilterTable(**{'telegram_user_id': 1, 'event_types': None, 'mute_recoveries': False,
+                                      'muted_device_ids': [], 'muted_objects': [], **values})
+
+
+def test_notification_settings_keyboard_is_packable():
+    markup = notification_settings_keyboard(notification_filter(event_types=['leak'])).as_markup()
+
+    buttons = [button for row in markup.inline_keyboard for button in row]
+    assert len(buttons) == len(settings.event_type_names) + 2
+    assert buttons[0].text == '✅ Протечки' and buttons[1].text == '❌ Давление'
+    assert NotificationSettings.unpack(buttons[1].callback_data) == NotificationSettings(toggle='type',
+                                                                                        event_type='pressure')
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
+
+
+def test_toggle_notification_filter():
+    current = notification_filter()
+
+    _toggle_notification_filter(current, NotificationSettings(toggle='type', event_type='leak'))
+    assert current.event_types == sorted(set(settings.event_type_names) - {'leak'})
+    _toggle_notification_filter(current, NotificationSettings(toggle='type', event_type='leak'))
+    assert current.event_types is None
+    _toggle_notification_filter(current, NotificationSettings(toggle='recoveries'))
+    assert current.mute_recoveries
@@ -0,0 +1,56 @@
+import gzip
+import json
+
+import httpx
+import pytest
+
+from energoatlas.recording import RecordingTransport, ReplayTransport
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == '/api2/auth/open':
+        return httpx.Response(200, json={'token': 'secret-token'})
+    if request.url.path.endswith('/sendMessage'):
+        return httpx.Response(429, json={'ok': False, 'error_code': 429, 'parameters': {'retry_after': 3},
+                                         'description': 'Too Many Requests: retry after 3'})
+    return httpx.Response(200, json=[{
+        'limit_id': int(request.url.params['id']),
+        'latch_dt': '2024-01-29 14:02:19',
+        'latch_message': 'Протечка произошла (ДП8/1/1 - Хранилище 8 большое левый)',
+        'name': 'Архивохранилище №1',
+    }])
+
+
+@pytest.fixture
+def recording(tmp_path):
+    return tmp_path / 'traffic.jsonl.gz'
+
+
+@pytest.mark.asyncio
+async def test_recording_anonymizes_traffic(recording):
+    transport = RecordingTransport(httpx.MockTransport(upstream), recording)
+    async with httpx.AsyncClient(transport=transport, base_url='http://api') as client:
+        await client.post('/api2/auth/open', json={'login': 'user', 'password': 'password'})
+        await client.post('/bot123:SECRET/sendMessage', data={'chat_id': 42, 'text': 'Тревога'})
+
+    content = gzip.decompress(recording.read_bytes()).decode()
+    assert 'secret-token' not in content
+    assert 'SECRET' not in content and 'password' not in content
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_recorded_responses(recording):
+    transport = RecordingTransport(httpx.MockTransport(upstream), recording)
+    async with httpx.AsyncClient(transport=transport, base_url='http://api') as client:
+        recorded = await client.get('/api2/device/limit-log', params={'id': 7, 'start_dt': '2024-01-01'})
+
+    async with httpx.AsyncClient(transport=ReplayTransport(recording, speed=0), base_url='http://api') as client:
+        replayed = await client.get('/api2/device/limit-log', params={'id': 7, 'start_dt': '2024-02-01'})
+        missing = await client.get('/api2/device/limit-log', params={'id': 8})
+
+    log, = replayed.json()
+    assert replayed.status_code == recorded.status_code
+    assert log['limit_id'] == 7 and log['latch_message'].startswith('Протечка произошла (')
+    assert len(log['latch_message']) == len(recorded.json()[0]['latch_message'])
+    assert log['name'] != recorded.json()[0]['name']
+    assert missing.status_code == 404
@@ -0,0 +1,55 @@
+from datetime import datetime, time
+
+from energoatlas.models.background import LogCategory
+from energoatlas.routing import RoutingTable
+from energoatlas.tables import NotificationFilterTable
+
+
+leak = LogCategory('leak', 'critical')
+leak_recovery = LogCategory('leak', 'recovery')
+fire = LogCategory('fire', 'critical')
+version = datetime(2024, 6, 3, 12, 0)
+
+
+def test_routing_table_applies_filters():
+    routing = RoutingTable([leak, leak_recovery, fire])
+    routing.set_user(1, version, [100, 200])
+    routing.set_user(2, version, [100, 200], NotificationFilterTable(
+        event_types=['leak'], mute_recoveries=True, muted_device_ids=[], muted_objects=['Склад']
+    ), object_names={100: 'Склад', 200: 'Котельная'})
+    routing.set_user(3, version, [200], NotificationFilterTable(
+        event_types=None, mute_recoveries=False, muted_device_ids=[200], muted_objects=[]
+    ))
+
+    assert routing.route(100, leak) == {1}
+    assert routing.route(200, leak) == {1, 2}
+    assert routing.route(200, leak_recovery) == {1}
+    assert routing.route(200, fire) == {1}
+    assert routing.route(300, leak) == set()
+
+
+def test_routing_table_rebuilds_user_routes():
+    routing = RoutingTable([leak])
+    routing.set_user(1, version, [100, 200])
+    routing.set_user(2, version, [100])
+
+    routing.set_user(1, version, [200])
+    assert routing.route(100, leak) == {2}
+    assert routing.route(200, leak) == {1}
+
+    routing.remove_user(2)
+    assert routing.route(100, leak) == set()
+    assert routing.versions == {1: version}
+
+
+def test_routing_table_quiet_hours():
+    routing = RoutingTable([leak])
+    routing.set_user(1, version, [100], NotificationFilterTable(
+        event_types=None, mute_recoveries=False, muted_device_ids=[], muted_objects=[],
+        quiet_from=time(22), quiet_to=time(8)
+    ))
+
+    assert routing.is_quiet(1, time(23, 30))
+    assert routing.is_quiet(1, time(7, 59))
+    assert not routing.is_quiet(1, time(8))
+    assert not routing.is_quiet(2, time(23, 30))
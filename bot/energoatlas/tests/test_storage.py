@@ -0,0 +1,91 @@
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from aiogram_extensions.paginator import PaginatedKeyboard
+from energoatlas.aiogram.callbacks import DevicesForm, MainMenu
+from energoatlas.aiogram.states import Auth
+from energoatlas.aiogram.storage import compact_dumps
+
+
+class RedisStandIn:
+    """Локальная замена сервера Redis с поддержкой используемых хранилищем команд"""
+    def __init__(self):
+        self.values: dict[str, bytes] = {}
+        self.ttl: dict[str, int | None] = {}
+
+    async def set(self, name, value, ex=None):
+        self.values[name] = value.encode() if isinstance(value, str) else value
+        self.ttl[name] = ex
+
+    async def get(self, name):
+        return self.values.get(name)
+
+    async def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    async def aclose(self, close_connection_pool=None):
+        pass
+
+
+@pytest.fixture
+def redis():
+    return RedisStandIn()
+
+
+@pytest.fixture
+def state(redis):
+    storage = RedisStorage(redis, state_ttl=3600, data_ttl=3600, json_dumps=compact_dumps)
+    return FSMContext(storage=storage, key=StorageKey(bot_id=1, chat_id=2, user_id=2))
+
+
+@pytest.mark.asyncio
+async def test_redis_storage_keeps_compact_state_with_ttl(state, redis):
+    await state.set_state(Auth.authorized)
+    await state.update_data(login='user@example.com', last_message_id=10)
+
+    assert await state.get_state() == Auth.authorized.state
+    assert await state.get_data() == {'login': 'user@example.com', 'last_message_id': 10}
+    assert set(redis.ttl.values()) == {3600}
+    assert b' ' not in redis.values['fsm:2:2:data']
+
+
+@pytest.mark.asyncio
+async def test_paginated_keyboard_survives_serialization(state):
+    keyboard = InlineKeyboardBuilder()
+    for i in range(12):
+        keyboard.button(text=f'Устройство {i}', callback_data=DevicesForm(company_id=1, object_id=i))
+    keyboard.adjust(1, 1)
+    post = InlineKeyboardBuilder()
+    post.button(text='Главное меню', callback_data=MainMenu())
+
+    created = await PaginatedKeyboard.create(keyboard=keyboard, unique_name='devices', state=state, page_size=5,
+                                             post=post, text='Выберите устройство')
+    created.last_viewed_page = 2
+    await created.save()
+
+    restored = await PaginatedKeyboard.last_opened(state)
+    assert restored.keyboard_id == 'devices'
+    assert restored.last_viewed_page == 2
+    assert restored.page(2) == created.page(2)
+    assert restored.first_page() == created.first_page()
+
+
+@pytest.mark.asyncio
+async def test_paginated_keyboards_are_capped(state):
+    for i in range(PaginatedKeyboard.max_keyboards + 2):
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text=f'Объект {i}', callback_data=DevicesForm(company_id=1, object_id=i))
+        await PaginatedKeyboard.create(keyboard=keyboard, unique_name=f'objects-{i}', state=state)
+
+    data = await state.get_data()
+    assert len(data['paginated_keyboards']) == PaginatedKeyboard.max_keyboards
+    assert await PaginatedKeyboard.get(state, 'objects-0') is None
+    assert data['paginated_keyboards'][-1]['items'] == [[['Объект 6', 'devices_list:1:6']]]
+
+    reopened = await PaginatedKeyboard.get(state, 'objects-3')
+    await reopened.save()
+    assert (await PaginatedKeyboard.last_opened(state)).keyboard_id == 'objects-3'
@@ -0,0 +1,73 @@
+import json
+
+import httpx
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from energoatlas.telegram import HttpxSession, TelegramRateLimiter, telegram_api_server
+
+
+def message(chat_id: int, text: str) -> dict:
+    return {'message_id': 7, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+
+
+@pytest.fixture
+def telegram():
+    """Эмулятор Bot API: первый запрос в чат 1 отклоняется ответом 429, чат 2 заблокировал бота"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = dict(httpx.QueryParams(request.content.decode()))
+        calls.append((request.url.path, params))
+        if params.get('chat_id') == '2':
+            return httpx.Response(403, json={'ok': False, 'error_code': 403,
+                                             'description': 'Forbidden: bot was blocked by the user'})
+        if params.get('chat_id') == '1' and len(calls) == 1:
+            return httpx.Response(429, json={'ok': False, 'error_code': 429, 'parameters': {'retry_after': 3},
+                                             'description': 'Too Many Requests: retry after 3'})
+        return httpx.Response(200, json={'ok': True, 'result': message(int(params['chat_id']), params['text'])})
+
+    handler.calls = calls
+    return handler
+
+
+def create_bot(telegram, limiter: TelegramRateLimiter) -> tuple[Bot, httpx.AsyncClient]:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(telegram))
+    session = HttpxSession(client, api=telegram_api_server())
+    session.middleware(limiter)
+    return Bot(token='42:TEST', session=session), client
+
+
+@pytest.mark.asyncio
+async def test_session_retries_after_flood_control(telegram, mocker):
+    sleep = mocker.patch('energoatlas.telegram.asyncio.sleep')
+    bot, client = create_bot(telegram, TelegramRateLimiter(concurrency=1, rate=0, chat_interval=0, max_retries=1))
+
+    sent = await bot.send_message(1, 'Протечка', parse_mode='MarkdownV2')
+
+    assert sent.message_id == 7
+    assert [path for path, _ in telegram.calls] == ['/bot42:TEST/sendMessage'] * 2
+    assert telegram.calls[-1][1] == {'chat_id': '1', 'text': 'Протечка', 'parse_mode': 'MarkdownV2'}
+    assert sleep.await_args.args[0] == pytest.approx(3, abs=0.1)
+    await bot.session.close()
+    assert not client.is_closed  # общий клиент закрывает его владелец
+
+
+@pytest.mark.asyncio
+async def test_session_maps_telegram_errors(telegram):
+    bot, _ = create_bot(telegram, TelegramRateLimiter(concurrency=1, rate=0, chat_interval=0, max_retries=0))
+
+    with pytest.raises(TelegramRetryAfter):
+        await bot.send_message(1, 'Протечка')
+    with pytest.raises(TelegramForbiddenError):
+        await bot.send_message(2, 'Протечка')
+
+
+def test_rate_limiter_paces_chats(mocker):
+    mocker.patch('energoatlas.telegram.time.monotonic', return_value=100.0)
+    limiter = TelegramRateLimiter(concurrency=1, rate=10, chat_interval=1, max_retries=0)
+
+    assert [round(limiter._reserve(chat), 3) for chat in (1, 2, 1)] == [0, 0.1, 1]
+    limiter._postpone(2, 5)
+    assert limiter._reserve(2) == 5
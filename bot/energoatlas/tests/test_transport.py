@@ -0,0 +1,89 @@
+import asyncio
+import socket
+
+import httpcore
+import httpx
+import pytest
+
+from energoatlas.settings import HttpClientProfile
+from energoatlas.transport import CachingDnsBackend, ProfileTransport, SharedTransport, create_client
+
+
+def address_info(*addresses: str) -> list[tuple]:
+    return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, 443)) for address in addresses]
+
+
+@pytest.fixture
+def backend(mocker):
+    backend = mocker.Mock(spec=httpcore.AsyncNetworkBackend)
+    backend.connect_tcp = mocker.AsyncMock()
+    return backend
+
+
+@pytest.mark.asyncio
+async def test_dns_backend_caches_addresses(backend, mocker):
+    getaddrinfo = mocker.patch.object(asyncio.get_running_loop(), 'getaddrinfo',
+                                      new=mocker.AsyncMock(return_value=address_info('10.0.0.1', '10.0.0.1')))
+    clock = mocker.patch('energoatlas.transport.time.monotonic', return_value=100.0)
+    dns = CachingDnsBackend(ttl=60, backend=backend)
+
+    await dns.connect_tcp('api.example.com', 443, timeout=1)
+    await dns.connect_tcp('api.example.com', 443, timeout=1)
+    await dns.connect_tcp('10.0.0.2', 443)
+    assert getaddrinfo.await_count == 1
+    assert [call.args[0] for call in backend.connect_tcp.await_args_list] == ['10.0.0.1', '10.0.0.1', '10.0.0.2']
+
+    clock.return_value = 161.0
+    await dns.connect_tcp('api.example.com', 443)
+    assert getaddrinfo.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_dns_backend_tries_next_address(backend, mocker):
+    getaddrinfo = mocker.patch.object(asyncio.get_running_loop(), 'getaddrinfo',
+                                      new=mocker.AsyncMock(return_value=address_info('10.0.0.1', '10.0.0.2')))
+    dns = CachingDnsBackend(ttl=60, backend=backend)
+
+    backend.connect_tcp.side_effect = [httpcore.ConnectError('refused'), mocker.Mock()]
+    await dns.connect_tcp('api.example.com', 443)
+    assert [call.args[0] for call in backend.connect_tcp.await_args_list] == ['10.0.0.1', '10.0.0.2']
+
+    backend.connect_tcp.side_effect = httpcore.ConnectError('refused')
+    with pytest.raises(httpcore.ConnectError):
+        await dns.connect_tcp('api.example.com', 443)
+    await dns.resolve('api.example.com', 443)
+    assert getaddrinfo.await_count == 2  # после неудачи имя разрешается заново
+
+
+@pytest.mark.asyncio
+async def test_create_client_applies_profile():
+    profile = HttpClientProfile(max_connections=3, keepalive_expiry=90, connect_timeout=2, read_timeout=7)
+
+    async with create_client(profile) as client:
+        assert client.timeout.connect == 2 and client.timeout.read == 7
+        pool = client._transport._pool
+        assert pool._max_connections == 3 and pool._keepalive_expiry == 90
+
+
+@pytest.mark.asyncio
+async def test_profile_transport_connects_through_network_backend(backend):
+    backend.connect_tcp.side_effect = httpcore.ConnectError('refused')
+
+    async with httpx.AsyncClient(transport=ProfileTransport(HttpClientProfile(), network_backend=backend)) as client:
+        with pytest.raises(httpx.ConnectError):
+            await client.get('http://api.example.com/')
+
+    assert backend.connect_tcp.await_args.kwargs['host'] == 'api.example.com'
+
+
+@pytest.mark.asyncio
+async def test_shared_transport_is_not_closed_by_clients(mocker):
+    transport = mocker.Mock(spec=httpx.AsyncBaseTransport, aclose=mocker.AsyncMock())
+    shared = SharedTransport(transport)
+
+    for profile in (HttpClientProfile(), HttpClientProfile(read_timeout=60)):
+        async with create_client(profile, shared):
+            pass
+
+    transport.aclose.assert_not_awaited()
+
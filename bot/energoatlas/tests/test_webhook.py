@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from energoatlas.settings import settings
+from energoatlas.webhook import create_webhook_app, webhook_secret_token
+
+
+def update(update_id: int, text: str) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': 1, 'type': 'private'}, 'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+    }}
+
+
+@pytest_asyncio.fixture
+async def telegram():
+    """Локальная замена Bot API, сохраняющая вызванные методы"""
+    calls = []
+
+    async def method(request: web.Request) -> web.Response:
+        payload = dict(await request.post())
+        calls.append((request.match_info['method'], payload))
+        return web.json_response({'ok': True, 'result': {
+            'message_id': 100, 'date': 0, 'text': payload.get('text'), 'chat': {'id': 1, 'type': 'private'}}})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', method)
+    async with TestServer(app) as server:
+        server.calls = calls
+        yield server
+
+
+@pytest_asyncio.fixture
+async def webhook(telegram, monkeypatch):
+    monkeypatch.setattr(settings, 'webhook_max_concurrency', 1)
+    release = asyncio.Event()
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        if message.text == 'wait':
+            await release.wait()
+        await message.answer(message.text)
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(str(telegram.make_url(''))))
+    bot = Bot(token='42:TEST', session=session)
+    async with TestServer(create_webhook_app(dispatcher, bot)) as server:
+        server.release = release
+        yield server
+
+
+async def wait_for_calls(telegram, count: int):
+    for _ in range(100):
+        if len(telegram.calls) >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_requests_without_secret(webhook, telegram):
+    async with ClientSession() as client:
+        response = await client.post(webhook.make_url(settings.webhook_path), json=update(1, 'hello'))
+    assert response.status == 401
+    assert telegram.calls == []
+
+
+@pytest.mark.asyncio
+async def test_webhook_feeds_updates_with_bounded_concurrency(webhook, telegram):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': webhook_secret_token()}
+    url = webhook.make_url(settings.webhook_path)
+    async with ClientSession() as client:
+        response = await client.post(url, json=update(1, 'wait'), headers=headers)
+        assert response.status == 200
+
+        # Единственное место занято первым обновлением: второе ожидает его обработки
+        second = asyncio.create_task(client.post(url, json=update(2, 'hello'), headers=headers))
+        await asyncio.sleep(0.1)
+        assert not second.done()
+
+        webhook.release.set()
+        assert (await second).status == 200
+        await wait_for_calls(telegram, 2)
+
+    assert [(method, payload['text']) for method, payload in telegram.calls] == [('sendMessage', 'wait'),
+                                                                                 ('sendMessage', 'hello')]
@@ -0,0 +1,117 @@
+"""
+HTTP-клиенты по профилям настроек ``http_profiles``.
+
+У каждого профиля собственный пул соединений, поэтому зависший метод API не занимает соединения остальных групп
+запросов. Результаты разрешения DNS-имен переиспользуются всеми профилями в течение ``http_dns_cache_ttl`` секунд.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Iterable
+
+import httpcore
+import httpx
+
+from energoatlas.metrics import observe_response
+from energoatlas.settings import HttpClientProfile, settings
+
+
+class CachingDnsBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, ttl: float, backend: httpcore.AsyncNetworkBackend | None = None):
+        """
+        Сетевой бэкенд httpcore, кеширующий адреса, полученные при разрешении DNS-имен.
+        :param ttl: время (в секундах), в течение которого адреса имени переиспользуются
+        :param backend: бэкенд, устанавливающий соединения с полученными адресами
+        """
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._addresses: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    async def resolve(self, host: str, port: int, timeout: float | None = None) -> list[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        now = time.monotonic()
+        cached = self._addresses.get((host, port))
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f'DNS resolution of {host} timed out')
+        except OSError as exc:
+            raise httpcore.ConnectError(str(exc))
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._addresses[(host, port)] = (now + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host: str, port: int, timeout: float | None = None, local_address: str | None = None,
+                          socket_options: Iterable | None = None) -> httpcore.AsyncNetworkStream:
+        addresses = await self.resolve(host, port, timeout)
+        for i, address in enumerate(addresses, start=1):
+            try:
+                return await self._backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                       socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addresses):
+                    # Адреса могли смениться: при следующем соединении имя разрешается заново
+                    self._addresses.pop((host, port), None)
+                    raise
+
+    async def connect_unix_socket(self, path: str, timeout: float | None = None,
+                                  socket_options: Iterable | None = None) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+dns_backend = CachingDnsBackend(settings.http_dns_cache_ttl)
+
+
+class ProfileTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, profile: HttpClientProfile, network_backend: httpcore.AsyncNetworkBackend | None = None):
+        """
+        Транспорт с пулом соединений профиля. Пул создается явно, так как ``httpx.AsyncHTTPTransport`` не позволяет
+        передать ему сетевой бэкенд
+        :param profile: профиль HTTP-клиента
+        :param network_backend: сетевой бэкенд пула соединений (по умолчанию - бэкенд httpcore)
+        """
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=profile.max_connections,
+            max_keepalive_connections=profile.max_keepalive_connections,
+            keepalive_expiry=profile.keepalive_expiry,
+            http1=True,
+            http2=profile.http2,
+            network_backend=network_backend,
+        )
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        """
+        Транспорт, общий для нескольких HTTP-клиентов. Клиенты его не закрывают: исходный транспорт закрывается
+        владельцем один раз
+        :param transport: исходный транспорт
+        """
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+
+def create_transport(profile: HttpClientProfile) -> httpx.AsyncHTTPTransport:
+    """Транспорт с пулом соединений профиля"""
+    return ProfileTransport(profile, network_backend=dns_backend if settings.http_dns_cache_ttl else None)
+
+
+def create_client(profile: HttpClientProfile, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """HTTP-клиент с ограничениями времени профиля. По умолчанию с собственным пулом соединений профиля"""
+    timeout = httpx.Timeout(profile.read_timeout, connect=profile.connect_timeout)
+    return httpx.AsyncClient(timeout=timeout, transport=transport or create_transport(profile),
+                             event_hooks={'response': [observe_response]})
@@ -1,24 +1,27 @@
 import asyncio
+import contextlib
 import functools
 import logging
-import re
+import time
 from datetime import datetime
 from typing import TypeVar
 from zoneinfo import ZoneInfo
 
 import httpx
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
 from dateutil.relativedelta import relativedelta
 from loguru import logger
 
 from energoatlas.settings import settings
+from energoatlas.hedging import HedgeBudget, LatencyTracker, current_hedge
+from energoatlas.metrics import API_REQUEST_DURATION, API_RESPONSES, API_SEMAPHORE_WAIT, current_api_call
 
 
 tz = ZoneInfo(settings.timezone)
 T = TypeVar('T')
 
-api_semaphore = asyncio.Semaphore(10)
-telegram_semaphore = asyncio.Semaphore(10)
-db_semaphore = asyncio.Semaphore(10)
+api_semaphore = asyncio.Semaphore(settings.api_concurrency)
+db_semaphore = asyncio.Semaphore(settings.db_concurrency)
 
 
 def yesterday() -> datetime:
@@ -26,36 +29,64 @@ def yesterday() -> datetime:
     return now.replace(hour=0, minute=0, second=0, microsecond=0) - relativedelta(days=1)
 
 
-def strip_log(message: str) -> str:
-    return re.search(r"[^(]*", message).group().strip()
+def local_now() -> datetime:
+    """Текущее время в часовом поясе ``settings.timezone`` без указания часового пояса (как время срабатываний)"""
+    return datetime.now(tz).replace(tzinfo=None)
 
 
 def api_call(handle_errors: bool = False, log_level=logging.ERROR, target_api_prefix='Энергоатлас API',
-             telegram_call=False):
+             telegram_call=False, hedge=False):
     """Декоратор для асинхронных атомарных методов, выполняющих запросы к API "Энергоатлас" / Telegram. Ограничивает количество
     одновременных запросов в соответствии со значением семафора и логирующий Http-исключения и ответы с кодом 4хх-5хх.
+    Длительность вызова и время ожидания семафора учитываются в метриках в разрезе имени метода. Запросы к API Telegram
+    ограничиваются общим для процесса ``energoatlas.telegram.rate_limiter``.
     :param handle_errors: писать информацию в лог, при выброшенном исключении, подменяя возвращаемое значение метода на None
     :param log_level: уровень логов
     :param telegram_call: обращение к API Telegram
+    :param hedge: идемпотентный запрос, HTTP-запрос которого (``energoatlas.hedging.hedge_request``) дублируется при
+        долгом ожидании ответа (если включено настройкой ``api_hedge_enable``). Копия выполняется в рамках того же места
+        семафора
     :param target_api_prefix: Строка-префикс - название ресурса для указания в логах
     """
-    sem = telegram_semaphore if telegram_call else api_semaphore
+    sem = contextlib.nullcontext() if telegram_call else api_semaphore
     target_api_prefix = 'Telegram API' if telegram_call else target_api_prefix
+    api_label = 'telegram' if telegram_call else 'energoatlas'
 
     def wrapper(func):
+        endpoint = func.__name__
+        duration = API_REQUEST_DURATION.labels(api_label, endpoint)
+        semaphore_wait = None if telegram_call else API_SEMAPHORE_WAIT.labels(api_label)
+        hedge_params = (LatencyTracker(settings.api_hedge_quantile), HedgeBudget(settings.api_hedge_budget),
+                        (api_label, endpoint)) if hedge else None
+
         @functools.wraps(func)
         async def wrapped(*args, **kwargs):
+            started_at = time.perf_counter()
             async with sem:
-                if handle_errors:
-                    try:
+                if semaphore_wait is not None:
+                    semaphore_wait.observe(time.perf_counter() - started_at)
+                token = current_api_call.set((api_label, endpoint))
+                hedge_token = current_hedge.set(hedge_params if settings.api_hedge_enable else None)
+                try:
+                    with duration.time():
                         return await func(*args, **kwargs)
-                    except httpx.HTTPStatusError as exc:
+                except httpx.HTTPStatusError as exc:
+                    if handle_errors:
                         logger.log(log_level, f'[{target_api_prefix}] HTTP error {exc.response.status_code} - {exc.response.reason_phrase} on url {exc.request.url} with text: {exc.response.text}')
-                        raise exc
-                    except httpx.RequestError as exc:
+                    raise exc
+                except httpx.RequestError as exc:
+                    API_RESPONSES.labels(api_label, endpoint, 'error').inc()
+                    if handle_errors:
                         logger.opt(exception=exc).log(log_level, f'[{target_api_prefix}] {exc} {type(exc)}'.strip())
-                        raise exc
-                else:
-                    return await func(*args, **kwargs)
+                    raise exc
+                except TelegramAPIError as exc:
+                    if isinstance(exc, TelegramNetworkError):
+                        API_RESPONSES.labels(api_label, endpoint, 'error').inc()
+                    if handle_errors:
+                        logger.log(log_level, f'[{target_api_prefix}] {type(exc).__name__} on {exc.method.__api_method__}: {exc.message}')
+                    raise exc
+                finally:
+                    current_hedge.reset(hedge_token)
+                    current_api_call.reset(token)
         return wrapped
     return wrapper
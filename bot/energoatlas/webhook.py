@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from energoatlas.settings import settings
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука, обрабатывающий в фоне не более ``max_concurrency`` обновлений одновременно. При исчерпании
+    лимита ответ Telegram задерживается до освобождения места, и Telegram сам снижает темп доставки"""
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, secret_token: str | None = None,
+                 **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._semaphore.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._semaphore.release()
+
+
+def webhook_secret_token() -> str:
+    """Секретный токен, которым Telegram подписывает запросы к вебхуку. Если он не задан в настройках, токен выводится
+    из токена бота, чтобы совпадать во всех процессах"""
+    return settings.webhook_secret or hashlib.sha256(settings.bot_token.encode()).hexdigest()
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, **data: Any) -> web.Application:
+    """
+    Приложение aiohttp, передающее обновления из вебхука в диспетчер.
+    :param data: зависимости, передаваемые в обработчики (аналогично ``start_polling``)
+    """
+    app = web.Application()
+    handler = BoundedRequestHandler(dispatcher, bot, max_concurrency=settings.webhook_max_concurrency,
+                                    secret_token=webhook_secret_token(), **data)
+    handler.register(app, path=settings.webhook_path)
+    setup_application(app, dispatcher, bot=bot, **data)
+    return app
+
+
+async def set_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    url = f'{settings.webhook_url}{settings.webhook_path}'
+    await bot.set_webhook(url=url, secret_token=webhook_secret_token(),
+                          max_connections=settings.webhook_max_connections,
+                          allowed_updates=dispatcher.resolve_used_update_types())
+    logger.info(f'Webhook is set to {url}')
+
+
+async def serve_webhook(dispatcher: Dispatcher, bot: Bot, **data: Any) -> None:
+    """Обрабатывать обновления из вебхука до остановки процесса. Несколько процессов могут слушать один порт"""
+    runner = web.AppRunner(create_webhook_app(dispatcher, bot, **data), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port,
+                       reuse_port=settings.webhook_workers > 1)
+    await site.start()
+    logger.info(f'Started webhook server on {settings.webhook_host}:{settings.webhook_port}...')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,67 @@
+"""Исходная схема: таблицы, ранее создававшиеся при запуске через ``Base.metadata.create_all``
+
+Таблицы создаются только при их отсутствии, поэтому миграция применима и к базам данных, созданным до появления
+миграций.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-05-20 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set() if context.is_offline_mode() else set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'Users' not in existing:
+        op.create_table(
+            'Users',
+            sa.Column('telegram_user_id', sa.BigInteger(), primary_key=True,
+                      comment='Идентификатор пользователя в Telegram'),
+            sa.Column('login', sa.String(), nullable=False, comment='Логин в системе "Энергоатлас"'),
+            sa.Column('password', sa.String(), nullable=False, comment='Пароль в системе "Энергоатлас"'),
+        )
+    if 'LimitLogs' not in existing:
+        op.create_table(
+            'LimitLogs',
+            sa.Column('limit_id', sa.BigInteger(), primary_key=True,
+                      comment='Идентификатор аварийного критерия устройства'),
+            sa.Column('latch_dt', sa.DateTime(), primary_key=True, comment='Время срабатывания аварийного критерия'),
+        )
+    if 'UserDevices' not in existing:
+        op.create_table(
+            'UserDevices',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('telegram_user_id', sa.BigInteger(),
+                      sa.ForeignKey('Users.telegram_user_id', ondelete='cascade'), nullable=False,
+                      comment='Идентификатор пользователя в Telegram'),
+            sa.Column('device_id', sa.BigInteger(), nullable=False, comment='Идентификатор устройства'),
+        )
+    if 'FsmStates' not in existing:
+        op.create_table(
+            'FsmStates',
+            sa.Column('key', sa.String(), primary_key=True, comment='Ключ хранилища: бот, чат, пользователь'),
+            sa.Column('state', sa.String(), nullable=True, comment='Текущее состояние'),
+            sa.Column('data', postgresql.JSONB(), nullable=False, comment='Данные состояния'),
+            sa.Column('updated_at', sa.DateTime(), nullable=False, comment='Время последнего изменения'),
+        )
+        op.create_index('ix_FsmStates_updated_at', 'FsmStates', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('FsmStates')
+    op.drop_table('UserDevices')
+    op.drop_table('LimitLogs')
+    op.drop_table('Users')
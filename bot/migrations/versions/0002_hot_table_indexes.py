@@ -0,0 +1,39 @@
+"""Индексы и ограничения для таблиц, к которым обращается цикл опроса
+
+- ``UserDevices``: уникальность пары (пользователь, устройство), индекс по ``device_id`` для выборки подписчиков и
+  списка отслеживаемых устройств. Индекс уникального ограничения используется и для удаления устройств пользователя.
+- ``LimitLogs``: индекс по ``latch_dt`` для выборки срабатываний за последние сутки.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-05-20 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Повторные подписки пользователя на одно устройство удаляются перед созданием ограничения
+    op.execute('''
+        DELETE FROM "UserDevices" a USING "UserDevices" b
+        WHERE a.telegram_user_id = b.telegram_user_id AND a.device_id = b.device_id AND a.id > b.id
+    ''')
+    op.create_unique_constraint('uq_UserDevices_telegram_user_id_device_id', 'UserDevices',
+                                ['telegram_user_id', 'device_id'])
+    op.create_index('ix_UserDevices_device_id', 'UserDevices', ['device_id'])
+    op.create_index('ix_LimitLogs_latch_dt', 'LimitLogs', ['latch_dt'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_LimitLogs_latch_dt', 'LimitLogs')
+    op.drop_index('ix_UserDevices_device_id', 'UserDevices')
+    op.drop_constraint('uq_UserDevices_telegram_user_id_device_id', 'UserDevices', type_='unique')
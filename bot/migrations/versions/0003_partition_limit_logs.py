@@ -0,0 +1,73 @@
+"""Секционирование ``LimitLogs`` по дням срабатывания
+
+Таблица пересоздается как секционированная по ``latch_dt``: дневные секции на несколько дней назад и вперед и секция
+по умолчанию для строк вне их диапазона. Переносятся только строки, необходимые для исключения повторных
+уведомлений. Последующие секции создает и удаляет ``LogPartitionManager``.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-05-27 12:00:00
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DAYS_BEFORE = 3
+DAYS_AHEAD = 2
+
+
+def upgrade() -> None:
+    op.drop_index('ix_LimitLogs_latch_dt', 'LimitLogs')
+    op.execute('ALTER TABLE "LimitLogs" RENAME TO "LimitLogs_unpartitioned"')
+    op.execute('ALTER TABLE "LimitLogs_unpartitioned" RENAME CONSTRAINT "LimitLogs_pkey" TO "LimitLogs_unpartitioned_pkey"')
+
+    op.execute('''
+        CREATE TABLE "LimitLogs" (
+            limit_id BIGINT NOT NULL,
+            latch_dt TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (limit_id, latch_dt)
+        ) PARTITION BY RANGE (latch_dt)
+    ''')
+    op.execute('''COMMENT ON TABLE "LimitLogs" IS 'Таблица истории срабатывания аварийных критериев, по которым были отправлены уведомления пользователям' ''')
+    op.execute('''COMMENT ON COLUMN "LimitLogs".limit_id IS 'Идентификатор аварийного критерия устройства' ''')
+    op.execute('''COMMENT ON COLUMN "LimitLogs".latch_dt IS 'Время срабатывания аварийного критерия' ''')
+    op.create_index('ix_LimitLogs_latch_dt', 'LimitLogs', ['latch_dt'])
+    op.execute('CREATE TABLE "LimitLogs_default" PARTITION OF "LimitLogs" DEFAULT')
+
+    today = date.today()
+    for offset in range(-DAYS_BEFORE, DAYS_AHEAD + 1):
+        day = today + timedelta(days=offset)
+        op.execute(f'''CREATE TABLE "LimitLogs_{day:%Y%m%d}" PARTITION OF "LimitLogs"
+                       FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')''')
+
+    op.execute(f'''
+        INSERT INTO "LimitLogs" (limit_id, latch_dt)
+        SELECT limit_id, latch_dt FROM "LimitLogs_unpartitioned"
+        WHERE latch_dt >= '{today - timedelta(days=DAYS_BEFORE):%Y-%m-%d}'
+    ''')
+    op.execute('DROP TABLE "LimitLogs_unpartitioned"')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE "LimitLogs" RENAME TO "LimitLogs_partitioned"')
+    op.execute('ALTER TABLE "LimitLogs_partitioned" RENAME CONSTRAINT "LimitLogs_pkey" TO "LimitLogs_partitioned_pkey"')
+    op.drop_index('ix_LimitLogs_latch_dt', 'LimitLogs_partitioned')
+    op.execute('''
+        CREATE TABLE "LimitLogs" (
+            limit_id BIGINT NOT NULL,
+            latch_dt TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (limit_id, latch_dt)
+        )
+    ''')
+    op.create_index('ix_LimitLogs_latch_dt', 'LimitLogs', ['latch_dt'])
+    op.execute('INSERT INTO "LimitLogs" (limit_id, latch_dt) SELECT limit_id, latch_dt FROM "LimitLogs_partitioned"')
+    op.execute('DROP TABLE "LimitLogs_partitioned"')
@@ -0,0 +1,50 @@
+"""Фильтры уведомлений пользователей
+
+- ``NotificationFilters``: типы событий, отключенные устройства и объекты, тихие часы пользователя.
+- ``Users.updated_at``: время последнего изменения подписок и фильтров пользователя, по которому таблица
+  маршрутизации уведомлений перестраивается только для изменившихся пользователей (с индексом для выборки
+  пользователей, измененных после предыдущей синхронизации).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-06-03 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('Users', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False,
+                                     comment='Время последнего изменения подписок и фильтров уведомлений'))
+    op.create_index('ix_Users_updated_at', 'Users', ['updated_at'])
+    op.create_table(
+        'NotificationFilters',
+        sa.Column('telegram_user_id', sa.BigInteger(), sa.ForeignKey('Users.telegram_user_id', ondelete='cascade'),
+                  primary_key=True, comment='Идентификатор пользователя в Telegram'),
+        sa.Column('event_types', postgresql.ARRAY(sa.String()), nullable=True,
+                  comment='Типы событий, о которых уведомлять. NULL - все'),
+        sa.Column('mute_recoveries', sa.Boolean(), nullable=False, comment='Не уведомлять о восстановлении нормы'),
+        sa.Column('muted_device_ids', postgresql.ARRAY(sa.BigInteger()), nullable=False,
+                  comment='Устройства, о которых не уведомлять'),
+        sa.Column('muted_objects', postgresql.ARRAY(sa.String()), nullable=False,
+                  comment='Названия объектов, о которых не уведомлять'),
+        sa.Column('quiet_from', sa.Time(), nullable=True, comment='Начало тихих часов'),
+        sa.Column('quiet_to', sa.Time(), nullable=True, comment='Окончание тихих часов'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('NotificationFilters')
+    op.drop_index('ix_Users_updated_at', 'Users')
+    op.drop_column('Users', 'updated_at')
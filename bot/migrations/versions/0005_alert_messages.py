@@ -0,0 +1,36 @@
+"""Сообщения об авариях, дополняемые событиями об их устранении
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-06-10 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'AlertMessages',
+        sa.Column('chat_id', sa.BigInteger(), primary_key=True, comment='Идентификатор чата Telegram'),
+        sa.Column('device_id', sa.BigInteger(), primary_key=True, comment='Идентификатор устройства'),
+        sa.Column('event_type', sa.String(), primary_key=True, comment='Тип события (см. settings.log_rules)'),
+        sa.Column('message_id', sa.BigInteger(), nullable=False, comment='Идентификатор сообщения в чате'),
+        sa.Column('text', sa.String(), nullable=False, comment='Текущий текст сообщения (MarkdownV2)'),
+        sa.Column('sent_at', sa.DateTime(), nullable=False, comment='Время отправки сообщения'),
+    )
+    op.create_index('ix_AlertMessages_device_id', 'AlertMessages', ['device_id'])
+    op.create_index('ix_AlertMessages_sent_at', 'AlertMessages', ['sent_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('AlertMessages')
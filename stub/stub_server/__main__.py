@@ -1,9 +1,39 @@
+import argparse
+import os
+
 import uvicorn
 
 
+parser = argparse.ArgumentParser(prog='stub_server', description='Эмулятор API Энергоатлас и Telegram Bot API')
+parser.add_argument('--port', type=int, default=8888)
+parser.add_argument('--no-reload', action='store_true', help='не перезапускать сервер при изменении исходного кода')
+parser.add_argument('--synthetic', action='store_true', help='сгенерировать синтетический парк устройств')
+parser.add_argument('--seed', type=int)
+parser.add_argument('--companies', type=int)
+parser.add_argument('--objects-per-company', type=int)
+parser.add_argument('--devices-per-object', type=int)
+parser.add_argument('--users', type=int)
+parser.add_argument('--event-rate', type=float)
+parser.add_argument('--latency-median-ms', type=float)
+parser.add_argument('--latency-p99-ms', type=float)
+parser.add_argument('--error-rate', type=float)
+parser.add_argument('--rate-limit-rate', type=float)
+args = parser.parse_args()
+
+# Параметры передаются через переменные окружения, чтобы их получил и перезапускаемый uvicorn процесс
+if args.synthetic:
+    os.environ['STUB_MODE'] = 'synthetic'
+for group, names in {
+    'FLEET': ['seed', 'companies', 'objects_per_company', 'devices_per_object', 'users', 'event_rate'],
+    'FAULTS': ['latency_median_ms', 'latency_p99_ms', 'error_rate', 'rate_limit_rate'],
+}.items():
+    for name in names:
+        if (value := getattr(args, name)) is not None:
+            os.environ[f'STUB_{group}__{name.upper()}'] = str(value)
+
 uvicorn.run(
     'stub_server:app',
     host='0.0.0.0',
-    port=8888,
-    reload=True,
+    port=args.port,
+    reload=not args.no_reload,
 )
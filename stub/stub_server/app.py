@@ -1,72 +1,143 @@
-import json
+import asyncio
+import math
 import random
+from collections import Counter
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
-from stub_server.models import AuthModel
+from fastapi import FastAPI, HTTPException, Header, Request, status
+from fastapi.responses import JSONResponse, Response
+from stub_server import telegram
+from stub_server.fleet import Fleet, DemoFleet, SyntheticFleet
+from stub_server.models import AuthModel, FleetConfig, FaultConfig, TelegramConfig
+from stub_server.settings import settings
 
 
 app = FastAPI()
-tz = ZoneInfo("Asia/Yekaterinburg")
+app.include_router(telegram.router)
+tz = ZoneInfo(settings.timezone)
+stats = Counter()
 
 
-def spin(chance: int) -> bool:
-    r = random.randint(1, 100)
-    return r <= chance
+def spin(chance: float) -> bool:
+    return random.random() < chance
 
 
-def read_json(path):
-    with open(path, 'r') as f:
-        return json.load(f)
+def build_fleet() -> Fleet:
+    if settings.mode == 'synthetic':
+        return SyntheticFleet(settings.fleet, admin_login=settings.admin_login, tz=tz)
+    return DemoFleet(admin_login=settings.admin_login)
 
 
-latch_messages = read_json('latch_messages.json')
+fleet = build_fleet()
+
+
+def json_response(content: bytes) -> Response:
+    return Response(content=content, media_type='application/json')
+
+
+def company_scope(authorization: str | None) -> int | None:
+    """Определить по токену компанию, к которой у пользователя есть доступ (None - ко всем компаниям)"""
+    token = (authorization or '').removeprefix('Bearer ')
+    if token == settings.admin_token:
+        return None
+    if token.startswith('token-') and (login := token.removeprefix('token-')) in fleet.users:
+        return fleet.users[login]
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+
+def latency() -> float:
+    """Задержка ответа в секундах с логнормальным распределением, заданным медианой и 99-м перцентилем"""
+    faults = settings.faults
+    if faults.latency_median_ms <= 0:
+        return 0
+    sigma = max(math.log(max(faults.latency_p99_ms, faults.latency_median_ms) / faults.latency_median_ms), 0) / 2.326
+    return random.lognormvariate(math.log(faults.latency_median_ms), sigma) / 1000
+
+
+@app.middleware('http')
+async def inject_faults(request: Request, call_next):
+    if not request.url.path.startswith('/api2'):
+        return await call_next(request)
+
+    stats[request.url.path] += 1
+    if delay := latency():
+        await asyncio.sleep(delay)
+    if spin(settings.faults.rate_limit_rate):
+        stats['429'] += 1
+        return JSONResponse({'detail': 'Too Many Requests'}, status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(settings.faults.retry_after)})
+    if spin(settings.faults.error_rate):
+        stats['500'] += 1
+        return JSONResponse({'detail': 'Internal Server Error'}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return await call_next(request)
 
 
 @app.post('/api2/auth/open')
 def auth(data: AuthModel):
-    if data.login == 'admin@example.com' and data.password == 'Jb21uHa73omYia':
-        return JSONResponse({"token": "5XZI6I7I_Erge7sJy2s19PzqksYGvkMU"})
+    if data.login == settings.admin_login and data.password == settings.admin_password:
+        return JSONResponse({"token": settings.admin_token})
+    if data.login in fleet.users and data.password == settings.user_password:
+        return JSONResponse({"token": f'token-{data.login}'})
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
 @app.get('/api2/company')
-def get_company_list():
-    return JSONResponse([
-        {
-            "id": 179,
-            "name": "ГУ ОГАЧО"
-        }
-    ])
+def get_company_list(authorization: str | None = Header(default=None)):
+    return json_response(fleet.companies_json[company_scope(authorization)])
 
 
 @app.get('/api2/company/objects')
-def get_objects(id: int):
-    return JSONResponse(read_json('company-objects.json'))
+def get_objects(id: int, authorization: str | None = Header(default=None)):
+    scope = company_scope(authorization)
+    if (scope is not None and scope != id) or id not in fleet.company_objects_json:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return json_response(fleet.company_objects_json[id])
 
 
 @app.get('/api2/device/limit-log')
 def get_limit_logs(id: int, start_dt: datetime, end_dt: datetime):
-    if id == 88584 or id == 88698:
-        return JSONResponse([
-            {
-                "limit_id": random.randint(10000, 100000),
-                "latch_dt": datetime.now(tz=tz).strftime("%Y-%m-%d %H:%M:%S"),
-                "latch_message": latch_messages[random.randint(0, len(latch_messages) - 1)]
-            }
-        ])
-
-    return JSONResponse([])
+    return JSONResponse(fleet.limit_logs(id, start_dt, end_dt, datetime.now(tz=tz)))
 
 
 @app.get('/api2/object')
 def get_device_list(id: int):
-    return JSONResponse(read_json('device-list.json'))
+    if id not in fleet.objects_json:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return json_response(fleet.objects_json[id])
 
 
 @app.get('/api2/device/values')
 def get_device_values(id: int):
-    return JSONResponse(read_json('device-values.json'))
-
+    return json_response(fleet.device_values_json)
+
+
+@app.get('/stub/stats')
+def get_stats():
+    return {
+        'api': dict(stats),
+        'telegram': dict(telegram.state.stats),
+        'telegram_messages': sum(telegram.state.sent.values()),
+        'telegram_chats': len(telegram.state.sent),
+        'devices': len(fleet.device_ids),
+    }
+
+
+@app.post('/stub/reset')
+def reset_stats():
+    stats.clear()
+    telegram.state = telegram.TelegramState()
+    return {'ok': True}
+
+
+@app.post('/stub/fleet')
+def regenerate_fleet(fleet_config: FleetConfig, faults: FaultConfig | None = None,
+                     telegram_config: TelegramConfig | None = None):
+    """Сгенерировать новый синтетический парк устройств и/или изменить параметры ошибок"""
+    global fleet
+    settings.mode = 'synthetic'
+    settings.fleet = fleet_config
+    settings.faults = faults or settings.faults
+    settings.telegram = telegram_config or settings.telegram
+    fleet = build_fleet()
+    return {'devices': len(fleet.device_ids), 'users': len(fleet.users)}
@@ -0,0 +1,173 @@
+import json
+import math
+import random
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from stub_server.models import FleetConfig
+
+
+STREETS = ['Свердловский проспект', 'улица Кирова', 'проспект Ленина', 'улица Труда', 'Комсомольский проспект',
+           'улица Братьев Кашириных', 'улица Энтузиастов', 'площадь Революции']
+DEVICE_TYPES = [('ДЗ', 'Датчик дыма Stemax Livi FS'), ('ДП', 'Датчик протечки Stemax Livi WS'),
+                ('ДД', 'Датчик давления Stemax Livi PS'), ('ДТ', 'Датчик температуры Stemax Livi TS')]
+
+
+def dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode()
+
+
+def read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class Fleet(ABC):
+    """Парк устройств, ответы по которому заранее сериализованы и отдаются из памяти"""
+    def __init__(self, companies: list[dict], company_objects: dict[int, list[dict]], objects: dict[int, dict],
+                 device_values: list[dict], latch_messages: list[str], users: dict[str, int | None]):
+        self.latch_messages = latch_messages
+        self.device_ids = {device['id'] for company in company_objects.values() for obj in company
+                           for device in obj['devices']}
+        self.companies = companies
+        self.users = users
+        """Соответствие логина пользователя и компании, к которой он имеет доступ (None - ко всем компаниям)"""
+        self.companies_json = {None: dumps(companies)}
+        self.companies_json.update({company['id']: dumps([company]) for company in companies})
+        self.company_objects_json = {company_id: dumps(objs) for company_id, objs in company_objects.items()}
+        self.objects_json = {object_id: dumps(obj) for object_id, obj in objects.items()}
+        self.device_values_json = dumps(device_values)
+
+    @abstractmethod
+    def limit_logs(self, device_id: int, start_dt: datetime, end_dt: datetime, now: datetime) -> list[dict]:
+        """События срабатывания аварийных критериев устройства за период ``[start_dt, end_dt]`` на момент ``now``"""
+
+
+class DemoFleet(Fleet):
+    """Статичный набор данных из json-файлов, на двух устройствах которого при каждом запросе генерируются события"""
+    active_devices = (88584, 88698)
+
+    def __init__(self, admin_login: str):
+        company_objects = read_json('company-objects.json')
+        device_list = read_json('device-list.json')
+        companies = [{"id": 179, "name": "ГУ ОГАЧО"}]
+        super().__init__(
+            companies=companies,
+            company_objects={179: company_objects},
+            objects={obj['id']: device_list for obj in company_objects},
+            device_values=read_json('device-values.json'),
+            latch_messages=read_json('latch_messages.json'),
+            users={admin_login: None}
+        )
+
+    def limit_logs(self, device_id: int, start_dt: datetime, end_dt: datetime, now: datetime) -> list[dict]:
+        if device_id not in self.active_devices:
+            return []
+        return [
+            {
+                "limit_id": random.randint(10000, 100000),
+                "latch_dt": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "latch_message": random.choice(self.latch_messages)
+            }
+        ]
+
+
+class SyntheticFleet(Fleet):
+    """Детерминированный парк устройств, сгенерированный по ``FleetConfig.seed``. События срабатывания аварийных
+    критериев генерируются для каждой минуты независимо от момента запроса, поэтому повторные запросы истории
+    возвращают одни и те же события"""
+    cache_size = 256
+
+    def __init__(self, config: FleetConfig, admin_login: str, tz: ZoneInfo):
+        self.config = config
+        self.tz = tz
+        rng = random.Random(config.seed)
+        template_values = read_json('device-values.json')
+        companies = []
+        company_objects = {}
+        objects = {}
+        object_id = 200000
+        device_id = 1000000
+        for company_id in range(1, config.companies + 1):
+            companies.append({'id': company_id, 'name': f'Организация №{company_id}'})
+            company_objects[company_id] = []
+            for _ in range(config.objects_per_company):
+                object_id += 1
+                name = f'Архивохранилище №{object_id}'
+                address = f'{rng.choice(STREETS)}, {rng.randint(1, 200)}'
+                devices = []
+                for n in range(1, config.devices_per_object + 1):
+                    device_id += 1
+                    prefix, device_type = rng.choice(DEVICE_TYPES)
+                    devices.append({'id': device_id, 'name': f'{prefix} {n}/1', 'type': device_type})
+                company_objects[company_id].append({
+                    'id': object_id, 'name': name, 'address': address,
+                    'devices': [{'id': d['id'], 'name': d['name'], 'title': d['type']} for d in devices]
+                })
+                objects[object_id] = {'id': object_id, 'name': name, 'address': address, 'devices': devices}
+
+        users = {admin_login: None}
+        for i in range(1, config.users + 1):
+            users[f'user{i}@example.com'] = (i - 1) % config.companies + 1 if config.companies else None
+
+        super().__init__(
+            companies=companies,
+            company_objects=company_objects,
+            objects=objects,
+            device_values=template_values,
+            latch_messages=read_json('latch_messages.json'),
+            users=users
+        )
+        self._device_ids_sorted = sorted(self.device_ids)
+        self._buckets: OrderedDict[int, dict[int, list[dict]]] = OrderedDict()
+        self.cache_size = max(self.cache_size, config.history_minutes + 1)
+
+    def limit_logs(self, device_id: int, start_dt: datetime, end_dt: datetime, now: datetime) -> list[dict]:
+        now_bucket = int(now.timestamp() // 60)
+        result = []
+        for bucket in range(now_bucket - self.config.history_minutes + 1, now_bucket + 1):
+            for event in self._bucket_events(bucket).get(device_id, ()):
+                if start_dt <= event['_dt'] <= end_dt:
+                    result.append({k: v for k, v in event.items() if k != '_dt'})
+        return result
+
+    def _bucket_events(self, bucket: int) -> dict[int, list[dict]]:
+        """События всех устройств парка, произошедшие в течение минуты с номером ``bucket``"""
+        if (events := self._buckets.get(bucket)) is not None:
+            self._buckets.move_to_end(bucket)
+            return events
+
+        rng = random.Random(self.config.seed * 1_000_003 + bucket)
+        events = {}
+        count = self._sample_count(rng, len(self._device_ids_sorted), self.config.event_rate)
+        for device_id in rng.sample(self._device_ids_sorted, count):
+            dt = datetime.fromtimestamp(bucket * 60 + rng.randint(0, 59), self.tz).replace(tzinfo=None)
+            message_index = rng.randrange(len(self.latch_messages))
+            events.setdefault(device_id, []).append({
+                'limit_id': device_id * 100 + message_index,
+                'latch_dt': dt.strftime("%Y-%m-%d %H:%M:%S"),
+                'latch_message': self.latch_messages[message_index],
+                '_dt': dt
+            })
+
+        self._buckets[bucket] = events
+        if len(self._buckets) > self.cache_size:
+            self._buckets.popitem(last=False)
+        return events
+
+    @staticmethod
+    def _sample_count(rng: random.Random, n: int, p: float) -> int:
+        """Количество устройств со срабатыванием за минуту: распределение Пуассона при малом среднем, нормальное
+        приближение биномиального распределения при большом"""
+        mean = n * min(p, 1)
+        if mean <= 0:
+            return 0
+        if mean > 30:
+            return max(0, min(n, round(rng.gauss(mean, math.sqrt(mean * (1 - min(p, 1)))))))
+        threshold, count, product = math.exp(-mean), 0, rng.random()
+        while product > threshold:
+            count += 1
+            product *= rng.random()
+        return min(n, count)
@@ -4,3 +4,39 @@ from pydantic import BaseModel
 class AuthModel(BaseModel):
     login: str
     password: str
+
+
+class FleetConfig(BaseModel):
+    """Параметры синтетического парка устройств"""
+    seed: int = 0
+    companies: int = 1
+    objects_per_company: int = 10
+    devices_per_object: int = 10
+    event_rate: float = 0.01
+    """Вероятность срабатывания аварийного критерия на устройстве в течение минуты"""
+    history_minutes: int = 60
+    """Глубина истории срабатываний, отдаваемой в /api2/device/limit-log"""
+    users: int = 100
+    """Количество пользователей user{N}@example.com, распределенных по компаниям"""
+
+
+class FaultConfig(BaseModel):
+    """Параметры искусственных задержек и ошибок в ответах API Энергоатлас"""
+    latency_median_ms: float = 0
+    latency_p99_ms: float = 0
+    error_rate: float = 0
+    """Доля ответов с кодом 500"""
+    rate_limit_rate: float = 0
+    """Доля ответов с кодом 429"""
+    retry_after: int = 1
+
+
+class TelegramConfig(BaseModel):
+    """Параметры эмулятора Telegram Bot API"""
+    per_chat_rate: float = 1
+    """Допустимое количество сообщений в секунду в один чат"""
+    global_rate: float = 30
+    """Допустимое количество сообщений в секунду во все чаты"""
+    retry_after: int = 1
+    blocked_chat_rate: float = 0
+    """Доля чатов, в которых пользователь заблокировал бота"""
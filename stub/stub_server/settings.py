@@ -0,0 +1,23 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from stub_server.models import FleetConfig, FaultConfig, TelegramConfig
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='stub_', env_nested_delimiter='__')
+
+    mode: Literal['demo', 'synthetic'] = 'demo'
+    timezone: str = 'Asia/Yekaterinburg'
+    admin_login: str = 'admin@example.com'
+    admin_password: str = 'Jb21uHa73omYia'
+    admin_token: str = '5XZI6I7I_Erge7sJy2s19PzqksYGvkMU'
+    user_password: str = 'password'
+
+    fleet: FleetConfig = FleetConfig()
+    faults: FaultConfig = FaultConfig()
+    telegram: TelegramConfig = TelegramConfig()
+
+
+settings = Settings()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from stub_server.settings import settings
+
+
+router = APIRouter()
+
+
+class TelegramState:
+    """Состояние эмулятора Telegram Bot API: отправленные сообщения и окна ограничения частоты отправки"""
+    def __init__(self):
+        self.message_ids: dict[int, int] = defaultdict(int)
+        self.sent: Counter = Counter()
+        """Количество успешно отправленных сообщений по чатам"""
+        self.stats: Counter = Counter()
+        self._chat_windows: dict[int, deque] = defaultdict(deque)
+        self._global_window: deque = deque()
+
+    def throttle(self, chat_id: int, now: float) -> bool:
+        """Учесть попытку отправки сообщения. Вернуть True, если превышено ограничение частоты отправки"""
+        config = settings.telegram
+        chat_window = self._chat_windows[chat_id]
+        for window in (chat_window, self._global_window):
+            while window and window[0] <= now - 1:
+                window.popleft()
+        if len(chat_window) >= config.per_chat_rate or len(self._global_window) >= config.global_rate:
+            return True
+        chat_window.append(now)
+        self._global_window.append(now)
+        return False
+
+
+state = TelegramState()
+
+
+def is_blocked(chat_id: int) -> bool:
+    """Детерминированно определить, заблокировал ли пользователь чата бота"""
+    return zlib.crc32(str(chat_id).encode()) % 10_000 < settings.telegram.blocked_chat_rate * 10_000
+
+
+def ok(result) -> JSONResponse:
+    return JSONResponse({'ok': True, 'result': result})
+
+
+def error(code: int, description: str, **parameters) -> JSONResponse:
+    body = {'ok': False, 'error_code': code, 'description': description}
+    if parameters:
+        body['parameters'] = parameters
+    return JSONResponse(body, status_code=code)
+
+
+async def read_params(request: Request) -> dict:
+    if request.headers.get('content-type', '').startswith('application/json'):
+        return await request.json()
+    return dict(await request.form())
+
+
+def message(chat_id: int, message_id: int, text: str) -> dict:
+    return {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': True, 'first_name': 'Stub'},
+        'text': text
+    }
+
+
+@router.post('/bot{token}/{method}')
+@router.get('/bot{token}/{method}')
+async def bot_api(token: str, method: str, request: Request):
+    params = await read_params(request)
+    state.stats[method] += 1
+
+    if method == 'getMe':
+        return ok({'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'})
+    if method == 'getUpdates':
+        await asyncio.sleep(min(float(params.get('timeout', 0) or 0), 1))
+        return ok([])
+    if method not in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'deleteMessage'):
+        return ok(True)
+
+    chat_id = int(params['chat_id'])
+    if is_blocked(chat_id):
+        state.stats['403'] += 1
+        return error(403, 'Forbidden: bot was blocked by the user')
+    if method != 'deleteMessage' and state.throttle(chat_id, time.monotonic()):
+        retry_after = settings.telegram.retry_after
+        state.stats['429'] += 1
+        return error(429, f'Too Many Requests: retry after {retry_after}', retry_after=retry_after)
+
+    if method == 'deleteMessage':
+        return ok(True)
+    if method == 'sendMessage':
+        state.message_ids[chat_id] += 1
+        message_id = state.message_ids[chat_id]
+        state.sent[chat_id] += 1
+    else:
+        message_id = int(params['message_id'])
+        if message_id > state.message_ids[chat_id]:
+            return error(400, 'Bad Request: message to edit not found')
+    return ok(message(chat_id, message_id, params.get('text', '')))